@@ -8,6 +8,8 @@ from __future__ import annotations
 import warnings
 
 import os
+import json
+import logging
 import yaml
 import faas_profiler.cli as cli
 
@@ -17,9 +19,14 @@ from glob import glob
 
 from faas_profiler_core.constants import Runtime, Provider
 
+from faas_profiler.benchmark import run_benchmark, BENCHMARK_SIZES
 from faas_profiler.config import config
 from faas_profiler.dashboard import app
-from faas_profiler.postprocessing import process_records
+from faas_profiler.disk_cache import DiskCache
+from faas_profiler.local_storage import sync_bucket
+from faas_profiler.object_storage import ObjectRecordStorage, migrate_storage
+from faas_profiler.postprocessing import process_records, logger as processing_logger
+from faas_profiler.storage_backends import LOCAL_BACKEND, storage_backend as get_storage_backend
 from faas_profiler.templating import (
     HandlerTemplate,
     GitIgnoreTemplate,
@@ -51,14 +58,30 @@ class Commands:
         records_bucket: str = "faas-profiler-records",
         host="127.0.0.1",
         port=3000,
+        local_dir: str = None,
+        cache_size_mb: int = 512,
+        load_workers: int = 16,
+        storage_backend: str = None,
+        pool_size: int = None,
         debug=False
     ) -> None:
         """
         Starts dash application to view recent traces.
+        With local_dir, traces are read from a local copy of the records bucket (see sync).
+        Otherwise, traces, profiles and graphs are cached on disk up to
+        cache_size_mb megabytes (0 disables the cache, see cache).
+        The traces of a profile are loaded by load_workers threads.
+        storage_backend selects the storage (s3-core, gcs-core, s3, gcs, local),
+        whose clients have pool_size connections (defaults to load_workers).
         """
         config.provider = provider
         config.region = region
         config.storage_bucket = records_bucket
+        config.local_dir = local_dir
+        config.cache_size = cache_size_mb * 1024 * 1024
+        config.load_workers = load_workers
+        config.storage_backend = storage_backend
+        config.pool_size = pool_size or load_workers
 
         if config.provider == Provider.GCP:
             config.project_id = project_id
@@ -76,19 +99,215 @@ class Commands:
         provider: str,
         region: str,
         project_id: str = None,
-        records_bucket: str = "faas-profiler-records"
+        records_bucket: str = "faas-profiler-records",
+        fetch_workers: int = 8,
+        prefetch_depth: int = 64,
+        full: bool = False,
+        stream: bool = False,
+        watermark: float = 60.0,
+        processes: int = 1,
+        upload_workers: int = 8,
+        request_ttl: float = 3600.0,
+        max_cached_requests: int = 100_000,
+        match_window: float = 1.0,
+        local_dir: str = None,
+        codec: str = "json",
+        storage_backend: str = None,
+        pool_size: int = None,
+        sample_reservoir: int = None,
+        sample_probability: float = None,
+        stats_json: str = None,
+        debug: bool = False
     ):
         """
         Manually builds traces.
+
+        Records are fetched by fetch_workers threads with at most
+        prefetch_depth records buffered ahead of processing.
+        Only records not seen by previous runs are processed, unless full is set.
+        With stream, records are read in the order they were written and
+        completed traces are written and evicted from memory once the event
+        time passed them by watermark seconds. Late records reopen them.
+        With processes > 1, records are sharded by trace ID across a process pool.
+        Results are uploaded in the background by upload_workers threads.
+        Unresolved requests expire after request_ttl seconds of event time and
+        at most max_cached_requests per direction are kept in memory.
+        Inbound requests without an exact match are matched to the nearest
+        outbound request up to match_window seconds earlier.
+        With local_dir, records are read from and results are written to a
+        local copy of the records bucket (see sync), encoded with codec
+        (json, msgpack, optionally compressed: json.gz, msgpack.zst, ...).
+        storage_backend selects the storage (s3-core, gcs-core, s3, gcs, local),
+        whose clients have pool_size connections (defaults to fetch_workers + upload_workers).
+        With sample_reservoir or sample_probability, only a sample of whole traces is
+        stored: sample_reservoir traces per root function plus each other trace
+        with sample_probability. Later runs must use the same sampling parameters.
+        Stage times and counters are written as JSON to stats_json.
+        With debug, every processed record is logged.
+        """
+        config.provider = provider
+        config.region = region
+        config.storage_bucket = records_bucket
+        config.local_dir = local_dir
+        config.codec = codec
+        config.storage_backend = storage_backend
+        config.pool_size = pool_size or fetch_workers + upload_workers
+
+        if config.provider == Provider.GCP:
+            config.project_id = project_id
+
+        if debug:
+            logging.basicConfig(level=logging.DEBUG)
+            processing_logger.setLevel(logging.DEBUG)
+
+        process_records(
+            fetch_workers=fetch_workers,
+            prefetch_depth=prefetch_depth,
+            incremental=not full,
+            stream=stream,
+            watermark=watermark,
+            processes=processes,
+            upload_workers=upload_workers,
+            request_ttl=request_ttl,
+            max_cached_requests=max_cached_requests,
+            match_window=match_window,
+            sample_reservoir=sample_reservoir,
+            sample_probability=sample_probability,
+            stats_json=stats_json)
+
+    def sync(
+        self,
+        provider: str,
+        region: str,
+        project_id: str = None,
+        records_bucket: str = "faas-profiler-records",
+        local_dir: str = None,
+        workers: int = 16
+    ):
+        """
+        Mirrors the records bucket into a local directory.
+
+        Objects are downloaded by workers threads. Objects that were already
+        downloaded are skipped, so repeated syncs only fetch new objects.
+        Pass local_dir to dashboard or process_records to use the local copy.
+        """
+        config.provider = provider
+        config.region = region
+        config.storage_bucket = records_bucket
+
+        if config.provider == Provider.GCP:
+            config.project_id = project_id
+
+        local_dir = local_dir or config.default_local_dir
+        print(f"Syncing {records_bucket} into {local_dir}")
+
+        downloaded, skipped = sync_bucket(
+            local_dir,
+            config.provider,
+            records_bucket,
+            region=region,
+            project_id=config.project_id,
+            workers=workers)
+
+        print(f"Downloaded {downloaded} objects, skipped {skipped} existing objects.")
+        print(f"Use --local_dir={local_dir} to analyze the local copy.")
+
+    def migrate(
+        self,
+        provider: str,
+        records_bucket: str = "faas-profiler-records",
+        local_dir: str = None,
+        codec: str = "msgpack.zst",
+        workers: int = 16,
+        storage_backend: str = LOCAL_BACKEND,
+        region: str = None,
+        project_id: str = None
+    ):
+        """
+        Re-encodes the records bucket with codec.
+
+        Codecs are json or msgpack, optionally compressed with gzip or zstd,
+        e.g. json.gz or msgpack.zst. Objects are re-encoded by workers threads:
+        each object is written with the codec and then deleted under its old
+        key. Objects of all codecs stay readable, so the bucket can be used
+        while it is migrated. Pass the same codec to process_records to keep
+        writing it.
+        storage_backend selects the storage (s3, gcs or local, by default the
+        local copy of the bucket, see sync).
         """
         config.provider = provider
         config.region = region
         config.storage_bucket = records_bucket
+        config.local_dir = local_dir
+        config.storage_backend = storage_backend
+        config.pool_size = workers
 
         if config.provider == Provider.GCP:
             config.project_id = project_id
 
-        process_records()
+        storage = get_storage_backend(storage_backend).create(config)
+        if not isinstance(storage, ObjectRecordStorage):
+            raise RuntimeError(
+                f"Storage backend {storage_backend} cannot be re-encoded. Use s3, gcs or local.")
+
+        print(f"Re-encoding {records_bucket} ({storage_backend}) with {codec}")
+
+        migrated, skipped = migrate_storage(storage, codec, workers=workers)
+        print(f"Re-encoded {migrated} objects, skipped {skipped} objects already encoded with {codec}.")
+
+    def cache(
+        self,
+        provider: str,
+        records_bucket: str = "faas-profiler-records",
+        clear: bool = False
+    ):
+        """
+        Shows the size of the storage cache of the records bucket.
+        With clear, all cached objects are removed, e.g. after the bucket
+        was changed by another machine.
+        """
+        config.provider = provider
+        config.storage_bucket = records_bucket
+
+        cache = DiskCache(config.cache_file, config.cache_size)
+        if clear:
+            cache.clear()
+            print(f"Cleared storage cache {cache.path}")
+            return
+
+        info = cache.info()
+        print(
+            f"Storage cache {info['path']}: {info['entries']} objects, "
+            f"{info['size'] / 1024 ** 2:.1f} of {info['max_size'] / 1024 ** 2:.0f} MB")
+
+    def benchmark(
+        self,
+        sizes: List[int] = BENCHMARK_SIZES,
+        seed: int = 0,
+        out_of_order: float = 0.1,
+        fetch_workers: int = 8,
+        upload_workers: int = 8,
+        stream: bool = False,
+        output: str = None
+    ):
+        """
+        Benchmarks post-processing on synthetic records.
+
+        Reports records/sec and peak RSS for each number of records in sizes,
+        processed from an in-memory storage. With output, results are also
+        written as JSON.
+        """
+        results = run_benchmark(
+            sizes=sizes,
+            seed=seed,
+            out_of_order=out_of_order,
+            fetch_workers=fetch_workers,
+            upload_workers=upload_workers,
+            stream=stream)
+
+        if output:
+            with open(output, "w") as fp:
+                json.dump(results, fp, indent=2)
 
     def instrument(self, project_path: str = os.getcwd()):
         """
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Post-processing benchmark
+
+Generates synthetic trace records and measures process_records
+against an in-memory record storage.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import resource
+import sys
+
+from contextlib import redirect_stderr, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from time import perf_counter
+from typing import Dict, Iterable, List, Type
+from uuid import UUID
+
+from faas_profiler_core.constants import (
+    AWSOperation,
+    AWSService,
+    Provider,
+    Runtime,
+    TriggerSynchronicity
+)
+from faas_profiler_core.models import (
+    FunctionContext,
+    InboundContext,
+    OutboundContext,
+    Profile,
+    TraceRecord,
+    TracingContext
+)
+
+from faas_profiler.config import config
+from faas_profiler.postprocessing import process_records
+from faas_profiler.stats import stats
+
+BENCHMARK_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+BENCHMARK_BUCKET = "faas-profiler-benchmark"
+
+EPOCH = datetime(2023, 1, 1)
+WORKFLOW_SPACING = timedelta(seconds=2)
+
+
+class MemoryRecordStorage:
+    """
+    In-memory stand-in for a record storage.
+    """
+
+    def __init__(self, records: Iterable[Type[TraceRecord]] = []) -> None:
+        self._records: Dict[str, Type[TraceRecord]] = {}
+        self._graph_data: Dict[str, dict] = {}
+        self._profiles: Dict[str, Type[Profile]] = {}
+
+        self.add_records(records)
+
+    def add_records(self, records: Iterable[Type[TraceRecord]]) -> None:
+        """
+        Adds records as unprocessed records.
+        """
+        for record in records:
+            self._records[f"unprocessed_records/{record.record_id}.json"] = record
+
+    @property
+    def unprocessed_record_keys(self) -> List[str]:
+        return sorted(self._records)
+
+    @property
+    def unprocessed_record_keys_by_time(self) -> List[str]:
+        return list(self._records)
+
+    def unprocessed_records(self):
+        for key in self.unprocessed_record_keys:
+            yield self.get_unprocessed_record(key)
+
+    def get_unprocessed_record(self, key: str) -> Type[TraceRecord]:
+        return self._records[key]
+
+    def store_graph_data(self, trace_id: UUID, graph_data: dict) -> None:
+        self._graph_data[str(trace_id)] = graph_data
+
+    def get_graph_data(self, trace_id: UUID) -> dict:
+        return self._graph_data[str(trace_id)]
+
+    def delete_graph_data(self, trace_id: UUID) -> None:
+        self._graph_data.pop(str(trace_id), None)
+
+    @property
+    def number_of_graphes(self) -> int:
+        return len(self._graph_data)
+
+    def store_profile(self, profile: Type[Profile]) -> None:
+        self._profiles[str(profile.profile_id)] = profile
+
+    def get_profile(self, profile_id: UUID) -> Type[Profile]:
+        return self._profiles[str(profile_id)]
+
+    def delete_profile(self, profile_id: UUID) -> None:
+        self._profiles.pop(str(profile_id), None)
+
+    def profiles(self) -> List[Type[Profile]]:
+        return list(self._profiles.values())
+
+    @property
+    def has_profiles(self) -> bool:
+        return len(self._profiles) > 0
+
+
+class RecordGenerator:
+    """
+    Generates realistic trace records of three kinds of workflows:
+
+    - Sync chains: functions calling each other synchronously.
+    - Fan-outs like image_pipeline: distribute_work invokes fanout
+      process_image functions, which each invoke thumbnail_image. Thumbnails
+      are uploaded to S3, which triggers save_image.
+    - Async hops: functions publishing to SNS and sending to SQS queues.
+
+    Records are ordered by invocation. A share of out_of_order records is
+    swapped with a record up to reorder_window positions later.
+    """
+
+    def __init__(
+        self,
+        fanout: int = 16,
+        chain_length: int = 4,
+        async_hops: int = 3,
+        out_of_order: float = 0.1,
+        reorder_window: int = 100,
+        seed: int = 0
+    ) -> None:
+        self.fanout = fanout
+        self.chain_length = chain_length
+        self.async_hops = async_hops
+        self.out_of_order = out_of_order
+        self.reorder_window = reorder_window
+
+        self._random = random.Random(seed)
+
+    def generate(self, number_of_records: int) -> List[Type[TraceRecord]]:
+        """
+        Returns number_of_records records of randomly mixed workflows.
+        The last workflow may be cut off and left with unresolved requests.
+        """
+        workflows = [self.sync_chain, self.fan_out, self.async_hops_workflow]
+
+        records = []
+        started_at = EPOCH
+        while len(records) < number_of_records:
+            workflow = self._random.choice(workflows)
+            records.extend(workflow(started_at))
+            started_at += WORKFLOW_SPACING
+
+        records = sorted(
+            records[:number_of_records],
+            key=lambda record: record.function_context.invoked_at)
+
+        return self.reorder(records)
+
+    def reorder(self, records: List[Type[TraceRecord]]) -> List[Type[TraceRecord]]:
+        """
+        Swaps a share of out_of_order records with later records.
+        """
+        last = len(records) - 1
+        for idx in range(last):
+            if self._random.random() >= self.out_of_order:
+                continue
+
+            other = min(last, idx + self._random.randint(1, self.reorder_window))
+            records[idx], records[other] = records[other], records[idx]
+
+        return records
+
+    def sync_chain(self, started_at: datetime) -> List[Type[TraceRecord]]:
+        """
+        Returns records of a chain of synchronously invoked functions.
+        """
+        trace_id = self._uuid()
+        duration = self._duration(50, 500) * self.chain_length
+
+        records = []
+        parent_id = None
+        for depth in range(self.chain_length):
+            record = self._record(
+                f"chain_{depth}",
+                trace_id,
+                started_at + timedelta(milliseconds=depth),
+                duration - timedelta(milliseconds=2 * depth),
+                parent_id=parent_id)
+            records.append(record)
+            parent_id = record.record_id
+
+        return records
+
+    def fan_out(self, started_at: datetime) -> List[Type[TraceRecord]]:
+        """
+        Returns records of an image_pipeline style fan-out.
+        """
+        distribute = self._record(
+            "distribute_work", self._uuid(), started_at, self._duration(200, 2000))
+
+        records = [distribute]
+        for _ in range(self.fanout):
+            invoked_at = self._between(distribute)
+            process = self._async_child(
+                distribute, invoked_at, "process_image",
+                AWSService.LAMBDA, AWSOperation.LAMBDA_INVOKE,
+                {"request_id": str(self._uuid())})
+
+            thumbnail = self._async_child(
+                process, self._between(process), "thumbnail_image",
+                AWSService.LAMBDA, AWSOperation.LAMBDA_INVOKE,
+                {"request_id": str(self._uuid())})
+
+            save = self._async_child(
+                thumbnail, self._between(thumbnail), "save_image",
+                AWSService.S3, AWSOperation.S3_OBJECT_CREATE,
+                {"bucket_name": "thumbnails", "object_key": f"{self._uuid()}.png"})
+
+            records.extend([process, thumbnail, save])
+
+        return records
+
+    def async_hops_workflow(self, started_at: datetime) -> List[Type[TraceRecord]]:
+        """
+        Returns records of functions linked by SNS topics and SQS queues.
+        """
+        record = self._record(
+            "publisher", self._uuid(), started_at, self._duration(50, 500))
+
+        records = [record]
+        for hop in range(self.async_hops):
+            if hop % 2 == 0:
+                service, operation = AWSService.SNS, AWSOperation.SNS_PUBLISH
+                identifier = {"message_id": str(self._uuid())}
+            else:
+                service, operation = AWSService.SQS, AWSOperation.SQS_SEND
+                identifier = {"message_id": str(self._uuid())}
+
+            record = self._async_child(
+                record, self._between(record), f"consumer_{hop}",
+                service, operation, identifier)
+            records.append(record)
+
+        return records
+
+    def _async_child(
+        self,
+        parent: Type[TraceRecord],
+        invoked_at: datetime,
+        function_name: str,
+        service: AWSService,
+        operation: AWSOperation,
+        identifier: dict
+    ) -> Type[TraceRecord]:
+        """
+        Adds an outbound request to parent and returns the triggered record.
+        """
+        request_finished_at = invoked_at + self._duration(5, 50)
+        parent.outbound_contexts.append(OutboundContext(
+            provider=Provider.AWS,
+            service=service,
+            operation=operation,
+            identifier=identifier,
+            trigger_synchronicity=TriggerSynchronicity.ASYNC,
+            invoked_at=invoked_at,
+            finished_at=request_finished_at))
+
+        child_invoked_at = request_finished_at + self._duration(10, 200)
+        child = self._record(
+            function_name,
+            self._uuid(),
+            child_invoked_at,
+            self._duration(100, 1000))
+        child.inbound_context = InboundContext(
+            provider=Provider.AWS,
+            service=service,
+            operation=operation,
+            identifier=identifier,
+            trigger_synchronicity=TriggerSynchronicity.ASYNC,
+            invoked_at=child_invoked_at)
+
+        return child
+
+    def _record(
+        self,
+        function_name: str,
+        trace_id: UUID,
+        invoked_at: datetime,
+        duration: timedelta,
+        parent_id: UUID = None
+    ) -> Type[TraceRecord]:
+        finished_at = invoked_at + duration
+        return TraceRecord(
+            tracing_context=TracingContext(
+                trace_id=trace_id,
+                record_id=self._uuid(),
+                parent_id=parent_id),
+            function_context=FunctionContext(
+                provider=Provider.AWS,
+                runtime=Runtime.PYTHON,
+                function_name=function_name,
+                handler=f"profiler.{function_name}",
+                region="eu-central-1",
+                invoked_at=invoked_at,
+                finished_at=finished_at,
+                handler_executed_at=invoked_at + timedelta(milliseconds=5),
+                handler_finished_at=finished_at - timedelta(milliseconds=5)),
+            outbound_contexts=[])
+
+    def _between(self, record: Type[TraceRecord]) -> datetime:
+        """
+        Returns a random time within the handler execution of the record.
+        """
+        func_ctx = record.function_context
+        span = func_ctx.handler_finished_at - func_ctx.handler_executed_at
+        return func_ctx.handler_executed_at + span * self._random.random()
+
+    def _duration(self, min_ms: int, max_ms: int) -> timedelta:
+        return timedelta(milliseconds=self._random.randint(min_ms, max_ms))
+
+    def _uuid(self) -> UUID:
+        return UUID(int=self._random.getrandbits(128), version=4)
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss
+
+    return max_rss * 1024
+
+
+def run_benchmark(
+    sizes: List[int] = BENCHMARK_SIZES,
+    seed: int = 0,
+    out_of_order: float = 0.1,
+    **options
+) -> List[dict]:
+    """
+    Benchmarks process_records for each number of records in sizes.
+
+    Each size runs in a fresh process, so that peak RSS is measured per size.
+    Options are passed to process_records. Sharded processing is not
+    supported, as worker processes cannot open the in-memory storage.
+    """
+    if options.get("processes", 1) > 1:
+        raise ValueError("Benchmarks do not support multiple processes")
+
+    results = []
+    print(
+        f"{'Records':>10} {'Traces':>8} {'Seconds':>9} "
+        f"{'Records/s':>10} {'RSS before':>11} {'Peak RSS':>10}")
+
+    for size in sizes:
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=get_context("spawn")
+        ) as executor:
+            result = executor.submit(
+                benchmark_records, size, seed, out_of_order, **options).result()
+
+        results.append(result)
+        print(
+            f"{result['records']:>10} {result['traces']:>8} "
+            f"{result['seconds']:>9.2f} {result['records_per_second']:>10.0f} "
+            f"{result['rss_before'] / 2**20:>8.1f}MiB "
+            f"{result['peak_rss'] / 2**20:>7.1f}MiB")
+
+    return results
+
+
+def benchmark_records(
+    number_of_records: int,
+    seed: int = 0,
+    out_of_order: float = 0.1,
+    **options
+) -> dict:
+    """
+    Generates records and measures one run of process_records on them.
+    """
+    generator = RecordGenerator(out_of_order=out_of_order, seed=seed)
+    storage = MemoryRecordStorage(generator.generate(number_of_records))
+
+    config.provider = Provider.AWS.value
+    config.storage_bucket = BENCHMARK_BUCKET
+    config.storage = storage
+
+    rss_before = peak_rss()
+    with open(os.devnull, "w") as devnull:
+        with redirect_stdout(devnull), redirect_stderr(devnull):
+            started_at = perf_counter()
+            process_records(incremental=False, **options)
+            seconds = perf_counter() - started_at
+
+    config.reset_storage()
+    for path in [
+        config.processing_state_file,
+        config.metadata_index_file,
+        f"{config.metadata_index_file}-wal",
+        f"{config.metadata_index_file}-shm"
+    ]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    return {
+        "records": number_of_records,
+        "traces": storage.number_of_graphes,
+        "seconds": seconds,
+        "records_per_second": number_of_records / seconds,
+        "rss_before": rss_before,
+        "peak_rss": peak_rss(),
+        "stats": stats.summary()}
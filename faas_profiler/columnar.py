@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar export of record data
+
+Time series and counters of selected data keys are stored per profile as
+directories of NumPy arrays, one file per column. Analyzers memory-map the
+arrays and aggregate them with vectorized operations, instead of loading
+the record data of every trace of a profile. Records of other data keys
+are exported without columns, so the data keys of a profile are known
+without loading its traces.
+
+Each post-processing run appends the columns of its new or changed traces
+as a segment to the data key directory, so the cost of an export does not
+grow with the history of the profile. Segments are compacted into one once
+there are more than MAX_SEGMENTS. A trace is read from the newest segment
+that contains it, traces no longer listed in the profile are left out.
+
+Files of a data key directory:
+    listed.npy            trace IDs listed in the profile when last written
+    <segment>/            table of one run, named by its sequence number
+
+Files of a segment:
+    trace_ids.npy         trace IDs with data
+    record_ids.npy        record ID of each record
+    record_traces.npy     trace of each record, as index into trace_ids
+    <column>.npy          one value of each record
+    <series>.offsets.npy  samples of record i are offsets[i]:offsets[i + 1]
+    <series>.times.npy    sample times
+    <series>.values.npy   sample values
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from itertools import chain
+from os.path import exists, join
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Type
+
+from faas_profiler_core.models import (
+    CPUUsage,
+    MemoryUsage,
+    NetworkIOCounters,
+    Profile,
+    Trace
+)
+
+_logger = logging.getLogger(__name__)
+
+LISTED_FILE = "listed"
+TRACE_IDS_FILE = "trace_ids"
+RECORD_IDS_FILE = "record_ids"
+RECORD_TRACES_FILE = "record_traces"
+
+OFFSETS_SUFFIX = ".offsets"
+TIMES_SUFFIX = ".times"
+VALUES_SUFFIX = ".values"
+
+ID_DTYPE = "U36"
+
+# Number of segments of a data key before they are compacted
+MAX_SEGMENTS = 8
+SEGMENT_DIGITS = 8
+
+Series = Tuple[np.ndarray, np.ndarray, np.ndarray]
+TraceColumns = Dict[str, "ColumnTable"]
+
+"""
+Data keys
+"""
+
+NETWORK_IO_COLUMNS = [
+    "bytes_sent",
+    "bytes_received",
+    "packets_sent",
+    "packets_received",
+    "error_in",
+    "error_out",
+    "drop_in",
+    "drop_out"
+]
+
+
+def _cpu_usage(results: dict) -> Tuple[dict, dict]:
+    usage = CPUUsage.load(results)
+    return {"usage": usage.percentage}, {"interval": usage.interval}
+
+
+def _memory_usage(results: dict) -> Tuple[dict, dict]:
+    usage = MemoryUsage.load(results)
+    return (
+        {"rss": usage.rss, "vms": usage.vms},
+        {"rss_baseline": usage.rss_baseline, "interval": usage.interval})
+
+
+def _network_io(results: dict) -> Tuple[dict, dict]:
+    counters = NetworkIOCounters.load(results)
+    return {}, {name: getattr(counters, name) for name in NETWORK_IO_COLUMNS}
+
+
+# Extractors of all exported data keys. An extractor returns the time series,
+# as lists of (time, value) tuples, and the values of a record.
+COLUMNAR_DATA_KEYS: Dict[str, Callable[[dict], Tuple[dict, dict]]] = {
+    "cpu::UsageOverTime": _cpu_usage,
+    "memory::Usage": _memory_usage,
+    "network::IOCounters": _network_io
+}
+
+
+class ColumnTable:
+    """
+    Columns of one data key: values and time series of records, grouped by trace.
+    """
+
+    def __init__(
+        self,
+        trace_ids: np.ndarray,
+        record_ids: np.ndarray,
+        record_traces: np.ndarray,
+        columns: Dict[str, np.ndarray] = {},
+        series: Dict[str, Series] = {}
+    ) -> None:
+        self.trace_ids = trace_ids
+        self.record_ids = record_ids
+        self.record_traces = record_traces
+        self.columns = dict(columns)
+        self.series = dict(series)
+
+    @property
+    def number_of_records(self) -> int:
+        return len(self.record_ids)
+
+    @classmethod
+    def empty(cls) -> Type[ColumnTable]:
+        return cls(
+            np.array([], dtype=ID_DTYPE),
+            np.array([], dtype=ID_DTYPE),
+            np.array([], dtype=np.int32))
+
+    @classmethod
+    def from_records(
+        cls,
+        trace_id: str,
+        records: List[Tuple[str, dict, dict]]
+    ) -> Type[ColumnTable]:
+        """
+        Builds the table of one trace from (record ID, series, values) of its records.
+        """
+        series_names: Dict[str, None] = {}
+        column_names: Dict[str, None] = {}
+        for _, record_series, record_values in records:
+            series_names.update(dict.fromkeys(record_series))
+            column_names.update(dict.fromkeys(record_values))
+
+        columns = {
+            name: np.array([
+                np.nan if values.get(name) is None else values[name]
+                for _, _, values in records], dtype=np.float64)
+            for name in column_names}
+
+        series = {}
+        for name in series_names:
+            samples = [record_series.get(name) or [] for _, record_series, _ in records]
+            offsets = np.zeros(len(records) + 1, dtype=np.int64)
+            np.cumsum([len(record_samples) for record_samples in samples], out=offsets[1:])
+            flat = [sample for record_samples in samples for sample in record_samples]
+            times = np.array([time for time, _ in flat], dtype=np.float64)
+            values = np.array([value for _, value in flat], dtype=np.float64)
+            series[name] = (offsets, times, values)
+
+        return cls(
+            np.array([trace_id], dtype=ID_DTYPE),
+            np.array([record_id for record_id, _, _ in records], dtype=ID_DTYPE),
+            np.zeros(len(records), dtype=np.int32),
+            columns,
+            series)
+
+    @classmethod
+    def concat(cls, tables: Sequence[Type[ColumnTable]]) -> Type[ColumnTable]:
+        """
+        Concatenates tables of distinct traces.
+        Missing columns are filled with NaN, missing series have no samples.
+        """
+        tables = [table for table in tables if table.number_of_records]
+        if not tables:
+            return cls.empty()
+
+        trace_offsets = np.cumsum([0] + [len(table.trace_ids) for table in tables])
+        record_traces = np.concatenate([
+            table.record_traces + trace_offset
+            for table, trace_offset in zip(tables, trace_offsets)]).astype(np.int32)
+
+        column_names: Dict[str, None] = {}
+        series_names: Dict[str, None] = {}
+        for table in tables:
+            column_names.update(dict.fromkeys(table.columns))
+            series_names.update(dict.fromkeys(table.series))
+
+        columns = {
+            name: np.concatenate([
+                table.columns.get(name, np.full(table.number_of_records, np.nan))
+                for table in tables])
+            for name in column_names}
+
+        series = {}
+        for name in series_names:
+            parts = [table.series.get(name) or _no_samples(table) for table in tables]
+            sample_offsets = np.cumsum([0] + [len(times) for _, times, _ in parts])
+            offsets = np.concatenate(
+                [np.zeros(1, dtype=np.int64)] + [
+                    offsets[1:] + sample_offset
+                    for (offsets, _, _), sample_offset in zip(parts, sample_offsets)])
+            series[name] = (
+                offsets,
+                np.concatenate([times for _, times, _ in parts]),
+                np.concatenate([values for _, _, values in parts]))
+
+        return cls(
+            np.concatenate([table.trace_ids for table in tables]),
+            np.concatenate([table.record_ids for table in tables]),
+            record_traces,
+            columns,
+            series)
+
+    def select(self, trace_ids: Iterable[str]) -> Type[ColumnTable]:
+        """
+        Returns the table of the given traces, in the given order.
+        Traces without records are left out.
+        """
+        index = {trace_id: idx for idx, trace_id in enumerate(self.trace_ids.tolist())}
+        selected = [index[trace_id] for trace_id in trace_ids if trace_id in index]
+
+        new_index = np.full(len(self.trace_ids), -1, dtype=np.int64)
+        new_index[selected] = np.arange(len(selected))
+        record_index = new_index[self.record_traces]
+        records = np.flatnonzero(record_index >= 0)
+        records = records[np.argsort(record_index[records], kind="stable")]
+
+        present = np.zeros(len(selected), dtype=bool)
+        present[record_index[records]] = True
+        remap = np.cumsum(present) - 1
+
+        series = {}
+        for name, (offsets, times, values) in self.series.items():
+            starts = offsets[:-1][records]
+            lengths = offsets[1:][records] - starts
+            new_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_offsets[1:])
+            samples = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+            series[name] = (new_offsets, times[samples], values[samples])
+
+        return ColumnTable(
+            self.trace_ids[np.array(selected, dtype=np.int64)][present],
+            self.record_ids[records],
+            remap[record_index[records]].astype(np.int32),
+            {name: column[records] for name, column in self.columns.items()},
+            series)
+
+    """
+    Aggregation
+    """
+
+    def sample_records(self, series: str) -> np.ndarray:
+        """
+        Returns the record index of each sample of the series.
+        """
+        offsets, _, _ = self.series[series]
+        return np.repeat(np.arange(self.number_of_records), np.diff(offsets))
+
+    def trace_means(self, series: str, values: np.ndarray = None) -> np.ndarray:
+        """
+        Returns the mean of all samples of each trace.
+        values replaces the sample values of the series.
+        """
+        if values is None:
+            values = self.series[series][2]
+
+        sample_traces = self.record_traces[self.sample_records(series)]
+        return _grouped_means(sample_traces, values, len(self.trace_ids))
+
+    def trace_column_means(self, column: str) -> np.ndarray:
+        """
+        Returns the mean value of the records of each trace.
+        """
+        return _grouped_means(
+            self.record_traces, self.columns[column], len(self.trace_ids))
+
+    """
+    Files
+    """
+
+    def save(self, directory: str, listed: Sequence[str] = None) -> None:
+        """
+        Writes the table into directory, replacing the previous table.
+        Readers that memory-mapped the previous table are not affected.
+        """
+        tmp_directory = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        arrays = {} if listed is None else {
+            LISTED_FILE: np.array(list(listed), dtype=ID_DTYPE)}
+        arrays.update({
+            TRACE_IDS_FILE: self.trace_ids,
+            RECORD_IDS_FILE: self.record_ids,
+            RECORD_TRACES_FILE: self.record_traces})
+        arrays.update(self.columns)
+        for name, (offsets, times, values) in self.series.items():
+            arrays[name + OFFSETS_SUFFIX] = offsets
+            arrays[name + TIMES_SUFFIX] = times
+            arrays[name + VALUES_SUFFIX] = values
+
+        for name, array in arrays.items():
+            np.save(join(tmp_directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+        old_directory = f"{directory}.{os.getpid()}.old"
+        if exists(directory):
+            os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Tuple[Type[ColumnTable], np.ndarray]:
+        """
+        Returns the table in directory and the trace IDs listed when it was
+        written, or None if they were not saved. With mmap, arrays are
+        memory-mapped instead of read.
+        """
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            entry.name[:-len(".npy")]: np.load(entry.path, mmap_mode=mmap_mode)
+            for entry in os.scandir(directory) if entry.name.endswith(".npy")}
+
+        listed = arrays.pop(LISTED_FILE, None)
+        table = cls(
+            arrays.pop(TRACE_IDS_FILE),
+            arrays.pop(RECORD_IDS_FILE),
+            arrays.pop(RECORD_TRACES_FILE))
+
+        for name in [name for name in arrays if name.endswith(OFFSETS_SUFFIX)]:
+            series = name[:-len(OFFSETS_SUFFIX)]
+            table.series[series] = (
+                arrays.pop(name),
+                arrays.pop(series + TIMES_SUFFIX),
+                arrays.pop(series + VALUES_SUFFIX))
+
+        table.columns = arrays
+        return table, listed
+
+
+def _no_samples(table: Type[ColumnTable]) -> Series:
+    return (
+        np.zeros(table.number_of_records + 1, dtype=np.int64),
+        np.array([], dtype=np.float64),
+        np.array([], dtype=np.float64))
+
+
+def _grouped_means(groups: np.ndarray, values: np.ndarray, length: int) -> np.ndarray:
+    valid = ~np.isnan(values)
+    counts = np.bincount(groups[valid], minlength=length)
+    sums = np.bincount(groups[valid], weights=values[valid], minlength=length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+"""
+Export
+"""
+
+
+def trace_columns(trace: Type[Trace]) -> TraceColumns:
+    """
+    Extracts the columns of all exported data keys of the trace.
+    Record data that cannot be loaded is skipped.
+
+    Other data keys get tables of their record IDs without columns, so
+    readers know which data keys a profile has without loading its traces.
+    """
+    records: Dict[str, List[Tuple[str, dict, dict]]] = {}
+    for record in (trace.records or {}).values():
+        for data_key, record_data in (record.data or {}).items():
+            if not record_data or not record_data.results:
+                continue
+
+            extract = COLUMNAR_DATA_KEYS.get(data_key, _no_columns)
+            try:
+                series, values = extract(record_data.results)
+            except Exception as err:
+                _logger.error(
+                    f"Failed to export {data_key} of record {record.record_id}: {err}")
+                continue
+
+            records.setdefault(data_key, []).append(
+                (str(record.record_id), series, values))
+
+    return {
+        data_key: ColumnTable.from_records(str(trace.trace_id), data_key_records)
+        for data_key, data_key_records in records.items()}
+
+
+def _no_columns(results: dict) -> Tuple[dict, dict]:
+    return {}, {}
+
+
+def export_profile_columns(
+    directory: str,
+    profile: Type[Profile],
+    traces: Dict[str, TraceColumns]
+) -> None:
+    """
+    Appends the columns of new or changed traces to the stored columns of the profile.
+
+    Compaction drops the columns of traces that are no longer listed in the profile.
+    """
+    listed = [str(trace_id) for trace_id in profile.trace_ids]
+    profile_directory = join(directory, str(profile.profile_id))
+
+    data_keys = set(chain.from_iterable(traces.values()))
+    if exists(profile_directory):
+        data_keys.update(
+            _data_key(entry.name) for entry in os.scandir(profile_directory)
+            if entry.is_dir() and not entry.name.endswith((".tmp", ".old")))
+
+    for data_key in data_keys:
+        data_key_directory = join(profile_directory, _directory_name(data_key))
+        tables = [
+            columns[data_key] for columns in traces.values() if data_key in columns]
+
+        segments = _segments(data_key_directory)
+        if tables:
+            segment = _segment_name(int(segments[-1]) + 1 if segments else 0)
+            ColumnTable.concat(tables).save(join(data_key_directory, segment))
+            segments.append(segment)
+
+        if len(segments) > MAX_SEGMENTS:
+            _compact_segments(data_key_directory, segments, listed)
+
+        _save_listed(data_key_directory, listed)
+
+
+def _segments(directory: str) -> List[str]:
+    """
+    Returns the names of the segments in directory, oldest first.
+    """
+    if not exists(directory):
+        return []
+
+    return sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.is_dir() and entry.name.isdigit())
+
+
+def _segment_name(number: int) -> str:
+    return str(number).zfill(SEGMENT_DIGITS)
+
+
+def _load_segments(
+    directory: str,
+    segments: List[str],
+    mmap: bool = True
+) -> Type[ColumnTable]:
+    """
+    Returns the table of all traces of the segments, each from the newest
+    segment that contains it.
+    """
+    tables, seen = [], set()
+    for segment in reversed(segments):
+        table, _ = ColumnTable.load(join(directory, segment), mmap=mmap)
+        trace_ids = table.trace_ids.tolist()
+        if seen.intersection(trace_ids):
+            table = table.select(
+                trace_id for trace_id in trace_ids if trace_id not in seen)
+
+        tables.append(table)
+        seen.update(trace_ids)
+
+    if len(tables) == 1:
+        return tables[0]
+
+    return ColumnTable.concat(tables[::-1])
+
+
+def _compact_segments(directory: str, segments: List[str], listed: List[str]) -> None:
+    """
+    Replaces the segments by one segment of the listed traces.
+    Readers see the same traces in the old segments and the compacted one.
+    """
+    table = _load_segments(directory, segments, mmap=False).select(listed)
+    table.save(join(directory, _segment_name(int(segments[-1]) + 1)))
+
+    for segment in segments:
+        shutil.rmtree(join(directory, segment), ignore_errors=True)
+
+
+def _save_listed(directory: str, listed: List[str]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    tmp_file = join(directory, f"{LISTED_FILE}.{os.getpid()}.tmp.npy")
+    np.save(tmp_file, np.array(listed, dtype=ID_DTYPE))
+    os.replace(tmp_file, join(directory, f"{LISTED_FILE}.npy"))
+
+
+def remove_profile_columns(directory: str, profile_id) -> None:
+    """
+    Removes all stored columns of the profile.
+    """
+    shutil.rmtree(join(directory, str(profile_id)), ignore_errors=True)
+
+
+def load_profile_columns(
+    directory: str,
+    profile: Type[Profile],
+    data_keys: Iterable[str] = None
+) -> Dict[str, Type[ColumnTable]]:
+    """
+    Returns the columns of the given data keys of the profile (default: all
+    data keys of its records), in profile order. Arrays of a single segment
+    in profile order are memory-mapped.
+
+    Columns written for another version of the profile are left out.
+    """
+    profile_directory = join(directory, str(profile.profile_id))
+    if not exists(profile_directory):
+        return {}
+
+    if data_keys is None:
+        data_keys = [
+            _data_key(entry.name) for entry in os.scandir(profile_directory)
+            if entry.is_dir() and not entry.name.endswith((".tmp", ".old"))]
+
+    listed = [str(trace_id) for trace_id in profile.trace_ids]
+    columns = {}
+    for data_key in data_keys:
+        data_key_directory = join(profile_directory, _directory_name(data_key))
+        listed_file = join(data_key_directory, f"{LISTED_FILE}.npy")
+        if not exists(listed_file):
+            continue
+
+        try:
+            if np.load(listed_file).tolist() != listed:
+                continue
+
+            table = _load_segments(data_key_directory, _segments(data_key_directory))
+        except Exception as err:
+            _logger.error(f"Failed to load columns {data_key_directory}: {err}")
+            continue
+
+        trace_ids = table.trace_ids.tolist()
+        with_data = set(trace_ids)
+        if trace_ids != [trace_id for trace_id in listed if trace_id in with_data]:
+            table = table.select(listed)
+
+        columns[data_key] = table
+
+    return columns
+
+
+def _directory_name(data_key: str) -> str:
+    return data_key.replace("::", "__")
+
+
+def _data_key(directory_name: str) -> str:
+    return directory_name.replace("__", "::")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrency helpers
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from threading import Lock
+from typing import Any, Callable, Deque, Generator, Iterable, List, Set
+from tqdm import tqdm
+
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_DEPTH = 64
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+
+def prefetch_ordered(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: int = DEFAULT_WORKERS,
+    queue_depth: int = DEFAULT_QUEUE_DEPTH
+) -> Generator[Any, None, None]:
+    """
+    Applies func to all items with a pool of worker threads and yields
+    the results in the order of the items.
+
+    At most queue_depth results are requested ahead of the consumer,
+    which caps the memory held by finished but unconsumed results.
+    Exceptions raised by func are re-raised when their result is consumed.
+    """
+    if workers < 1:
+        raise ValueError(f"Number of workers must be positive, got {workers}")
+
+    if workers == 1:
+        yield from map(func, items)
+        return
+
+    items = iter(items)
+    queue_depth = max(queue_depth, workers)
+
+    pending: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in islice(items, queue_depth):
+                pending.append(executor.submit(func, item))
+
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(executor.submit(func, item))
+
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class BackgroundWriter:
+    """
+    Write-behind stage for storage writes.
+
+    Writes are run by a pool of worker threads, with at most queue_depth
+    writes in flight; submit blocks while the queue is full. Failed writes
+    are retried with exponential backoff. flush is a barrier that waits
+    until all submitted writes are done and raises the first error.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_depth: int = DEFAULT_QUEUE_DEPTH,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        desc: str = "Uploading",
+        progress: bool = True
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f"Number of workers must be positive, got {workers}")
+
+        self.retries = retries
+        self.backoff = backoff
+        self.queue_depth = max(queue_depth, workers)
+        self.desc = desc
+        self.show_progress = progress
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending: Set[Future] = set()
+        self._errors: List[BaseException] = []
+        self._lock = Lock()
+        self._progress: tqdm = None
+
+    def __enter__(self) -> BackgroundWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._close_progress()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> None:
+        """
+        Schedules func(*args). Blocks while queue_depth writes are in flight.
+        """
+        self._raise_errors()
+
+        if len(self._pending) >= self.queue_depth:
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._pending -= done
+
+        with self._lock:
+            if self._progress is None:
+                self._progress = tqdm(
+                    desc=self.desc, total=0, disable=not self.show_progress)
+            self._progress.total += 1
+            self._progress.refresh()
+
+        future = self._executor.submit(self._write, func, *args)
+        future.add_done_callback(self._done)
+        self._pending.add(future)
+
+    def flush(self) -> None:
+        """
+        Waits until all submitted writes are done.
+        Raises the first error of a write that failed after all retries.
+        """
+        wait(self._pending)
+        self._pending.clear()
+        self._close_progress()
+        self._raise_errors()
+
+    def close(self) -> None:
+        """
+        Flushes all writes and stops the workers.
+        """
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _write(self, func: Callable[..., Any], *args: Any) -> Any:
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except Exception as err:
+                if attempt >= self.retries:
+                    raise
+
+                delay = self.backoff * 2 ** attempt
+                logger.warning(
+                    f"Write {getattr(func, '__name__', func)} failed ({err}). "
+                    f"Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            if not future.cancelled() and future.exception() is not None:
+                self._errors.append(future.exception())
+            if self._progress is not None:
+                self._progress.update(1)
+
+    def _close_progress(self) -> None:
+        with self._lock:
+            if self._progress is not None:
+                self._progress.close()
+                self._progress = None
+
+    def _raise_errors(self) -> None:
+        with self._lock:
+            if not self._errors:
+                return
+            error = self._errors[0]
+            self._errors.clear()
+
+        raise RuntimeError(f"Failed to write results: {error}") from error
@@ -4,8 +4,15 @@
 FaaS-Profiler global configuration
 """
 
-from faas_profiler_core.storage import RecordStorage, S3RecordStorage, GCPRecordStorage
+from faas_profiler_core.storage import RecordStorage
+from faas_profiler.concurrency import DEFAULT_WORKERS
+from faas_profiler.disk_cache import CachedRecordStorage, DiskCache, DEFAULT_CACHE_SIZE
+from faas_profiler.metadata_index import MetadataIndex
+from faas_profiler.object_storage import DEFAULT_POOL_SIZE
+from faas_profiler.record_codecs import DEFAULT_CODEC
+from faas_profiler.storage_backends import default_storage_backend, storage_backend
 from faas_profiler_core.constants import Provider
+from threading import Lock
 from typing import Type
 import os
 from os.path import abspath, dirname, join
@@ -25,6 +32,15 @@ class Config:
         self._storage: Type[RecordStorage] = None
         self._region = None
         self._project_id = None
+        self._local_dir = None
+        self._cache_size = DEFAULT_CACHE_SIZE
+        self._metadata_index: Type[MetadataIndex] = None
+        self._load_workers = 2 * DEFAULT_WORKERS
+        self._codec = DEFAULT_CODEC
+        self._storage_backend = None
+        self._pool_size = DEFAULT_POOL_SIZE
+        self._client_per_thread = None
+        self._storage_lock = Lock()
 
         os.makedirs(self.temporary_dir, exist_ok=True)
 
@@ -74,26 +90,136 @@ class Config:
     def project_id(self, project_id) -> None:
         self._project_id = project_id
 
+    @property
+    def local_dir(self) -> str:
+        """
+        Local directory with a copy of the records bucket
+        """
+        return self._local_dir
+
+    @local_dir.setter
+    def local_dir(self, local_dir) -> None:
+        self._local_dir = local_dir
+
+    @property
+    def codec(self) -> str:
+        """
+        Codec of objects written to the storage (see record_codecs)
+        """
+        return self._codec
+
+    @codec.setter
+    def codec(self, codec) -> None:
+        self._codec = codec
+
+    @property
+    def cache_size(self) -> int:
+        """
+        Size limit of the storage cache in bytes. 0 disables the cache.
+        """
+        return self._cache_size
+
+    @cache_size.setter
+    def cache_size(self, cache_size) -> None:
+        self._cache_size = cache_size
+
+    @property
+    def load_workers(self) -> int:
+        """
+        Number of threads loading the traces of a profile.
+        """
+        return self._load_workers
+
+    @load_workers.setter
+    def load_workers(self, load_workers) -> None:
+        self._load_workers = load_workers
+
+    @property
+    def storage_backend(self) -> str:
+        """
+        Name of the storage backend (see storage_backends). Defaults to the
+        local backend with a local directory, otherwise to the core
+        backend of the provider.
+        """
+        if self._storage_backend:
+            return self._storage_backend
+
+        return default_storage_backend(self)
+
+    @storage_backend.setter
+    def storage_backend(self, storage_backend) -> None:
+        self._storage_backend = storage_backend
+
+    @property
+    def pool_size(self) -> int:
+        """
+        Number of connections of each storage client.
+        """
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, pool_size) -> None:
+        self._pool_size = pool_size
+
+    @property
+    def client_per_thread(self) -> bool:
+        """
+        Whether each thread gets its own storage client.
+        None uses the default of the backend.
+        """
+        return self._client_per_thread
+
+    @client_per_thread.setter
+    def client_per_thread(self, client_per_thread) -> None:
+        self._client_per_thread = client_per_thread
+
     @property
     def storage(self) -> Type[RecordStorage]:
         """
-        Returns a storage.
+        Returns the storage of the storage backend, created once by the
+        first thread asking for it. Traces, profiles and graph data of
+        cached backends are read through the storage cache.
         """
         if self._storage is not None:
             return self._storage
 
-        if not self.provider or not self.storage_bucket:
-            raise RuntimeError(
-                "Please set first provider and record bucket name")
-
-        if self.provider == Provider.AWS:
-            self._storage = S3RecordStorage(self.storage_bucket, self.region)
-        elif self.provider == Provider.GCP:
-            self._storage = GCPRecordStorage(
-                self.project_id, self.region, self.storage_bucket)
+        with self._storage_lock:
+            if self._storage is None:
+                self._storage = self._create_storage()
 
         return self._storage
 
+    def _create_storage(self) -> Type[RecordStorage]:
+        backend = storage_backend(self.storage_backend)
+        storage = backend.create(self)
+
+        if backend.cached and self.cache_size:
+            storage = CachedRecordStorage(
+                storage, DiskCache(self.cache_file, self.cache_size))
+
+        return storage
+
+    @storage.setter
+    def storage(self, storage: Type[RecordStorage]) -> None:
+        self._storage = storage
+
+    def reset_storage(self) -> None:
+        """
+        Forgets the storage client and the metadata index, e.g. in a new worker process.
+        """
+        self._storage = None
+        self._metadata_index = None
+
+    @property
+    def metadata_index(self) -> Type[MetadataIndex]:
+        """
+        Returns the local metadata index of the records bucket.
+        """
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadata_index_file)
+
+        return self._metadata_index
+
     @property
     def examples_dir(self) -> str:
         """
@@ -115,5 +241,50 @@ class Config:
         """
         return join(PROJECT_ROOT, "profiler_tmp")
 
+    @property
+    def default_local_dir(self) -> str:
+        """
+        Returns the default directory for the local copy of the records bucket.
+        """
+        return join(
+            self.temporary_dir, "records", f"{self.provider.value}_{self.storage_bucket}")
+
+    @property
+    def cache_file(self) -> str:
+        """
+        Returns the file of the storage cache of the records bucket.
+        """
+        return join(
+            self.temporary_dir,
+            f"{self.provider.value}_{self.storage_bucket}_cache.sqlite")
+
+    @property
+    def columnar_dir(self) -> str:
+        """
+        Returns the directory for the exported columns of the profiles of the records bucket.
+        """
+        return join(
+            self.temporary_dir,
+            "columns",
+            f"{self.provider.value}_{self.storage_bucket}")
+
+    @property
+    def metadata_index_file(self) -> str:
+        """
+        Returns the file of the metadata index of the records bucket.
+        """
+        return join(
+            self.temporary_dir,
+            f"{self.provider.value}_{self.storage_bucket}_index.sqlite")
+
+    @property
+    def processing_state_file(self) -> str:
+        """
+        Returns the file for the persisted post-processing state of the records bucket.
+        """
+        return join(
+            self.temporary_dir,
+            f"{self.provider.value}_{self.storage_bucket}_processing_state.pickle")
+
 
 config = Config()
@@ -4,33 +4,180 @@ Core functions
 
 import logging
 
-from typing import List, Type
-from uuid import UUID
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Generator, List, Tuple, Type
+from uuid import UUID, uuid5
 
+from faas_profiler.concurrency import prefetch_ordered
 from faas_profiler.config import config
 from faas_profiler_core.models import TraceRecord, Profile, Trace
 
 _logger = logging.getLogger(__name__)
 
+PROFILE_NAMESPACE = UUID("0b8f3c9e-6d1a-5f4b-9c2e-7a1d4e8f6b3c")
+
+# Trace ID with the loaded trace, or with the error if loading failed
+TraceLoadResult = Tuple[UUID, Type[Trace], Exception]
+
 """
 Profile methods
 """
 
 
-def load_all_profile_traces(profile: Type[Profile]) -> List[Type[Trace]]:
+def profile_id_of(function_key: str) -> UUID:
     """
-    Loads all profile traces
+    Returns the stable profile ID of a function key.
     """
-    traces = []
-    for trace_id in profile.trace_ids:
-        try:
-            traces.append(config.storage.get_trace(trace_id))
-        except Exception as err:
-            _logger.error(f"Failed to load trace ID {trace_id}: {err}")
+    return uuid5(PROFILE_NAMESPACE, function_key)
 
+
+def load_all_profile_traces(
+    profile: Type[Profile],
+    workers: int = None
+) -> List[Type[Trace]]:
+    """
+    Loads all profile traces in profile order.
+    Traces that fail to load are logged and left out.
+    """
+    traces, _ = load_profile_traces(profile, workers)
     return traces
 
 
+def load_profile_traces(
+    profile: Type[Profile],
+    workers: int = None
+) -> Tuple[List[Type[Trace]], Dict[UUID, Exception]]:
+    """
+    Loads all profile traces in profile order.
+
+    Returns the loaded traces and the errors of traces that failed to load.
+    """
+    traces, errors = [], {}
+    for trace_id, trace, error in iter_profile_traces(profile, workers):
+        if error is None:
+            traces.append(trace)
+        else:
+            errors[trace_id] = error
+
+    return traces, errors
+
+
+def iter_profile_traces(
+    profile: Type[Profile],
+    workers: int = None,
+    ordered: bool = True
+) -> Generator[TraceLoadResult, None, None]:
+    """
+    Loads profile traces with a pool of worker threads (default: config.load_workers)
+    and yields each trace as soon as it is loaded.
+
+    If ordered, traces are yielded in profile order, otherwise in the order they arrive.
+    A failed trace is yielded with its error instead of aborting the load.
+    """
+    workers = workers or config.load_workers
+    if ordered:
+        yield from prefetch_ordered(_load_trace, profile.trace_ids, workers=workers)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_load_trace, trace_id) for trace_id in profile.trace_ids]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _load_trace(trace_id: UUID) -> TraceLoadResult:
+    try:
+        return trace_id, config.storage.get_trace(trace_id), None
+    except Exception as err:
+        _logger.error(f"Failed to load trace ID {trace_id}: {err}")
+        return trace_id, None, err
+
+
+"""
+Index queries
+"""
+
+
+def find_profiles(
+    function_key: str = None,
+    order_by: str = "function_key",
+    descending: bool = False,
+    limit: int = None,
+    offset: int = 0
+) -> List[dict]:
+    """
+    Returns profile summaries from the metadata index.
+    """
+    return config.metadata_index.profiles(
+        function_key=function_key,
+        order_by=order_by,
+        descending=descending,
+        limit=limit,
+        offset=offset)
+
+
+def find_traces(
+    function_key: str = None,
+    profile_id: UUID = None,
+    since: datetime = None,
+    until: datetime = None,
+    min_duration: float = None,
+    order_by: str = "invoked_at",
+    descending: bool = False,
+    limit: int = None,
+    offset: int = 0
+) -> List[dict]:
+    """
+    Returns trace summaries from the metadata index.
+
+    E.g. the 50 slowest traces of a function in the last week:
+        find_traces(function_key, since=datetime.now() - timedelta(days=7),
+                    order_by="duration", descending=True, limit=50)
+    """
+    return config.metadata_index.traces(
+        function_key=function_key,
+        profile_id=profile_id,
+        since=since,
+        until=until,
+        min_duration=min_duration,
+        order_by=order_by,
+        descending=descending,
+        limit=limit,
+        offset=offset)
+
+
+def find_records(
+    function_key: str = None,
+    trace_id: UUID = None,
+    since: datetime = None,
+    until: datetime = None,
+    cold_start: bool = None,
+    order_by: str = "invoked_at",
+    descending: bool = False,
+    limit: int = None,
+    offset: int = 0
+) -> List[dict]:
+    """
+    Returns record metadata from the metadata index.
+    """
+    return config.metadata_index.records(
+        function_key=function_key,
+        trace_id=trace_id,
+        since=since,
+        until=until,
+        cold_start=cold_start,
+        order_by=order_by,
+        descending=descending,
+        limit=limit,
+        offset=offset)
+
+
 """
 Trace methods
 """
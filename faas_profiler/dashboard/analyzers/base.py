@@ -8,6 +8,7 @@ from abc import ABC
 from enum import Enum
 from typing import Dict, Type
 from uuid import UUID
+from faas_profiler.columnar import ColumnTable
 from faas_profiler.utilis import Loggable
 
 from faas_profiler_core.models import RecordData
@@ -39,6 +40,12 @@ class Analyzer(ABC, Loggable):
     def analyze_profile(self, traces_data: Dict[UUID, Type[RecordData]]):
         raise NotImplementedError
 
+    def analyze_profile_columns(self, columns: Type[ColumnTable]):
+        """
+        Analyzes the exported columns of a profile (see faas_profiler.columnar).
+        """
+        raise NotImplementedError
+
     def analyze_trace(
         self,
         record_data: Dict[str, Type[RecordData]]
@@ -15,6 +15,7 @@ from dash import html, dcc
 
 from faas_profiler_core.models import CPUUsage, CPUCoreUsage
 
+from faas_profiler.columnar import ColumnTable
 from faas_profiler.utilis import seconds_to_ms
 from faas_profiler.dashboard.analyzers.base import Analyzer
 from faas_profiler_core.models import RecordData
@@ -111,6 +112,15 @@ class CPUUsageAnalyzer(Analyzer):
                 "Average Usage": np.array(trace_usage).mean()
             }, index=[idx])])
 
+        return self._profile_figure(df)
+
+    def analyze_profile_columns(self, columns: Type[ColumnTable]):
+        return self._profile_figure(pd.DataFrame({
+            "Trace ID": [trace_id[:8] for trace_id in columns.trace_ids.tolist()],
+            "Average Usage": columns.trace_means("usage")
+        }))
+
+    def _profile_figure(self, df: pd.DataFrame):
         fig = px.line(
             df,
             x="Trace ID",
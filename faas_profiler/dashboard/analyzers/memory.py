@@ -14,6 +14,7 @@ from plotly.subplots import make_subplots
 
 from faas_profiler_core.models import MemoryUsage, MemoryLineUsage
 
+from faas_profiler.columnar import ColumnTable
 from faas_profiler.dashboard.analyzers.base import Analyzer
 from faas_profiler_core.models import RecordData
 
@@ -158,6 +159,19 @@ class MemoryUsageAnalyzer(Analyzer):
                 "Average Usage Delta": np.array(trace_usage_delta).mean()
             }, index=[idx])])
 
+        return self._profile_figure(df)
+
+    def analyze_profile_columns(self, columns: Type[ColumnTable]):
+        _, _, rss = columns.series["rss"]
+        baselines = columns.columns["rss_baseline"][columns.sample_records("rss")]
+
+        return self._profile_figure(pd.DataFrame({
+            "Trace ID": [trace_id[:8] for trace_id in columns.trace_ids.tolist()],
+            "Average Usage Total": columns.trace_means("rss"),
+            "Average Usage Delta": columns.trace_means("rss", rss - baselines)
+        }))
+
+    def _profile_figure(self, df: pd.DataFrame):
         multiplier_tot, bytes_unit_tot = convert_bytes_to_best_unit(
             df["Average Usage Total"].max())
         df['Average Usage Total'] = df['Average Usage Total'].apply(
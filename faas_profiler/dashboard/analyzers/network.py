@@ -20,6 +20,7 @@ from dash import html, dcc
 from faas_profiler_core.models import NetworkIOCounters, NetworkConnections
 from faas_profiler_core.models import RecordData
 
+from faas_profiler.columnar import ColumnTable
 from faas_profiler.dashboard.analyzers.base import Analyzer
 from faas_profiler.utilis import bytes_to_kb, get_idx_safely, convert_bytes_to_best_unit, short_uuid
 
@@ -49,6 +50,18 @@ class NetworkIOAnalyzer(Analyzer):
                 "Average Packets Received": np.array(packets_received).mean()
             }, index=[idx])])
 
+        return self._profile_figure(df)
+
+    def analyze_profile_columns(self, columns: Type[ColumnTable]):
+        return self._profile_figure(pd.DataFrame({
+            "Trace ID": [trace_id[:8] for trace_id in columns.trace_ids.tolist()],
+            "Average Bytes Sent": columns.trace_column_means("bytes_sent"),
+            "Average Bytes Received": columns.trace_column_means("bytes_received"),
+            "Average Packets Sent": columns.trace_column_means("packets_sent"),
+            "Average Packets Received": columns.trace_column_means("packets_received")
+        }))
+
+    def _profile_figure(self, df: pd.DataFrame):
         multiplier, bytes_unit = convert_bytes_to_best_unit(
             max(df["Average Bytes Sent"].max(), df["Average Bytes Received"].max()))
         df['Average Bytes Sent'] = df['Average Bytes Sent'].apply(
@@ -6,6 +6,11 @@ Module for graph rendering
 from __future__ import annotations
 
 import dash_cytoscape as cyto
+import numpy as np
+
+from collections import defaultdict
+from typing import Dict, List
+from uuid import NAMESPACE_OID, uuid5
 
 from faas_profiler_core.constants import TriggerSynchronicity
 
@@ -17,6 +22,11 @@ SERVICE_NODE = "service_node"
 NODE_SIZE_LIMIT = (10, 100)
 EDGE_SIZE_LIMIT = (2, 20)
 
+CRITICAL_COLOR = "#DC3545"
+DUPLICATE_COLOR = "#FFC107"
+
+FAN_OUT_LIMIT = 10
+
 """
 Graphing
 """
@@ -92,11 +102,179 @@ Graphing
 #     return G
 
 
-def render_cytoscape_graph(data: dict):
+"""
+Level of detail
+"""
+
+
+def level_of_detail(
+    elements: dict,
+    limit: int = FAN_OUT_LIMIT,
+    expanded: Dict[str, int] = {}
+) -> dict:
+    """
+    Collapses fan-outs of the cytoscape elements.
+
+    Sibling nodes with the same type and function (first label line) and the same parent
+    are replaced by one aggregate node if there are more than limit of them.
+    Children of collapsed siblings are grouped the same way, so a collapsed
+    fan-out keeps its shape. Parallel edges between collapsed nodes are
+    merged, too.
+
+    expanded maps aggregate node IDs to the number of their members that
+    are shown individually. All remaining members stay collapsed.
+    """
+    nodes = {node["data"]["id"]: node["data"] for node in elements["nodes"]}
+
+    parents: Dict[str, str] = {}
+    children: Dict[str, List[str]] = defaultdict(list)
+    for edge in elements["edges"]:
+        source, target = edge["data"]["source"], edge["data"]["target"]
+        if target not in parents:
+            parents[target] = source
+            children[source].append(target)
+
+    canonical: Dict[str, str] = {}
+    members: Dict[str, List[str]] = {}
+
+    level = [node_id for node_id in nodes if node_id not in parents]
+    for node_id in level:
+        canonical[node_id] = node_id
+        members[node_id] = [node_id]
+
+    while level:
+        next_level = []
+        for parent_id in level:
+            siblings: Dict[tuple, List[str]] = defaultdict(list)
+            for member_id in members[parent_id]:
+                for child_id in children[member_id]:
+                    child = nodes.get(child_id, {})
+                    siblings[(child.get("type"), _group_label(child))].append(child_id)
+
+            for (node_type, label), sibling_ids in siblings.items():
+                group_id = str(uuid5(NAMESPACE_OID, f"{parent_id}/{node_type}/{label}"))
+                if len(sibling_ids) > limit:
+                    sibling_ids = sorted(
+                        sibling_ids, key=lambda n: (str(nodes[n].get("invoked_at")), n))
+                    shown = expanded.get(group_id, 0)
+                    individuals, collapsed = sibling_ids[:shown], sibling_ids[shown:]
+                else:
+                    individuals, collapsed = sibling_ids, []
+
+                for node_id in individuals:
+                    canonical[node_id] = node_id
+                    members[node_id] = [node_id]
+                    next_level.append(node_id)
+
+                if collapsed:
+                    for node_id in collapsed:
+                        canonical[node_id] = group_id
+                    members[group_id] = collapsed
+                    next_level.append(group_id)
+
+        level = next_level
+
+    collapsed_nodes = []
+    for node_id, data in nodes.items():
+        if canonical.setdefault(node_id, node_id) == node_id:
+            collapsed_nodes.append({"data": data})
+
+    for group_id, member_ids in members.items():
+        if group_id not in nodes:
+            collapsed_nodes.append({"data": _aggregate_node(
+                group_id, [nodes[node_id] for node_id in member_ids])})
+
+    parallel_edges: Dict[tuple, List[dict]] = defaultdict(list)
+    for edge in elements["edges"]:
+        data = edge["data"]
+        parallel_edges[(
+            canonical[data["source"]],
+            canonical[data["target"]],
+            data.get("type"))].append(data)
+
+    collapsed_edges = []
+    for (source, target, _), edges in parallel_edges.items():
+        if len(edges) == 1 and source in nodes and target in nodes:
+            collapsed_edges.append({"data": edges[0]})
+        else:
+            collapsed_edges.append(
+                {"data": _aggregate_edge(source, target, edges)})
+
+    return {"nodes": collapsed_nodes, "edges": collapsed_edges}
+
+
+def _group_label(node: dict) -> str:
+    return str(node.get("label", "")).split("\n")[0]
+
+
+def _aggregate_node(group_id: str, nodes: List[dict]) -> dict:
+    times = np.array([
+        node.get("total_execution_time") or 0.0 for node in nodes], dtype=float)
+    sizes = np.array([node.get("size", 0.0) for node in nodes], dtype=float)
+    borders = np.array([node.get("border", 0.0) for node in nodes], dtype=float)
+
+    return {
+        "id": group_id,
+        "type": nodes[0].get("type"),
+        "aggregate": True,
+        "count": len(nodes),
+        "critical": any(node.get("critical") for node in nodes),
+        "duplicate": any(node.get("duplicate") for node in nodes),
+        "total_execution_time": float(np.median(times)),
+        "min_execution_time": float(times.min()),
+        "median_execution_time": float(np.median(times)),
+        "max_execution_time": float(times.max()),
+        "size": float(sizes.max()),
+        "border": float(np.median(borders)),
+        "label": "{label}\n{count}x, {min:.2f}/{median:.2f}/{max:.2f} ms".format(
+            label=_group_label(nodes[0]),
+            count=len(nodes),
+            min=times.min(),
+            median=np.median(times),
+            max=times.max())}
+
+
+def _aggregate_edge(source: str, target: str, edges: List[dict]) -> dict:
+    latencies = np.array([
+        edge["latency"] for edge in edges
+        if edge.get("latency") is not None], dtype=float)
+    weights = np.array([edge.get("weight", 1.0) for edge in edges], dtype=float)
+
+    data = {
+        "source": source,
+        "target": target,
+        "type": edges[0].get("type"),
+        "aggregate": True,
+        "count": len(edges),
+        "critical": any(edge.get("critical") for edge in edges),
+        "inferred": any(edge.get("inferred") for edge in edges),
+        "latency": None,
+        "weight": float(weights.max()),
+        # Edges of unknown latency are labeled as such
+        "label": "{count}x, {label}".format(count=len(edges), label=edges[0].get("label"))}
+
+    if len(latencies):
+        data.update({
+            "latency": float(np.median(latencies)),
+            "min_latency": float(latencies.min()),
+            "median_latency": float(np.median(latencies)),
+            "max_latency": float(latencies.max()),
+            "label": "{count}x, {min:.2f}/{median:.2f}/{max:.2f} ms".format(
+                count=len(edges),
+                min=latencies.min(),
+                median=np.median(latencies),
+                max=latencies.max())})
+
+    return data
+
+
+def render_cytoscape_graph(data: dict, element_id: str = None):
     """
     Renders the networkx graph as cytoscape graph for Dash.
     """
+    options = {} if element_id is None else {"id": element_id}
     return cyto.Cytoscape(
+        **options,
         layout={"name": "dagre"},
         style={"width": "100%", "height": "700px"},
         elements=data["elements"],
@@ -165,5 +343,40 @@ def render_cytoscape_graph(data: dict):
                     'curve-style': 'bezier'
                 }
             },
+            {
+                'selector': 'node[?aggregate]',
+                'style': {
+                    'shape': 'round-rectangle',
+                    'border-style': 'dashed'
+                }
+            },
+            {
+                'selector': 'edge[?inferred]',
+                'style': {
+                    'line-style': 'dashed'
+                }
+            },
+            {
+                'selector': 'node[?duplicate]',
+                'style': {
+                    'background-color': DUPLICATE_COLOR
+                }
+            },
+            {
+                'selector': 'node[?critical]',
+                'style': {
+                    'border-color': CRITICAL_COLOR,
+                    'border-width': 'data(border)',
+                    'border-style': 'double'
+                }
+            },
+            {
+                'selector': 'edge[?critical]',
+                'style': {
+                    'line-color': CRITICAL_COLOR,
+                    'target-arrow-color': CRITICAL_COLOR,
+                    'source-arrow-color': CRITICAL_COLOR
+                }
+            },
         ]
     )
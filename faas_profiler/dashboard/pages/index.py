@@ -9,33 +9,72 @@ from dash import html
 import dash_bootstrap_components as dbc
 
 from faas_profiler.config import config
+from faas_profiler.core import find_profiles
 from faas_profiler_core.models import Profile
 
 
 def profile_card(profile: Type[Profile]) -> dbc.Card:
-    _table_items = []
-
     _title = profile.profile_id
 
     _function_context = profile.function_context
     if _function_context:
-        _table_items.extend([
-            dbc.ListGroupItem([html.B("Provider: "), _function_context.provider.value]),
-            dbc.ListGroupItem([html.B("Region: "), _function_context.region]),
-            dbc.ListGroupItem([html.B("Handler: "), _function_context.handler]),
-            dbc.ListGroupItem([html.B("Runtime: "), _function_context.runtime.value]),
-        ])
-        _title = _function_context.function_key
+        return _profile_card(
+            profile.profile_id,
+            _function_context.function_key,
+            len(profile.trace_ids),
+            provider=_function_context.provider.value,
+            region=_function_context.region,
+            handler=_function_context.handler,
+            runtime=_function_context.runtime.value)
+
+    return _profile_card(profile.profile_id, _title, len(profile.trace_ids))
+
+
+def indexed_profile_card(profile: dict) -> dbc.Card:
+    """
+    Card of a profile summary of the metadata index.
+    Sampled profiles show their estimated number of traces.
+    """
+    estimated_traces = None
+    if (profile["sampling_weight"] or 1.0) > 1.0:
+        estimated_traces = profile["estimated_traces"]
+
+    return _profile_card(
+        profile["profile_id"],
+        profile["function_key"] or profile["profile_id"],
+        profile["number_of_traces"],
+        estimated_traces=estimated_traces,
+        provider=profile["provider"],
+        region=profile["region"],
+        handler=profile["handler"],
+        runtime=profile["runtime"])
+
+
+def _profile_card(
+    profile_id,
+    title: str,
+    number_of_traces: int,
+    estimated_traces: float = None,
+    **details
+) -> dbc.Card:
+    _table_items = [
+        dbc.ListGroupItem([html.B(f"{name.capitalize()}: "), value])
+        for name, value in details.items() if value is not None]
+
+    _badges = [dbc.Badge(f"Traces: {number_of_traces}", className="ms-1")]
+    if estimated_traces is not None:
+        _badges.append(dbc.Badge(
+            f"Sampled from ~{estimated_traces:,.0f}", color="secondary", className="ms-1"))
 
     return dbc.Card([
         dbc.CardBody(
             [
                 html.H4([
-                    str(_title),
-                    dbc.Badge(f"Traces: {len(profile.trace_ids)}", className="ms-1")
+                    str(title),
+                    *_badges
                 ], className="card-title"),
                 dbc.ListGroup(_table_items, flush=True),
-                dbc.Button("View Profile", href=f"/profile/{profile.profile_id}", color="primary"),
+                dbc.Button("View Profile", href=f"/profile/{profile_id}", color="primary"),
             ]
         ),
     ], style={"margin-bottom": "10px"})
@@ -45,8 +84,14 @@ def index():
     """
     Layout for index page.
 
-    Shows all profiles.
+    Shows all profiles. Profiles are listed from the metadata index if
+    post-processing ran on this machine, otherwise loaded from the storage.
     """
+    if config.metadata_index.has_profiles:
+        return dbc.Container([
+            html.Div([indexed_profile_card(profile) for profile in find_profiles()]),
+        ], style={"margin-top": "20px"})
+
     if not config.storage.has_profiles:
         return html.Div(
             html.H4(
@@ -1,18 +1,32 @@
 import dash_bootstrap_components as dbc
 
-from typing import Type, Dict, Any, List
+from typing import Any, Callable, Dict, List, Set, Type
 from dash import html
 
 from faas_profiler_core.models import Profile
 
-from faas_profiler.core import group_traces_data_by_key, load_all_profile_traces
+from faas_profiler.columnar import ColumnTable, load_profile_columns
+from faas_profiler.config import config
+from faas_profiler.core import group_traces_data_by_key, load_profile_traces
 from faas_profiler.dashboard.analyzers.base import Analyzer
 from faas_profiler.dashboard.analyzers import * # noqa
 
 TRACE_LABEL = "{trace_id} (Invocation {no} of {trace_nos})"
 
 
-def make_analyzer_cards(data: Dict[str, Any]) -> List[dbc.Card]:
+def make_analyzer_cards(
+    load_data: Callable[[], Dict[str, Any]],
+    columns: Dict[str, Type[ColumnTable]] = {},
+    data_keys: Set[str] = None
+) -> List[dbc.Card]:
+    """
+    Returns the profile cards of all analyzers. Analyzers use the exported
+    columns of their data if available, and the traces data otherwise.
+
+    The traces data is only loaded, by load_data, if an analyzer needs it.
+    With the data keys of the profile known, analyzers of missing data keys
+    show that there is no data without loading.
+    """
     def _analyzer_card(
         header: str,
         content: str
@@ -24,18 +38,39 @@ def make_analyzer_cards(data: Dict[str, Any]) -> List[dbc.Card]:
             ])
         ], style={"margin-top": "20px"})
 
+    def _no_data_card(header: str, requested_data: str) -> dbc.Card:
+        return _analyzer_card(
+            header=header,
+            content=f"There is no data for {requested_data} for this profile")
+
+    data = None
     _analyser_cards: List[dbc.Card] = []
     for analyzer_cls in Analyzer.__subclasses__():
         _requested_data = analyzer_cls.requested_data
         _name = analyzer_cls.safe_name()
+        analyzer = analyzer_cls()
+        _columns = columns.get(_requested_data)
+        if _columns is not None and _columns.number_of_records and \
+                _implements(analyzer_cls, "analyze_profile_columns"):
+            _analyser_cards.append(_analyzer_card(
+                header=_name,
+                content=analyzer.analyze_profile_columns(_columns)))
+            continue
+
+        if data_keys is not None and _requested_data not in data_keys:
+            _analyser_cards.append(_no_data_card(_name, _requested_data))
+            continue
+
+        if not _implements(analyzer_cls, "analyze_profile"):
+            continue
+
+        if data is None:
+            data = load_data()
+
         if _requested_data not in data:
-            _analyser_cards.append(
-                _analyzer_card(
-                    header=_name,
-                    content=f"There is no data for {_requested_data} for this profile"))
+            _analyser_cards.append(_no_data_card(_name, _requested_data))
             continue
 
-        analyzer = analyzer_cls()
         try:
             _analyser_cards.append(_analyzer_card(
                 header=_name,
@@ -46,9 +81,34 @@ def make_analyzer_cards(data: Dict[str, Any]) -> List[dbc.Card]:
     return _analyser_cards
 
 
+def _implements(analyzer_cls: Type[Analyzer], method: str) -> bool:
+    return getattr(analyzer_cls, method) is not getattr(Analyzer, method)
+
+
 def profile_view(profile: Type[Profile]):
-    profile_traces = load_all_profile_traces(profile)
-    profile_data = group_traces_data_by_key(
-        profile_traces, sort_by_invocation=True)
+    profile_columns = load_profile_columns(config.columnar_dir, profile)
+
+    # Without exported columns, the data keys of the profile are unknown
+    data_keys = None
+    if profile_columns:
+        data_keys = {
+            data_key for data_key, columns in profile_columns.items()
+            if columns.number_of_records}
+
+    errors = {}
+
+    def _load_profile_data() -> Dict[str, Any]:
+        profile_traces, trace_errors = load_profile_traces(profile)
+        errors.update(trace_errors)
+        return group_traces_data_by_key(profile_traces, sort_by_invocation=True)
+
+    cards = make_analyzer_cards(_load_profile_data, profile_columns, data_keys)
+
+    _contents = []
+    if errors:
+        _contents.append(dbc.Alert(
+            f"Failed to load {len(errors)} of {len(profile.trace_ids)} traces.",
+            color="warning",
+            style={"margin-top": "20px"}))
 
-    return html.Div(make_analyzer_cards(profile_data))
+    return html.Div(_contents + cards)
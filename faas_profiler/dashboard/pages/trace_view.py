@@ -1,17 +1,49 @@
+import dash
 import dash_bootstrap_components as dbc
 
 from typing import Type, List, Dict, Any
-from dash import html
-
-from faas_profiler.dashboard.graphing import render_cytoscape_graph
+from dash import html, dcc, Input, Output, State
+from dash.exceptions import PreventUpdate
+
+from faas_profiler.dashboard.graphing import (
+    FAN_OUT_LIMIT,
+    level_of_detail,
+    render_cytoscape_graph
+)
 from faas_profiler.config import config
 from faas_profiler.utilis import short_uuid, detail_link
 from faas_profiler.core import group_record_data_by_key
+from faas_profiler.graph_encoding import decode_graph_data
 
 from faas_profiler_core.models import Trace, TraceRecord
 from faas_profiler.dashboard.analyzers.base import Analyzer
 from faas_profiler.dashboard.analyzers import * # noqa
 
+TRACE_GRAPH_ID = "trace-graph"
+TRACE_GRAPH_STATE_ID = "trace-graph-state"
+
+
+@dash.callback(
+    Output(TRACE_GRAPH_ID, "elements"),
+    Output(TRACE_GRAPH_STATE_ID, "data"),
+    Input(TRACE_GRAPH_ID, "tapNodeData"),
+    State(TRACE_GRAPH_STATE_ID, "data"))
+def expand_aggregate_node(node_data: dict, graph_state: dict):
+    """
+    Shows FAN_OUT_LIMIT more members of a tapped aggregate node.
+    """
+    if not node_data or not node_data.get("aggregate"):
+        raise PreventUpdate
+
+    expanded = dict(graph_state["expanded"])
+    expanded[node_data["id"]] = expanded.get(node_data["id"], 0) + FAN_OUT_LIMIT
+
+    graph_data = decode_graph_data(
+        config.storage.get_graph_data(graph_state["trace_id"]))
+    elements = level_of_detail(graph_data["elements"], expanded=expanded)
+
+    return elements, dict(graph_state, expanded=expanded)
+
 
 def make_analyzer_cards(data: Dict[str, Any]) -> List[dbc.Card]:
     def _analyzer_card(
@@ -62,9 +94,22 @@ def trace_view(
     """
     root_record = trace.records[trace.root_record_id]
 
+    graph_data = None
     try:
-        trace_graph = render_cytoscape_graph(
+        graph_data = decode_graph_data(
             config.storage.get_graph_data(trace.trace_id))
+        trace_graph = html.Div([
+            render_cytoscape_graph(
+                dict(graph_data, elements=level_of_detail(graph_data["elements"])),
+                element_id=TRACE_GRAPH_ID),
+            dcc.Store(
+                id=TRACE_GRAPH_STATE_ID,
+                data={"trace_id": str(trace.trace_id), "expanded": {}}),
+            html.Small(
+                f"Fan-outs of more than {FAN_OUT_LIMIT} calls of the same function "
+                "are collapsed. Click a dashed node to expand it.",
+                className="text-muted")
+        ])
     except Exception as err:
         trace_graph = html.P(f"Failed to fetch execution graph: {err}")
 
@@ -76,9 +121,34 @@ def trace_view(
                     f"Contains {len(trace.records)} records.", className="card-text"),
                 html.P(
                     "Duration: {:.2f} ms.".format(trace.duration), className="card-text"),
+                _critical_path(),
             ]),
         ], color="light", style={"margin-bottom": "10px"})
 
+    def _critical_path():
+        graph_attributes = dict(graph_data.get("data", [])) if graph_data else {}
+        if "critical_path" not in graph_attributes:
+            return None
+
+        nodes = {
+            node["data"]["id"]: node["data"]
+            for node in graph_data["elements"]["nodes"]}
+        path = [
+            nodes[node_id] for node_id in graph_attributes["critical_path"]
+            if node_id in nodes]
+
+        return html.Div([
+            html.P(
+                "Critical path: {:.2f} ms over {} nodes.".format(
+                    graph_attributes["critical_path_duration"], len(path)),
+                className="card-text"),
+            html.Ol([
+                html.Li("{} (+{:.2f} ms)".format(
+                    node.get("label", node["id"]).replace("\n", " "),
+                    node.get("critical_time", 0.0)))
+                for node in path])
+        ])
+
     def _record_selection(record):
         if record is None:
             label = "Current record selection: View all records"
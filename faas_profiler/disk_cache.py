@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent read-through cache of processed objects
+
+Traces, profiles and graph data are cached in an SQLite file in the
+temporary directory, so repeated reads do not reach the records storage.
+The cache is bounded in size and evicts approximately least recently
+used objects: hits only refresh access times older than
+ACCESS_RESOLUTION, and the refreshed times are written in batches.
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import time
+
+from threading import Lock, local
+from typing import Any, Callable, Dict, Type
+from uuid import UUID
+
+from faas_profiler_core.models import Profile, Trace
+from faas_profiler_core.storage import RecordStorage
+
+from faas_profiler.stats import stats
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+# Share of max_size kept after eviction
+EVICTION_TARGET = 0.9
+# Seconds to wait for other processes writing the cache
+LOCK_TIMEOUT = 30.0
+# Seconds after which a hit refreshes the access time of an object
+ACCESS_RESOLUTION = 60.0
+# Number of refreshed access times written at once
+ACCESS_BATCH_SIZE = 256
+
+TRACE_KEY = "trace"
+PROFILE_KEY = "profile"
+GRAPH_KEY = "graph"
+
+
+class DiskCache:
+    """
+    Thread-safe LRU cache of pickled objects in an SQLite file.
+
+    Each thread reads through its own connection, so hits do not wait
+    for each other. Writes share one connection under a lock, buffered
+    access times are guarded by a separate lock that is never held
+    during queries.
+
+    The file can be shared by multiple processes. Hits, misses and
+    evictions are counted per process.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._connection: sqlite3.Connection = None
+        self._readers = local()
+        self._accessed: Dict[str, float] = {}
+        self._accessed_lock = Lock()
+
+    def get(self, key: str) -> Any:
+        """
+        Returns the cached object of the key or None.
+        """
+        row = self._reader().execute(
+            "SELECT payload, accessed_at FROM objects WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with self._accessed_lock:
+                self.misses += 1
+            stats.count("cache_misses")
+            return None
+
+        payload, accessed_at = row
+        now = time.time()
+        with self._accessed_lock:
+            self.hits += 1
+            if now - accessed_at > ACCESS_RESOLUTION:
+                self._accessed[key] = now
+            full = len(self._accessed) >= ACCESS_BATCH_SIZE
+
+        stats.count("cache_hits")
+        if full:
+            self.flush()
+
+        return pickle.loads(payload)
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Caches the object and evicts least recently used objects
+        if the cache is full.
+        """
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_size:
+            return
+
+        with self._lock:
+            connection = self._open()
+            with connection:
+                self._write_accessed(connection)
+                connection.execute(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                    (key, len(payload), time.time(), payload))
+                self._evict(connection)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered access times.
+        """
+        with self._lock:
+            connection = self._open()
+            with connection:
+                self._write_accessed(connection)
+
+    def get_or_load(self, key: str, load: Callable[[], Any]) -> Any:
+        """
+        Returns the cached object of the key, or loads and caches it.
+        """
+        value = self.get(key)
+        if value is None:
+            value = load()
+            self.put(key, value)
+
+        return value
+
+    def invalidate(self, key: str) -> None:
+        """
+        Removes the object of the key.
+        """
+        with self._lock:
+            connection = self._open()
+            with connection:
+                connection.execute("DELETE FROM objects WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """
+        Removes all objects.
+        """
+        with self._lock:
+            connection = self._open()
+            with connection:
+                connection.execute("DELETE FROM objects")
+            connection.execute("VACUUM")
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the total size of all cached objects in bytes.
+        """
+        with self._lock:
+            return self._size(self._open())
+
+    def __len__(self) -> int:
+        with self._lock:
+            (number,) = self._open().execute(
+                "SELECT COUNT(*) FROM objects").fetchone()
+            return number
+
+    def info(self) -> dict:
+        """
+        Returns entries, size and hit/miss statistics of the cache.
+        """
+        requests = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else None,
+            "evictions": self.evictions}
+
+    """
+    Cache file
+    """
+
+    def _write_accessed(self, connection: sqlite3.Connection) -> None:
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+
+        connection.executemany(
+            "UPDATE objects SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in accessed.items()])
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        size = self._size(connection)
+        if size <= self.max_size:
+            return
+
+        target = int(self.max_size * EVICTION_TARGET)
+        evicted = []
+        for key, object_size in connection.execute(
+            "SELECT key, size FROM objects ORDER BY accessed_at"
+        ):
+            if size <= target:
+                break
+
+            evicted.append((key,))
+            size -= object_size
+
+        connection.executemany("DELETE FROM objects WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+        stats.count("cache_evictions", len(evicted))
+
+    def _size(self, connection: sqlite3.Connection) -> int:
+        (size,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return size
+
+    def _open(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "key TEXT PRIMARY KEY, size INTEGER, accessed_at REAL, payload BLOB)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS objects_accessed_at ON objects (accessed_at)")
+
+        self._connection = connection
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._readers, "connection", None)
+        if connection is not None:
+            return connection
+
+        with self._lock:
+            self._open()
+
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        self._readers.connection = connection
+        return connection
+
+    def __getstate__(self) -> dict:
+        """
+        Connections are not shared, each process opens its own.
+        """
+        return {"path": self.path, "max_size": self.max_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], state["max_size"])
+
+
+class CachedRecordStorage:
+    """
+    Record storage that reads traces, profiles and graph data through a disk cache.
+
+    Writes and deletes go to the storage and invalidate the cached object. All other
+    methods are passed to the storage unchanged.
+    """
+
+    def __init__(
+        self,
+        storage: Type[RecordStorage],
+        cache: Type[DiskCache]
+    ) -> None:
+        self.storage = storage
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("storage", "cache"):
+            raise AttributeError(name)
+
+        return getattr(self.storage, name)
+
+    """
+    Traces
+    """
+
+    def get_trace(self, trace_id: UUID) -> Type[Trace]:
+        return self.cache.get_or_load(
+            _cache_key(TRACE_KEY, trace_id),
+            lambda: self.storage.get_trace(trace_id))
+
+    def store_trace(self, trace: Type[Trace]) -> None:
+        self.storage.store_trace(trace)
+        self.cache.invalidate(_cache_key(TRACE_KEY, trace.trace_id))
+
+    """
+    Profiles
+    """
+
+    def get_profile(self, profile_id: UUID) -> Type[Profile]:
+        return self.cache.get_or_load(
+            _cache_key(PROFILE_KEY, profile_id),
+            lambda: self.storage.get_profile(profile_id))
+
+    def store_profile(self, profile: Type[Profile]) -> None:
+        self.storage.store_profile(profile)
+        self.cache.invalidate(_cache_key(PROFILE_KEY, profile.profile_id))
+
+    def delete_profile(self, profile_id: UUID) -> None:
+        _delete(self.storage, "delete_profile", profile_id)
+        self.cache.invalidate(_cache_key(PROFILE_KEY, profile_id))
+
+    """
+    Graphs
+    """
+
+    def get_graph_data(self, trace_id: UUID) -> dict:
+        return self.cache.get_or_load(
+            _cache_key(GRAPH_KEY, trace_id),
+            lambda: self.storage.get_graph_data(trace_id))
+
+    def store_graph_data(self, trace_id: UUID, graph_data: dict) -> None:
+        self.storage.store_graph_data(trace_id, graph_data)
+        self.cache.invalidate(_cache_key(GRAPH_KEY, trace_id))
+
+    def delete_graph_data(self, trace_id: UUID) -> None:
+        _delete(self.storage, "delete_graph_data", trace_id)
+        self.cache.invalidate(_cache_key(GRAPH_KEY, trace_id))
+
+
+def _delete(storage: Type[RecordStorage], method: str, object_id: UUID) -> None:
+    delete = getattr(storage, method, None)
+    if delete is None:
+        raise NotImplementedError(f"{type(storage).__name__} cannot {method}")
+
+    delete(object_id)
+
+
+def _cache_key(kind: str, object_id: UUID) -> str:
+    return f"{kind}/{object_id}"
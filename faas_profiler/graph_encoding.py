@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact binary encoding of execution graphs
+
+Graphs are stored as node and edge tables. Every attribute becomes a
+column: numbers and timestamps as fixed width arrays, strings as indices
+into a string dictionary and node IDs as raw 16 byte UUIDs. The tables are
+compressed and wrapped in a small JSON document, so they can be stored
+wherever cytoscape JSON was stored before.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import struct
+import zlib
+
+import networkx as nx
+import numpy as np
+
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple, Type
+
+GRAPH_FORMAT = "faas-profiler-graph"
+GRAPH_FORMAT_VERSION = 1
+
+COMPRESSION_LEVEL = 6
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+CANONICAL_UUID = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+MISSING_INDEX = -1
+MISSING_FLAG = -1
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+
+"""
+Column kinds
+"""
+FLOAT_COLUMN = "f"
+FLAG_COLUMN = "b"
+STRING_COLUMN = "s"
+TIMESTAMP_COLUMN = "t"
+JSON_COLUMN = "j"
+
+COLUMN_DTYPES = {
+    FLOAT_COLUMN: np.float64,
+    FLAG_COLUMN: np.int8,
+    STRING_COLUMN: np.int32,
+    TIMESTAMP_COLUMN: np.int64,
+    JSON_COLUMN: np.int32
+}
+
+
+class GraphEncodingError(RuntimeError):
+    pass
+
+
+"""
+Encoding
+"""
+
+
+def encode_graph(graph: Type[nx.DiGraph]) -> dict:
+    """
+    Encodes the graph in the compact format.
+    """
+    strings = _StringTable()
+
+    node_ids = list(graph.nodes)
+    node_index = {node_id: idx for idx, node_id in enumerate(node_ids)}
+    node_columns, node_arrays = _encode_columns(
+        [attributes for _, attributes in graph.nodes(data=True)], strings)
+
+    edges = list(graph.edges(data=True))
+    edge_columns, edge_arrays = _encode_columns(
+        [attributes for _, _, attributes in edges], strings)
+
+    sources = np.array(
+        [node_index[source] for source, _, _ in edges], dtype=np.int32)
+    targets = np.array(
+        [node_index[target] for _, target, _ in edges], dtype=np.int32)
+
+    uuid_ids = _uuid_bytes(node_ids)
+
+    header = {
+        "graph": graph.graph,
+        "directed": graph.is_directed(),
+        "multigraph": graph.is_multigraph(),
+        "number_of_nodes": len(node_ids),
+        "number_of_edges": len(edges),
+        "node_ids": None if uuid_ids is not None else node_ids,
+        "node_columns": node_columns,
+        "edge_columns": edge_columns,
+        "strings": strings.strings}
+
+    arrays = node_arrays + [sources, targets] + edge_arrays
+    header_bytes = json.dumps(header, default=str).encode()
+
+    payload = b"".join(
+        [struct.pack("<I", len(header_bytes)), header_bytes, uuid_ids or b""] +
+        [array.tobytes() for array in arrays])
+
+    return {
+        "format": GRAPH_FORMAT,
+        "version": GRAPH_FORMAT_VERSION,
+        "payload": b64encode(zlib.compress(payload, COMPRESSION_LEVEL)).decode()}
+
+
+class _StringTable:
+    """
+    Dictionary of all strings of a graph.
+    """
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def index(self, string: str) -> int:
+        idx = self._index.get(string)
+        if idx is None:
+            idx = self._index[string] = len(self.strings)
+            self.strings.append(string)
+
+        return idx
+
+
+def _encode_columns(
+    elements: List[dict],
+    strings: Type[_StringTable]
+) -> Tuple[List[list], List[np.ndarray]]:
+    """
+    Encodes the attributes of all elements column by column.
+    """
+    keys: Dict[str, None] = {}
+    for attributes in elements:
+        keys.update(dict.fromkeys(attributes))
+
+    columns, arrays = [], []
+    for key in keys:
+        values = [attributes.get(key) for attributes in elements]
+        kind = _column_kind(values)
+        columns.append([key, kind])
+        arrays.append(np.array(
+            _encode_values(values, kind, strings), dtype=COLUMN_DTYPES[kind]))
+
+    return columns, arrays
+
+
+def _column_kind(values: List[Any]) -> str:
+    types = {type(value) for value in values if value is not None}
+    if types <= {bool}:
+        return FLAG_COLUMN
+    if types <= {int, float}:
+        return FLOAT_COLUMN
+    if types <= {str}:
+        return STRING_COLUMN
+    if types <= {datetime} and all(
+        value.tzinfo is None for value in values if value is not None
+    ):
+        return TIMESTAMP_COLUMN
+
+    return JSON_COLUMN
+
+
+def _encode_values(
+    values: List[Any],
+    kind: str,
+    strings: Type[_StringTable]
+) -> List[Any]:
+    if kind == FLOAT_COLUMN:
+        return [np.nan if value is None else value for value in values]
+    if kind == FLAG_COLUMN:
+        return [MISSING_FLAG if value is None else int(value) for value in values]
+    if kind == TIMESTAMP_COLUMN:
+        return [
+            MISSING_TIMESTAMP if value is None else (value - EPOCH) // MICROSECOND
+            for value in values]
+    if kind == STRING_COLUMN:
+        return [
+            MISSING_INDEX if value is None else strings.index(value)
+            for value in values]
+
+    return [
+        MISSING_INDEX if value is None else strings.index(json.dumps(value, default=str))
+        for value in values]
+
+
+def _uuid_bytes(node_ids: List[Any]) -> bytes:
+    """
+    Returns the node IDs as raw UUIDs, if all of them are UUID strings
+    in canonical form.
+    """
+    if not all(
+        isinstance(node_id, str) and CANONICAL_UUID.fullmatch(node_id)
+        for node_id in node_ids
+    ):
+        return None
+
+    return bytes.fromhex("".join(node_ids).replace("-", ""))
+
+
+"""
+Decoding
+"""
+
+
+def is_encoded_graph(data: dict) -> bool:
+    """
+    Returns True if the graph data is in the compact format.
+    """
+    return isinstance(data, dict) and data.get("format") == GRAPH_FORMAT
+
+
+def decode_graph_data(data: dict) -> dict:
+    """
+    Returns cytoscape data of stored graph data.
+    Graph data in cytoscape JSON is returned unchanged.
+    """
+    if not is_encoded_graph(data):
+        return data
+
+    if data.get("version") != GRAPH_FORMAT_VERSION:
+        raise GraphEncodingError(
+            f"Unsupported graph format version {data.get('version')}")
+
+    payload = zlib.decompress(b64decode(data["payload"]))
+    (header_length,) = struct.unpack_from("<I", payload)
+    offset = 4 + header_length
+    header = json.loads(payload[4:offset])
+
+    number_of_nodes = header["number_of_nodes"]
+    number_of_edges = header["number_of_edges"]
+    strings = header["strings"]
+
+    node_ids = header["node_ids"]
+    if node_ids is None:
+        node_ids = [
+            _uuid_string(payload[offset + 16 * idx:offset + 16 * (idx + 1)].hex())
+            for idx in range(number_of_nodes)]
+        offset += 16 * number_of_nodes
+
+    node_data, offset = _decode_columns(
+        header["node_columns"], number_of_nodes, strings, payload, offset)
+    sources, offset = _read_array(payload, offset, np.int32, number_of_edges)
+    targets, offset = _read_array(payload, offset, np.int32, number_of_edges)
+    edge_data, offset = _decode_columns(
+        header["edge_columns"], number_of_edges, strings, payload, offset)
+
+    nodes = []
+    for node_id, attributes in zip(node_ids, node_data):
+        attributes.update(id=node_id, value=node_id, name=node_id)
+        nodes.append({"data": attributes})
+
+    edges = []
+    for source, target, attributes in zip(sources.tolist(), targets.tolist(), edge_data):
+        attributes.update(source=node_ids[source], target=node_ids[target])
+        edges.append({"data": attributes})
+
+    return {
+        "data": list(header["graph"].items()),
+        "directed": header["directed"],
+        "multigraph": header["multigraph"],
+        "elements": {"nodes": nodes, "edges": edges}}
+
+
+def _uuid_string(hex_string: str) -> str:
+    return "-".join([
+        hex_string[:8], hex_string[8:12], hex_string[12:16],
+        hex_string[16:20], hex_string[20:]])
+
+
+def _read_array(
+    payload: bytes,
+    offset: int,
+    dtype: Any,
+    length: int
+) -> Tuple[np.ndarray, int]:
+    array = np.frombuffer(payload, dtype=dtype, count=length, offset=offset)
+    return array, offset + array.nbytes
+
+
+def _decode_columns(
+    columns: List[list],
+    length: int,
+    strings: List[str],
+    payload: bytes,
+    offset: int
+) -> Tuple[List[dict], int]:
+    """
+    Decodes columns into one attribute dict per element.
+    Missing values are left out.
+    """
+    elements = [{} for _ in range(length)]
+    for key, kind in columns:
+        array, offset = _read_array(payload, offset, COLUMN_DTYPES[kind], length)
+        for attributes, value in zip(elements, array.tolist()):
+            value = _decode_value(value, kind, strings)
+            if value is not None:
+                attributes[key] = value
+
+    return elements, offset
+
+
+def _decode_value(value: Any, kind: str, strings: List[str]) -> Any:
+    if kind == FLOAT_COLUMN:
+        return None if value != value else value
+    if kind == FLAG_COLUMN:
+        return None if value == MISSING_FLAG else bool(value)
+    if kind == TIMESTAMP_COLUMN:
+        if value == MISSING_TIMESTAMP:
+            return None
+        return (EPOCH + timedelta(microseconds=value)).isoformat()
+    if value == MISSING_INDEX:
+        return None
+    if kind == STRING_COLUMN:
+        return strings[value]
+
+    return json.loads(strings[value])
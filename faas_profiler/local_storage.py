@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local record storage
+
+Stores records, traces, profiles and graph data as files in a local
+directory, with the same keys as the records bucket. Files are written
+with the codec of the storage and read with the codec of their suffix
+(see record_codecs). sync_bucket mirrors a records bucket into such a
+directory.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+
+from functools import partial
+from os.path import dirname, exists, getsize, join
+from typing import Any, Dict, Iterable, List, Tuple
+
+from faas_profiler_core.constants import Provider
+
+from faas_profiler.concurrency import BackgroundWriter, DEFAULT_WORKERS
+from faas_profiler.object_storage import (
+    PREFIXES,
+    UNPROCESSED_RECORDS_PREFIX,
+    ClientPool,
+    ObjectRecordStorage,
+    gcs_client,
+    s3_client
+)
+from faas_profiler.record_codecs import (
+    CODECS,
+    DEFAULT_CODEC,
+    codec_of,
+    key_with_codec,
+    stem_of
+)
+
+SYNC_PREFIXES = PREFIXES
+
+# Suffixes of files that are still written or downloaded
+TMP_SUFFIX = ".tmp"
+DOWNLOAD_SUFFIX = ".download"
+PARTIAL_SUFFIXES = (TMP_SUFFIX, DOWNLOAD_SUFFIX)
+
+
+class LocalRecordStorage(ObjectRecordStorage):
+    """
+    Record storage in a local directory.
+    """
+
+    def __init__(self, directory: str, codec: str = DEFAULT_CODEC) -> None:
+        super().__init__(codec)
+        self.directory = directory
+
+        for prefix in SYNC_PREFIXES:
+            os.makedirs(join(directory, prefix), exist_ok=True)
+
+    """
+    Files
+    """
+
+    def _list_objects(self, prefix: str) -> Dict[str, float]:
+        return {
+            f"{prefix}/{entry.name}": entry.stat().st_mtime
+            for entry in os.scandir(join(self.directory, prefix))
+            if entry.is_file() and not entry.name.endswith(PARTIAL_SUFFIXES)}
+
+    def _get_object(self, key: str) -> bytes:
+        try:
+            with open(join(self.directory, key), "rb") as fp:
+                return fp.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def _put_object(self, key: str, payload: bytes) -> None:
+        write_file(join(self.directory, key), payload)
+
+    def _delete_object(self, key: str) -> None:
+        try:
+            os.remove(join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+
+def write_file(path: str, payload: bytes) -> None:
+    """
+    Writes the payload to path and removes copies of the object with other
+    codecs. Readers never see partially written files.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+    with open(tmp_path, "wb") as fp:
+        fp.write(payload)
+
+    os.replace(tmp_path, path)
+    _remove_other_codecs(path)
+
+
+def _has_other_codec(path: str) -> bool:
+    stem = stem_of(path)
+    return any(
+        exists(key_with_codec(stem, codec))
+        for codec in CODECS if codec != codec_of(path))
+
+
+def _remove_other_codecs(path: str) -> None:
+    codec = codec_of(path)
+    stem = stem_of(path)
+    for other_codec in CODECS:
+        other_path = key_with_codec(stem, other_codec)
+        if other_codec != codec and exists(other_path):
+            os.remove(other_path)
+
+
+"""
+Bucket sync
+"""
+
+
+def sync_bucket(
+    directory: str,
+    provider: Provider,
+    bucket: str,
+    region: str = None,
+    project_id: str = None,
+    workers: int = DEFAULT_WORKERS,
+    prefixes: List[str] = SYNC_PREFIXES
+) -> Tuple[int, int]:
+    """
+    Mirrors all objects of the bucket with one of the prefixes into directory.
+
+    Objects are downloaded by workers threads. Objects that exist locally
+    with the same size are skipped, as are unprocessed records that were
+    re-encoded locally (see migrate_storage), since records never change.
+
+    Returns the number of downloaded and skipped objects.
+    """
+    if provider == Provider.AWS:
+        objects, download = _s3_bucket(bucket, region, prefixes, workers)
+    elif provider == Provider.GCP:
+        objects, download = _gcs_bucket(bucket, project_id, prefixes, workers)
+    else:
+        raise RuntimeError(f"Cannot sync records of provider {provider}")
+
+    downloaded, skipped = 0, 0
+    with BackgroundWriter(workers=workers, desc="Downloading") as writer:
+        for key, size in objects:
+            path = join(directory, key)
+            if exists(path) and getsize(path) == size:
+                skipped += 1
+                continue
+
+            if key.startswith(f"{UNPROCESSED_RECORDS_PREFIX}/") and _has_other_codec(path):
+                skipped += 1
+                continue
+
+            writer.submit(_download, download, key, path)
+            downloaded += 1
+
+    return downloaded, skipped
+
+
+def _download(download, key: str, path: str) -> None:
+    """
+    Downloads the object to path. Partial downloads are never left at path.
+    """
+    os.makedirs(dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}{DOWNLOAD_SUFFIX}"
+    download(key, tmp_path)
+    os.replace(tmp_path, path)
+    _remove_other_codecs(path)
+
+
+def _s3_bucket(
+    bucket: str,
+    region: str,
+    prefixes: List[str],
+    workers: int
+) -> Tuple[Iterable[Tuple[str, int]], Any]:
+    # One client is shared by all workers, with a connection for each.
+    client = s3_client(region, pool_size=workers)
+
+    def objects():
+        paginator = client.get_paginator("list_objects_v2")
+        for prefix in prefixes:
+            for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/"):
+                for obj in page.get("Contents", []):
+                    yield obj["Key"], obj["Size"]
+
+    def download(key: str, path: str) -> None:
+        client.download_file(bucket, key, path)
+
+    return objects(), download
+
+
+def _gcs_bucket(
+    bucket: str,
+    project_id: str,
+    prefixes: List[str],
+    workers: int
+) -> Tuple[Iterable[Tuple[str, int]], Any]:
+    # GCS clients are not thread-safe, every worker gets its own.
+    clients = ClientPool(partial(gcs_client, project_id), per_thread=True)
+
+    def objects():
+        for prefix in prefixes:
+            for blob in clients.get().list_blobs(bucket, prefix=f"{prefix}/"):
+                yield blob.name, blob.size
+
+    def download(key: str, path: str) -> None:
+        clients.get().bucket(bucket).blob(key).download_to_filename(path)
+
+    return objects(), download
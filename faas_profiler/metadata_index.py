@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local metadata index of profiles, traces and records
+
+Post-processing writes one row per record, trace and profile into an
+SQLite file in the temporary directory. Listing, filtering and sorting
+profiles, traces and records are then indexed queries, instead of loading
+every stored object.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+from faas_profiler_core.models import FunctionContext, Profile, Trace, TraceRecord
+
+# Seconds to wait for other processes writing the index
+LOCK_TIMEOUT = 60.0
+# Number of buffered traces that triggers a flush
+FLUSH_INTERVAL = 1000
+
+IS_WARM_DATA_KEY = "information::IsWarm"
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS records ("
+    "record_id TEXT PRIMARY KEY, trace_id TEXT, function_key TEXT, "
+    "invoked_at REAL, finished_at REAL, total_execution_time REAL, "
+    "handler_execution_time REAL, cold_start INTEGER)",
+    "CREATE INDEX IF NOT EXISTS records_trace_id ON records (trace_id)",
+    "CREATE INDEX IF NOT EXISTS records_function_key ON records (function_key, invoked_at)",
+    "CREATE TABLE IF NOT EXISTS traces ("
+    "trace_id TEXT PRIMARY KEY, profile_id TEXT, function_key TEXT, "
+    "root_record_id TEXT, invoked_at REAL, finished_at REAL, duration REAL, "
+    "number_of_records INTEGER, number_of_cold_starts INTEGER)",
+    "CREATE INDEX IF NOT EXISTS traces_profile_id ON traces (profile_id, invoked_at)",
+    "CREATE INDEX IF NOT EXISTS traces_function_key ON traces (function_key, invoked_at)",
+    "CREATE INDEX IF NOT EXISTS traces_duration ON traces (function_key, duration)",
+    "CREATE TABLE IF NOT EXISTS profiles ("
+    "profile_id TEXT PRIMARY KEY, function_key TEXT, provider TEXT, region TEXT, "
+    "handler TEXT, runtime TEXT, number_of_traces INTEGER, "
+    "first_invoked_at REAL, last_invoked_at REAL, mean_duration REAL, "
+    "sampling_weight REAL DEFAULT 1.0, estimated_traces REAL)",
+    "CREATE INDEX IF NOT EXISTS profiles_function_key ON profiles (function_key)"
+]
+
+# Columns added to the tables of index files written by earlier versions
+ADDED_COLUMNS = {
+    "profiles": [
+        ("sampling_weight", "REAL DEFAULT 1.0"),
+        ("estimated_traces", "REAL")
+    ]
+}
+
+# Columns of each table that can be filtered by range and sorted by
+RECORD_COLUMNS = [
+    "invoked_at",
+    "finished_at",
+    "total_execution_time",
+    "handler_execution_time"
+]
+TRACE_COLUMNS = ["invoked_at", "finished_at", "duration", "number_of_records"]
+PROFILE_COLUMNS = [
+    "function_key",
+    "number_of_traces",
+    "first_invoked_at",
+    "last_invoked_at",
+    "mean_duration",
+    "estimated_traces"
+]
+TIME_COLUMNS = {"invoked_at", "finished_at", "first_invoked_at", "last_invoked_at"}
+
+
+class IndexQueryError(ValueError):
+    pass
+
+
+class MetadataIndex:
+    """
+    Thread-safe SQLite index of processed profiles, traces and records.
+
+    Traces and profiles are buffered and written in batches by flush.
+    The index file can be written by multiple processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        self._lock = Lock()
+        self._connection: sqlite3.Connection = None
+        self._traces: List[tuple] = []
+        self._records: List[tuple] = []
+        self._profiles: List[Tuple[tuple, List[str], float]] = []
+        self._removed_profiles: List[str] = []
+
+    """
+    Writing
+    """
+
+    def add_trace(
+        self,
+        trace: Type[Trace],
+        function_key: str,
+        profile_id: str
+    ) -> None:
+        """
+        Buffers the rows of the trace and its records.
+        """
+        records = [record_row(record, trace.trace_id) for record in trace.records.values()]
+        invoked_at = [row[3] for row in records if row[3] is not None]
+        finished_at = [row[4] for row in records if row[4] is not None]
+
+        first_invoked_at = min(invoked_at) if invoked_at else None
+        last_finished_at = max(finished_at) if finished_at else None
+        duration = None
+        if first_invoked_at is not None and last_finished_at is not None:
+            duration = (last_finished_at - first_invoked_at) * 1000
+
+        trace_row = (
+            str(trace.trace_id),
+            str(profile_id),
+            function_key,
+            str(trace.root_record_id),
+            first_invoked_at,
+            last_finished_at,
+            duration,
+            len(records),
+            sum(1 for row in records if row[7]))
+
+        with self._lock:
+            self._traces.append(trace_row)
+            self._records.extend(records)
+            flush = len(self._traces) >= FLUSH_INTERVAL
+
+        if flush:
+            self.flush()
+
+    def update_profile(
+        self,
+        profile: Type[Profile],
+        function_key: str,
+        sampling_weight: float = 1.0
+    ) -> None:
+        """
+        Buffers the summary of the profile. Traces no longer listed in the
+        profile are removed from the index when flushed.
+
+        Each listed trace stands for sampling_weight traces of the function
+        (see sampling), which gives the estimated number of traces.
+        """
+        function_context = profile.function_context
+        profile_row = (
+            str(profile.profile_id),
+            function_key,
+            _enum_value(getattr(function_context, "provider", None)),
+            getattr(function_context, "region", None),
+            getattr(function_context, "handler", None),
+            _enum_value(getattr(function_context, "runtime", None)))
+        listed = [str(trace_id) for trace_id in profile.trace_ids]
+
+        with self._lock:
+            self._profiles.append((profile_row, listed, sampling_weight))
+
+    def remove_profile(self, profile_id: str) -> None:
+        """
+        Buffers the removal of the profile and its traces.
+        """
+        with self._lock:
+            self._removed_profiles.append(str(profile_id))
+
+    def flush(self) -> None:
+        """
+        Writes all buffered rows.
+        """
+        with self._lock:
+            traces, self._traces = self._traces, []
+            records, self._records = self._records, []
+            profiles, self._profiles = self._profiles, []
+            removed, self._removed_profiles = self._removed_profiles, []
+            if not traces and not profiles and not removed:
+                return
+
+            connection = self._open()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+                connection.executemany(
+                    "INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", traces)
+
+                for profile_row, listed, sampling_weight in profiles:
+                    self._write_profile(connection, profile_row, listed, sampling_weight)
+
+                removed_rows = [(profile_id,) for profile_id in removed]
+                connection.executemany("DELETE FROM traces WHERE profile_id = ?", removed_rows)
+                connection.executemany("DELETE FROM profiles WHERE profile_id = ?", removed_rows)
+
+                if profiles or removed:
+                    connection.execute(
+                        "DELETE FROM records WHERE trace_id NOT IN (SELECT trace_id FROM traces)")
+
+    def _write_profile(
+        self,
+        connection: sqlite3.Connection,
+        profile_row: tuple,
+        listed: List[str],
+        sampling_weight: float
+    ) -> None:
+        profile_id = profile_row[0]
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS listed (trace_id TEXT PRIMARY KEY)")
+        connection.execute("DELETE FROM listed")
+        connection.executemany(
+            "INSERT OR IGNORE INTO listed VALUES (?)", [(trace_id,) for trace_id in listed])
+        connection.execute(
+            "DELETE FROM traces WHERE profile_id = ? "
+            "AND trace_id NOT IN (SELECT trace_id FROM listed)", (profile_id,))
+
+        first_invoked_at, last_invoked_at, mean_duration = connection.execute(
+            "SELECT MIN(invoked_at), MAX(invoked_at), AVG(duration) "
+            "FROM traces WHERE profile_id = ?", (profile_id,)).fetchone()
+
+        connection.execute(
+            "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            profile_row + (
+                len(listed),
+                first_invoked_at,
+                last_invoked_at,
+                mean_duration,
+                sampling_weight,
+                len(listed) * sampling_weight))
+
+    """
+    Queries
+    """
+
+    def profiles(
+        self,
+        function_key: str = None,
+        order_by: str = "function_key",
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Returns the summaries of all profiles.
+        """
+        return self.query(
+            "profiles", PROFILE_COLUMNS,
+            equal={"function_key": function_key},
+            order_by=order_by, descending=descending, limit=limit, offset=offset)
+
+    def traces(
+        self,
+        function_key: str = None,
+        profile_id: str = None,
+        since: datetime = None,
+        until: datetime = None,
+        min_duration: float = None,
+        order_by: str = "invoked_at",
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Returns the summaries of traces, invoked between since and until.
+        """
+        return self.query(
+            "traces", TRACE_COLUMNS,
+            equal={"function_key": function_key, "profile_id": _optional_str(profile_id)},
+            ranges={"invoked_at": (since, until), "duration": (min_duration, None)},
+            order_by=order_by, descending=descending, limit=limit, offset=offset)
+
+    def records(
+        self,
+        function_key: str = None,
+        trace_id: str = None,
+        since: datetime = None,
+        until: datetime = None,
+        cold_start: bool = None,
+        order_by: str = "invoked_at",
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Returns the metadata of records, invoked between since and until.
+        """
+        return self.query(
+            "records", RECORD_COLUMNS,
+            equal={
+                "function_key": function_key,
+                "trace_id": _optional_str(trace_id),
+                "cold_start": None if cold_start is None else int(cold_start)},
+            ranges={"invoked_at": (since, until)},
+            order_by=order_by, descending=descending, limit=limit, offset=offset)
+
+    def query(
+        self,
+        table: str,
+        columns: List[str],
+        equal: Dict[str, Any] = {},
+        ranges: Dict[str, Tuple[Any, Any]] = {},
+        order_by: str = None,
+        descending: bool = False,
+        limit: int = None,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Returns the rows of the table matching all conditions.
+        None values are not filtered on.
+        """
+        if order_by is not None and order_by not in columns:
+            raise IndexQueryError(
+                f"Cannot sort {table} by {order_by}. Use one of {', '.join(columns)}")
+
+        conditions, parameters = [], []
+        for column, value in equal.items():
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+
+        for column, (lower, upper) in ranges.items():
+            if lower is not None:
+                conditions.append(f"{column} >= ?")
+                parameters.append(_timestamp(lower))
+            if upper is not None:
+                conditions.append(f"{column} < ?")
+                parameters.append(_timestamp(upper))
+
+        statement = f"SELECT * FROM {table}"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        if order_by is not None:
+            statement += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            statement += " LIMIT ? OFFSET ?"
+            parameters.extend([limit, offset])
+        elif offset:
+            statement += " LIMIT -1 OFFSET ?"
+            parameters.append(offset)
+
+        with self._lock:
+            cursor = self._open().execute(statement, parameters)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+
+        return [_row_dict(names, row) for row in rows]
+
+    @property
+    def has_profiles(self) -> bool:
+        with self._lock:
+            return self._open().execute(
+                "SELECT 1 FROM profiles LIMIT 1").fetchone() is not None
+
+    """
+    Index file
+    """
+
+    def _open(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {
+                    row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                for name, definition in columns:
+                    if name not in existing:
+                        _add_column(connection, table, name, definition)
+
+        self._connection = connection
+        return connection
+
+    def __getstate__(self) -> dict:
+        """
+        Connections and buffered rows are not shared, each process opens its own.
+        """
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"])
+
+
+def _add_column(
+    connection: sqlite3.Connection,
+    table: str,
+    name: str,
+    definition: str
+) -> None:
+    try:
+        connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    except sqlite3.OperationalError as err:
+        # Added by another process in the meantime
+        if "duplicate column" not in str(err):
+            raise
+
+
+def record_row(record: Type[TraceRecord], trace_id) -> tuple:
+    """
+    Returns the index row of the record.
+    """
+    function_context: FunctionContext = record.function_context
+    if function_context is None:
+        return (str(record.record_id), str(trace_id), None, None, None, None, None, None)
+
+    return (
+        str(record.record_id),
+        str(trace_id),
+        function_context.function_key,
+        _timestamp(function_context.invoked_at),
+        _timestamp(function_context.finished_at),
+        _safe(lambda: function_context.total_execution_time),
+        _safe(lambda: function_context.handler_execution_time),
+        cold_start_of(record))
+
+
+def cold_start_of(record: Type[TraceRecord]) -> int:
+    """
+    Returns 1 for cold starts, 0 for warm starts and None if unknown.
+    """
+    is_warm = (record.data or {}).get(IS_WARM_DATA_KEY)
+    if is_warm is None or not is_warm.results or "is_warm" not in is_warm.results:
+        return None
+
+    return 0 if is_warm.results["is_warm"] else 1
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+
+    return value
+
+
+def _optional_str(value: Any) -> str:
+    return None if value is None else str(value)
+
+
+def _enum_value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+def _safe(get: Any) -> float:
+    try:
+        return get()
+    except Exception:
+        return None
+
+
+def _row_dict(names: Sequence[str], row: tuple) -> dict:
+    """
+    Returns the row as dict, with timestamps as datetimes.
+    """
+    return {
+        name: datetime.fromtimestamp(value)
+        if name in TIME_COLUMNS and value is not None else value
+        for name, value in zip(names, row)}
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Record storages on object stores
+
+ObjectRecordStorage implements the record storage on any store of keyed
+objects. Implementations only list, get, put and delete objects: in a
+local directory, an S3 bucket or a GCS bucket. Objects are stored under
+<prefix>/<ID>.<codec> and written with the codec of the storage. They are
+read with the codec of their suffix (see record_codecs); objects without
+codec suffix, e.g. written by other tools, by their leading bytes.
+
+Objects are looked up by ID with the codec of the storage and then without
+suffix. Objects with other codecs are found once their prefix was listed,
+which records their codec, or after migrate_storage re-encoded them.
+
+Cloud clients are created lazily by a ClientPool, either one client
+shared by all threads or one client per thread, with connection pools
+sized for the number of parallel fetchers.
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from threading import Lock, local
+from typing import Any, Callable, Dict, Generator, Iterable, List, Tuple, Type
+from uuid import UUID
+
+from faas_profiler_core.models import Profile, Trace, TraceRecord
+from faas_profiler_core.storage import RecordStorage
+
+from faas_profiler.concurrency import BackgroundWriter, DEFAULT_WORKERS
+from faas_profiler.record_codecs import (
+    DEFAULT_CODEC,
+    check_codec,
+    codec_of,
+    decode,
+    encode,
+    key_with_codec,
+    stem_of
+)
+from faas_profiler.stats import stats
+
+UNPROCESSED_RECORDS_PREFIX = "unprocessed_records"
+TRACES_PREFIX = "traces"
+PROFILES_PREFIX = "profiles"
+GRAPHS_PREFIX = "graphs"
+
+PREFIXES = [
+    UNPROCESSED_RECORDS_PREFIX,
+    TRACES_PREFIX,
+    PROFILES_PREFIX,
+    GRAPHS_PREFIX
+]
+
+DEFAULT_POOL_SIZE = 32
+
+
+class ObjectRecordStorage(RecordStorage):
+    """
+    Record storage on a store of keyed objects.
+    """
+
+    def __init__(self, codec: str = DEFAULT_CODEC) -> None:
+        check_codec(codec)
+        self.codec = codec
+
+        # Codecs of listed objects whose codec is not the one of the storage
+        self._codecs: Dict[str, str] = {}
+
+    """
+    Records
+    """
+
+    @property
+    def unprocessed_record_keys(self) -> List[str]:
+        return self._keys(UNPROCESSED_RECORDS_PREFIX)
+
+    @property
+    def unprocessed_record_keys_by_time(self) -> List[str]:
+        """
+        Returns the keys of all unprocessed records in the order they were written.
+        """
+        objects = self._list_objects(UNPROCESSED_RECORDS_PREFIX)
+        self._record_codecs(objects)
+        return sorted(objects, key=lambda key: (objects[key], key))
+
+    def unprocessed_records(self) -> Generator[Type[TraceRecord], None, None]:
+        for key in self.unprocessed_record_keys:
+            yield self.get_unprocessed_record(key)
+
+    def get_unprocessed_record(self, key: str) -> Type[TraceRecord]:
+        try:
+            return self._read_key(key, TraceRecord.load)
+        except KeyError:
+            # Re-encoded since it was listed (see migrate_storage)
+            return self._read(stem_of(key), TraceRecord.load)
+
+    def store_unprocessed_record(self, record: Type[TraceRecord]) -> None:
+        self._write(
+            f"{UNPROCESSED_RECORDS_PREFIX}/{record.record_id}", record.dump())
+
+    """
+    Traces
+    """
+
+    def store_trace(self, trace: Type[Trace]) -> None:
+        self._write(f"{TRACES_PREFIX}/{trace.trace_id}", trace.dump())
+
+    def get_trace(self, trace_id: UUID) -> Type[Trace]:
+        return self._read(f"{TRACES_PREFIX}/{trace_id}", Trace.load)
+
+    """
+    Profiles
+    """
+
+    def store_profile(self, profile: Type[Profile]) -> None:
+        self._write(f"{PROFILES_PREFIX}/{profile.profile_id}", profile.dump())
+
+    def get_profile(self, profile_id: UUID) -> Type[Profile]:
+        return self._read(f"{PROFILES_PREFIX}/{profile_id}", Profile.load)
+
+    def profiles(self) -> List[Type[Profile]]:
+        return [self._read_key(key, Profile.load) for key in self._keys(PROFILES_PREFIX)]
+
+    def delete_profile(self, profile_id: UUID) -> None:
+        self._delete(f"{PROFILES_PREFIX}/{profile_id}")
+
+    @property
+    def has_profiles(self) -> bool:
+        return len(self._keys(PROFILES_PREFIX)) > 0
+
+    """
+    Graphs
+    """
+
+    def store_graph_data(self, trace_id: UUID, graph_data: dict) -> None:
+        self._write(f"{GRAPHS_PREFIX}/{trace_id}", graph_data)
+
+    def get_graph_data(self, trace_id: UUID) -> dict:
+        return self._read(f"{GRAPHS_PREFIX}/{trace_id}")
+
+    def delete_graph_data(self, trace_id: UUID) -> None:
+        self._delete(f"{GRAPHS_PREFIX}/{trace_id}")
+
+    """
+    Objects
+    """
+
+    def _keys(self, prefix: str) -> List[str]:
+        """
+        Returns the sorted keys of all objects with the prefix.
+        """
+        keys = sorted(self._list_objects(prefix))
+        self._record_codecs(keys)
+        return keys
+
+    def _record_codecs(self, keys: Iterable[str]) -> None:
+        """
+        Records the codecs of the keys, preferring the codec of the storage
+        for objects stored with several codecs.
+        """
+        codecs: Dict[str, str] = {}
+        for key in keys:
+            stem = stem_of(key)
+            if codecs.get(stem) != self.codec:
+                codecs[stem] = codec_of(key)
+
+        for stem, codec in codecs.items():
+            if codec == self.codec:
+                self._codecs.pop(stem, None)
+            else:
+                self._codecs[stem] = codec
+
+    def _read_key(self, key: str, load: Callable[[Any], Any] = None) -> Any:
+        """
+        Reads the object of a listed key and loads it with load.
+        Getting the object is timed as fetch, decoding and loading as decode.
+        """
+        with stats.timer("fetch"):
+            payload = self._get_object(key)
+
+        with stats.timer("decode"):
+            data = decode(payload, codec_of(key))
+            return load(data) if load is not None else data
+
+    def _candidate_keys(self, stem: str) -> List[str]:
+        """
+        Returns the keys of the object with its listed codec, the codec of
+        the storage and without suffix.
+        """
+        codecs = [self._codecs.get(stem, self.codec), self.codec, None]
+        return [
+            key_with_codec(stem, codec) if codec else stem
+            for codec in dict.fromkeys(codecs)]
+
+    def _read(self, stem: str, load: Callable[[Any], Any] = None) -> Any:
+        """
+        Reads the object of a key without codec suffix.
+        """
+        for key in self._candidate_keys(stem):
+            try:
+                return self._read_key(key, load)
+            except KeyError:
+                continue
+
+        raise KeyError(f"No stored object {stem}")
+
+    def _write(self, stem: str, data: Any) -> None:
+        self._put_object(key_with_codec(stem, self.codec), encode(data, self.codec))
+        self._codecs.pop(stem, None)
+
+    def _delete(self, stem: str) -> None:
+        """
+        Deletes the object with all codecs it may be stored with.
+        """
+        for key in self._candidate_keys(stem):
+            self._delete_object(key)
+
+        self._codecs.pop(stem, None)
+
+    def _list_objects(self, prefix: str) -> Dict[str, float]:
+        """
+        Returns the keys of all objects with the prefix and the timestamps
+        they were last written.
+        """
+        raise NotImplementedError
+
+    def _get_object(self, key: str) -> bytes:
+        """
+        Returns the payload of the object. Raises a KeyError if it does not exist.
+        """
+        raise NotImplementedError
+
+    def _put_object(self, key: str, payload: bytes) -> None:
+        raise NotImplementedError
+
+    def _delete_object(self, key: str) -> None:
+        """
+        Deletes the object. Objects that do not exist are ignored.
+        """
+        raise NotImplementedError
+
+
+"""
+Migration
+"""
+
+
+def migrate_storage(
+    storage: Type[ObjectRecordStorage],
+    codec: str,
+    workers: int = DEFAULT_WORKERS,
+    prefixes: List[str] = PREFIXES
+) -> Tuple[int, int]:
+    """
+    Re-encodes all objects of the storage with the codec.
+
+    Each object is read, written with the codec and deleted under its old
+    key by workers threads, so objects stay readable during the migration.
+    Objects that already have the codec are skipped. Objects that also
+    exist with the codec are only deleted.
+
+    Returns the number of re-encoded and skipped objects.
+    """
+    check_codec(codec)
+
+    migrated, skipped = 0, 0
+    with BackgroundWriter(workers=workers, desc="Re-encoding") as writer:
+        for prefix in prefixes:
+            keys = storage._keys(prefix)
+            existing = set(keys)
+            for key in keys:
+                if codec_of(key) == codec:
+                    skipped += 1
+                    continue
+
+                new_key = key_with_codec(stem_of(key), codec)
+                writer.submit(_migrate_object, storage, key, new_key, codec, new_key in existing)
+                migrated += 1
+
+    return migrated, skipped
+
+
+def _migrate_object(
+    storage: Type[ObjectRecordStorage],
+    key: str,
+    new_key: str,
+    codec: str,
+    exists: bool
+) -> None:
+    if not exists:
+        storage._put_object(new_key, encode(storage._read_key(key), codec))
+
+    storage._delete_object(key)
+    storage._record_codecs([new_key])
+
+
+class ClientPool:
+    """
+    Thread-safe lazy clients.
+
+    With per_thread, every thread gets its own client, for clients that are
+    not thread-safe. Otherwise all threads share one client.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        per_thread: bool = False
+    ) -> None:
+        self.factory = factory
+        self.per_thread = per_thread
+
+        self._lock = Lock()
+        self._client = None
+        self._local = local()
+
+    def get(self) -> Any:
+        if self.per_thread:
+            client = getattr(self._local, "client", None)
+            if client is None:
+                client = self._local.client = self.factory()
+
+            return client
+
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.factory()
+
+        return self._client
+
+    def __getstate__(self) -> dict:
+        """
+        Clients are not shared, each process creates its own.
+        """
+        return {"factory": self.factory, "per_thread": self.per_thread}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["factory"], state["per_thread"])
+
+
+"""
+S3
+"""
+
+
+def s3_client(region: str, pool_size: int = DEFAULT_POOL_SIZE) -> Any:
+    """
+    Returns an S3 client with pool_size connections.
+    """
+    import boto3
+    from botocore.config import Config
+
+    # Sessions are not thread-safe, clients of an own session are.
+    return boto3.session.Session().client(
+        "s3",
+        region_name=region,
+        config=Config(max_pool_connections=pool_size))
+
+
+class S3ObjectStorage(ObjectRecordStorage):
+    """
+    Record storage in an S3 bucket. Clients are thread-safe and shared by default.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        region: str = None,
+        codec: str = DEFAULT_CODEC,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        per_thread: bool = False
+    ) -> None:
+        super().__init__(codec)
+        self.bucket = bucket
+        self.clients = ClientPool(partial(s3_client, region, pool_size), per_thread)
+
+    def _list_objects(self, prefix: str) -> Dict[str, float]:
+        paginator = self.clients.get().get_paginator("list_objects_v2")
+        return {
+            obj["Key"]: obj["LastModified"].timestamp()
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/")
+            for obj in page.get("Contents", [])}
+
+    def _get_object(self, key: str) -> bytes:
+        client = self.clients.get()
+        try:
+            return client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except client.exceptions.NoSuchKey:
+            raise KeyError(key)
+
+    def _put_object(self, key: str, payload: bytes) -> None:
+        self.clients.get().put_object(Bucket=self.bucket, Key=key, Body=payload)
+
+    def _delete_object(self, key: str) -> None:
+        self.clients.get().delete_object(Bucket=self.bucket, Key=key)
+
+
+"""
+GCS
+"""
+
+
+def gcs_client(project_id: str, pool_size: int = DEFAULT_POOL_SIZE) -> Any:
+    """
+    Returns a GCS client with pool_size connections.
+    """
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+
+    client = storage.Client(project=project_id)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    client._http.mount("https://", adapter)
+
+    return client
+
+
+class GCSObjectStorage(ObjectRecordStorage):
+    """
+    Record storage in a GCS bucket. Clients are not thread-safe, so every
+    thread gets its own client by default.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        bucket: str,
+        region: str = None,
+        codec: str = DEFAULT_CODEC,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        per_thread: bool = True
+    ) -> None:
+        super().__init__(codec)
+        self.bucket = bucket
+        self.region = region
+        self.clients = ClientPool(partial(gcs_client, project_id, pool_size), per_thread)
+
+    def _list_objects(self, prefix: str) -> Dict[str, float]:
+        return {
+            blob.name: blob.updated.timestamp()
+            for blob in self.clients.get().list_blobs(self.bucket, prefix=f"{prefix}/")}
+
+    def _get_object(self, key: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.clients.get().bucket(self.bucket).blob(key).download_as_bytes()
+        except NotFound:
+            raise KeyError(key)
+
+    def _put_object(self, key: str, payload: bytes) -> None:
+        self.clients.get().bucket(self.bucket).blob(key).upload_from_string(payload)
+
+    def _delete_object(self, key: str) -> None:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.clients.get().bucket(self.bucket).blob(key).delete()
+        except NotFound:
+            pass
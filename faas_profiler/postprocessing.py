@@ -2,250 +2,2108 @@
 """
 FaaS-Profiler Post processing
 """
+from __future__ import annotations
+
 import networkx as nx
+import numpy as np
+
+import logging
+import os
+import pickle
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+from math import ceil, isnan
+from zlib import crc32
+from typing import Any, Callable, Dict, List, Set, Tuple, Type
+from uuid import UUID, uuid5
+from tqdm import tqdm
+
+from faas_profiler_core.models import (
+    FunctionContext,
+    TracingContext,
+    TraceRecord,
+    InboundContext,
+    OutboundContext
+)
+from faas_profiler_core.constants import TriggerSynchronicity
+from faas_profiler_core.models import Trace, Profile
+
+from faas_profiler.columnar import (
+    TraceColumns,
+    export_profile_columns,
+    remove_profile_columns,
+    trace_columns
+)
+from faas_profiler.config import config
+from faas_profiler.core import profile_id_of
+from faas_profiler.concurrency import BackgroundWriter, prefetch_ordered, DEFAULT_WORKERS, DEFAULT_QUEUE_DEPTH
+from faas_profiler.graph_encoding import encode_graph
+from faas_profiler.object_storage import ObjectRecordStorage
+from faas_profiler.record_codecs import stem_of
+from faas_profiler.request_store import (
+    DEFAULT_MAX_ENTRIES,
+    RequestStore,
+    TimeEntry,
+    TimeIndexEntry
+)
+from faas_profiler.sampling import TraceSampler, trace_hash
+from faas_profiler.stats import stats
+from faas_profiler.dashboard.graphing import FUNCTION_NODE, SERVICE_NODE, EDGE_SIZE_LIMIT, NODE_SIZE_LIMIT
+from faas_profiler.utilis import print_ms, seconds_to_ms
+
+TraceListing = Tuple[tuple, UUID, str, FunctionContext, TraceColumns]
+
+UNKNOWN_LATENCY_LABEL = "N/A ms"
+
+NAN = float("nan")
+INF = float("inf")
+NEG_INF = float("-inf")
+
+DEFAULT_WATERMARK = 60.0
+DEFAULT_REQUEST_TTL = 3600.0
+DEFAULT_MATCH_WINDOW = 1.0
+STREAM_CHECK_INTERVAL = 1000
+SHARD_CHUNKS = 4
+
+
+class TraceNode:
+    """
+    Non-numeric attributes of a cached graph node.
+    """
+
+    __slots__ = ("node_id", "node_type", "label", "duplicate")
+
+    def __init__(
+        self,
+        node_id: str,
+        node_type: str = None,
+        label: str = None,
+        duplicate: bool = False
+    ) -> None:
+        self.node_id = node_id
+        self.node_type = node_type
+        self.label = label
+        self.duplicate = duplicate
+
+
+EDGE_TYPES = [synchronicity.value for synchronicity in TriggerSynchronicity]
+
+
+class GraphCache:
+    """
+    In-Memory trace cache used for record processing.
+
+    Traces that are linked by requests are merged with a disjoint-set over
+    trace IDs (path compression and union by size).
+
+    Nodes, edges and traces are referenced by integer IDs. Times and latencies
+    are kept in typed arrays, all other attributes in slotted TraceNode objects.
+    networkx graphes are only built when traces are finalized.
+    """
+
+    def __init__(self) -> None:
+        self._trace_index: Dict[str, int] = {}
+        self._trace_ids: List[str] = []
+        self._parents = array("l")
+        self._sizes = array("l")
+        self._labels: Dict[int, int] = {}
+        self._last_events = array("d")
+        self._open_requests = array("l")
+        self._max_event = NEG_INF
+
+        self._node_index: Dict[str, int] = {}
+        self._nodes: List[TraceNode] = []
+        self._node_traces = array("l")
+        self._total_times = array("d")
+        self._handler_times = array("d")
+        self._invoked_at = array("d")
+        self._finished_at = array("d")
+        self._epoch: datetime = None
+
+        self._edge_index: Dict[int, int] = {}
+        self._edge_sources = array("l")
+        self._edge_targets = array("l")
+        self._edge_types = array("b")
+        self._edge_latencies = array("d")
+        self._edge_inferred = array("b")
+
+    """
+    Traces
+    """
+
+    def _find(self, trace_idx: int) -> int:
+        """
+        Returns the representative of the set the trace belongs to.
+        """
+        root = trace_idx
+        while self._parents[root] != root:
+            root = self._parents[root]
+
+        while trace_idx != root:
+            next_idx = self._parents[trace_idx]
+            self._parents[trace_idx] = root
+            trace_idx = next_idx
+
+        return root
+
+    def _label(self, trace_idx: int) -> int:
+        """
+        Returns the index of the trace the given trace was merged into.
+        """
+        return self._labels[self._find(trace_idx)]
+
+    def has_trace(self, trace_id: str) -> bool:
+        """
+        Returns True if the trace is cached.
+        """
+        return trace_id in self._trace_index
+
+    def trace_id(self, trace_id: str) -> str:
+        """
+        Returns the ID of the trace the given trace was merged into.
+        """
+        trace_idx = self._trace_index.get(trace_id)
+        if trace_idx is None:
+            return None
+
+        return self._trace_ids[self._label(trace_idx)]
+
+    def is_unique_trace(self, trace_id: str) -> bool:
+        """
+        Returns True if the trace was not merged into another trace.
+        """
+        return self.trace_id(trace_id) == trace_id
+
+    @property
+    def number_of_graphes(self) -> int:
+        """
+        Returns the number of unique traces.
+        """
+        return len(self._labels)
+
+    @property
+    def number_of_nodes(self) -> int:
+        """
+        Returns the number of cached nodes, including evicted ones.
+        """
+        return len(self._nodes)
+
+    @property
+    def latest_event(self) -> datetime:
+        """
+        Returns the time of the latest cached event.
+        """
+        if self._max_event == NEG_INF:
+            return None
+
+        return self._datetime(self._max_event)
+
+    @property
+    def node_ids(self) -> Set[str]:
+        """
+        Returns the IDs of all cached nodes.
+        """
+        return self._node_index.keys()
+
+    @property
+    def unique_trace_ids(self) -> Set[str]:
+        """
+        Returns the IDs of all unique traces.
+        """
+        return {self._trace_ids[label] for label in self._labels.values()}
+
+    def trace_members(self, trace_ids: Set[str]) -> Set[str]:
+        """
+        Returns the IDs of all traces merged into one of the given unique traces.
+        """
+        wanted = {
+            self._trace_index[tid] for tid in trace_ids
+            if tid in self._trace_index}
+
+        return {
+            trace_id for trace_idx, trace_id in enumerate(self._trace_ids)
+            if self._label(trace_idx) in wanted}
+
+    def trace_summaries(self, trace_ids: Set[str]) -> Dict[str, Tuple[List[str], float]]:
+        """
+        Returns the IDs of all merged traces and the timestamp of the last
+        event of each of the given unique traces.
+        """
+        wanted = {
+            self._trace_index[tid] for tid in trace_ids
+            if tid in self._trace_index}
+
+        summaries: Dict[str, Tuple[List[str], float]] = {}
+        for root, label in self._labels.items():
+            if label in wanted:
+                last_event = self._last_events[root]
+                summaries[self._trace_ids[label]] = (
+                    [], None if last_event == NEG_INF else self._datetime(last_event).timestamp())
+
+        for trace_idx, trace_id in enumerate(self._trace_ids):
+            label = self._label(trace_idx)
+            if label in wanted:
+                summaries[self._trace_ids[label]][0].append(trace_id)
+
+        return summaries
+
+    def add_open_request(self, trace_id: str) -> None:
+        """
+        Marks an unresolved request of the trace.
+        """
+        self._open_requests[self._find(self._trace_index[trace_id])] += 1
+
+    def remove_open_request(self, trace_id: str) -> None:
+        """
+        Marks a request of the trace as resolved.
+        """
+        self._open_requests[self._find(self._trace_index[trace_id])] -= 1
+
+    def completed_traces(self, watermark: float = None) -> Set[str]:
+        """
+        Returns all unique traces without unresolved requests whose last event
+        is more than watermark seconds older than the latest cached event.
+
+        Without watermark, the event time is ignored.
+        """
+        threshold = INF if watermark is None else self._max_event - watermark
+        return {
+            self._trace_ids[label] for root, label in self._labels.items()
+            if self._open_requests[root] <= 0 and self._last_events[root] < threshold}
+
+    def add_trace(self, trace_id: str) -> None:
+        """
+        Adds a new trace if the trace is not cached yet.
+        """
+        if trace_id in self._trace_index:
+            return
+
+        trace_idx = len(self._trace_ids)
+        self._trace_index[trace_id] = trace_idx
+        self._trace_ids.append(trace_id)
+        self._parents.append(trace_idx)
+        self._sizes.append(1)
+        self._labels[trace_idx] = trace_idx
+        self._last_events.append(NEG_INF)
+        self._open_requests.append(0)
+
+    def merge_traces(self, parent_trace_id: str, child_trace_id: str) -> None:
+        """
+        Merges child trace in parent trace.
+
+        The merged trace keeps the ID of the parent trace.
+        """
+        parent_root = self._find(self._trace_index[parent_trace_id])
+        child_root = self._find(self._trace_index[child_trace_id])
+        if parent_root == child_root:
+            return
+
+        label = self._labels.pop(parent_root)
+        self._labels.pop(child_root)
+
+        if self._sizes[parent_root] < self._sizes[child_root]:
+            parent_root, child_root = child_root, parent_root
+
+        self._parents[child_root] = parent_root
+        self._sizes[parent_root] += self._sizes[child_root]
+        self._labels[parent_root] = label
+        self._last_events[parent_root] = max(
+            self._last_events[parent_root], self._last_events[child_root])
+        self._open_requests[parent_root] += self._open_requests[child_root]
+
+    """
+    Nodes and edges
+    """
+
+    def _node(self, node_id: str) -> int:
+        """
+        Returns the index of the node. Unknown nodes are added without attributes.
+        """
+        node_idx = self._node_index.get(node_id)
+        if node_idx is not None:
+            return node_idx
+
+        node_idx = len(self._nodes)
+        self._node_index[node_id] = node_idx
+        self._nodes.append(TraceNode(node_id))
+        self._node_traces.append(-1)
+        self._total_times.append(NAN)
+        self._handler_times.append(NAN)
+        self._invoked_at.append(NAN)
+        self._finished_at.append(NAN)
+
+        return node_idx
+
+    def _set_node(
+        self,
+        trace_id: str,
+        node_id: str,
+        node_type: str,
+        label: str,
+        total_execution_time: float = NAN,
+        handler_execution_time: float = NAN,
+        invoked_at: float = NAN,
+        finished_at: float = NAN,
+        duplicate: bool = False
+    ) -> None:
+        node_idx = self._node(node_id)
+        node = self._nodes[node_idx]
+        node.node_type = node_type
+        node.label = label
+        node.duplicate = duplicate
+
+        trace_idx = self._trace_index[trace_id]
+        self._node_traces[node_idx] = trace_idx
+        self._total_times[node_idx] = total_execution_time
+        self._handler_times[node_idx] = handler_execution_time
+        self._invoked_at[node_idx] = invoked_at
+        self._finished_at[node_idx] = finished_at
+
+        last_event = invoked_at if isnan(finished_at) else finished_at
+        if not isnan(last_event):
+            root = self._find(trace_idx)
+            self._last_events[root] = max(self._last_events[root], last_event)
+            self._max_event = max(self._max_event, last_event)
+
+    def add_function_node(
+        self,
+        trace_id: str,
+        node_id: str,
+        label: str,
+        total_execution_time: float,
+        handler_execution_time: float,
+        invoked_at: datetime,
+        finished_at: datetime
+    ) -> None:
+        """
+        Adds a function node to the trace.
+        """
+        self._set_node(
+            trace_id,
+            node_id,
+            FUNCTION_NODE,
+            label,
+            _float(total_execution_time),
+            _float(handler_execution_time),
+            self._offset(invoked_at),
+            self._offset(finished_at))
+
+    def add_service_node(
+        self,
+        trace_id: str,
+        node_id: str,
+        label: str,
+        total_execution_time: float,
+        duplicate: bool = False
+    ) -> None:
+        """
+        Adds a service node to the trace.
+        Duplicate marks a request that was delivered more than once to the same function.
+        """
+        self._set_node(
+            trace_id,
+            node_id,
+            SERVICE_NODE,
+            label,
+            _float(total_execution_time),
+            duplicate=duplicate)
+
+    def latency_after(self, node_id: str, date: datetime) -> float:
+        """
+        Returns the time in ms between the end of the node and date (if available).
+        """
+        node_idx = self._node_index.get(node_id)
+        if node_idx is None or date is None:
+            return None
+
+        finished_at = self._finished_at[node_idx]
+        if isnan(finished_at):
+            return None
+
+        return seconds_to_ms((date - self._datetime(finished_at)).total_seconds())
+
+    def add_edge(
+        self,
+        source_id: str,
+        target_id: str,
+        edge_type: str,
+        latency: float = None,
+        inferred: bool = False
+    ) -> None:
+        """
+        Adds an edge. The edge belongs to the trace of its target.
+
+        Edges without latency are labeled as not available. Inferred edges
+        link requests that were matched by time instead of by identifier.
+        """
+        source_idx = self._node(source_id)
+        target_idx = self._node(target_id)
+        key = source_idx << 32 | target_idx
+
+        edge_idx = self._edge_index.get(key)
+        if edge_idx is None:
+            edge_idx = self._edge_index[key] = len(self._edge_sources)
+            self._edge_sources.append(source_idx)
+            self._edge_targets.append(target_idx)
+            self._edge_types.append(0)
+            self._edge_latencies.append(NAN)
+            self._edge_inferred.append(0)
+
+        self._edge_types[edge_idx] = EDGE_TYPES.index(edge_type)
+        self._edge_latencies[edge_idx] = _float(latency)
+        self._edge_inferred[edge_idx] = inferred
+
+    def remove_edge(self, source_id: str, target_id: str) -> None:
+        """
+        Removes an edge (if available).
+        """
+        source_idx = self._node_index.get(source_id)
+        target_idx = self._node_index.get(target_id)
+        if source_idx is None or target_idx is None:
+            return
+
+        edge_idx = self._edge_index.pop(source_idx << 32 | target_idx, None)
+        if edge_idx is not None:
+            self._edge_sources[edge_idx] = -1
+
+    """
+    Output
+    """
+
+    def _node_attributes(self, node_idx: int) -> dict:
+        node = self._nodes[node_idx]
+        attr = dict(
+            type=node.node_type,
+            label=node.label,
+            total_execution_time=_optional(self._total_times[node_idx]))
+
+        if node.duplicate:
+            attr.update(duplicate=True)
+
+        if node.node_type == FUNCTION_NODE:
+            attr.update(
+                handler_execution_time=_optional(self._handler_times[node_idx]),
+                invoked_at=self._datetime(self._invoked_at[node_idx]),
+                finished_at=self._datetime(self._finished_at[node_idx]))
+
+        return attr
+
+    def _edge_attributes(self, edge_idx: int) -> dict:
+        latency = _optional(self._edge_latencies[edge_idx])
+        attr = dict(
+            type=EDGE_TYPES[self._edge_types[edge_idx]],
+            latency=latency,
+            label=UNKNOWN_LATENCY_LABEL if latency is None else print_ms(latency))
+
+        if self._edge_inferred[edge_idx]:
+            attr.update(inferred=True)
+
+        return attr
+
+    def _offset(self, date: datetime) -> float:
+        """
+        Converts an optional datetime to seconds since the first cached datetime.
+        """
+        if date is None:
+            return NAN
+
+        if self._epoch is None:
+            self._epoch = date
+
+        return (date - self._epoch).total_seconds()
+
+    def _datetime(self, offset: float) -> datetime:
+        if isnan(offset):
+            return None
+
+        return self._epoch + timedelta(seconds=offset)
+
+    def get_all_graphes(self, trace_ids: Set[str] = None) -> List[Type[nx.DiGraph]]:
+        """
+        Builds the graphes of all unique traces, or of the given unique traces.
+        """
+        wanted = None
+        if trace_ids is not None:
+            wanted = {
+                self._trace_index[tid] for tid in trace_ids
+                if tid in self._trace_index}
+
+        graphes: Dict[int, Type[nx.DiGraph]] = {}
+        for node_idx, node in enumerate(self._nodes):
+            trace_idx = self._node_traces[node_idx]
+            if trace_idx < 0:
+                continue
+
+            label = self._label(trace_idx)
+            if wanted is not None and label not in wanted:
+                continue
+
+            graph = graphes.get(label)
+            if graph is None:
+                graph = graphes[label] = nx.DiGraph(
+                    trace_id=self._trace_ids[label])
+
+            graph.add_node(node.node_id, **self._node_attributes(node_idx))
+
+        for edge_idx, source_idx in enumerate(self._edge_sources):
+            if source_idx < 0:
+                continue
+
+            target_idx = self._edge_targets[edge_idx]
+            trace_idx = self._node_traces[target_idx]
+            if trace_idx < 0:
+                continue
+
+            graph = graphes.get(self._label(trace_idx))
+            if graph is not None:
+                graph.add_edge(
+                    self._nodes[source_idx].node_id,
+                    self._nodes[target_idx].node_id,
+                    **self._edge_attributes(edge_idx))
+
+        return list(graphes.values())
+
+    def retained(self, trace_ids: Set[str]) -> Type[GraphCache]:
+        """
+        Returns a copy that only contains traces merged into one of the given unique traces.
+        """
+        wanted = {
+            self._trace_index[tid] for tid in trace_ids
+            if tid in self._trace_index}
+
+        cache = GraphCache()
+        cache._epoch = self._epoch
+        cache._max_event = self._max_event
+
+        for trace_idx, trace_id in enumerate(self._trace_ids):
+            label = self._label(trace_idx)
+            if label in wanted:
+                cache.add_trace(self._trace_ids[label])
+                cache.add_trace(trace_id)
+                cache.merge_traces(self._trace_ids[label], trace_id)
+
+        for root, label in self._labels.items():
+            if label in wanted:
+                cache_root = cache._find(cache._trace_index[self._trace_ids[label]])
+                cache._last_events[cache_root] = self._last_events[root]
+                cache._open_requests[cache_root] = self._open_requests[root]
+
+        for node_idx, node in enumerate(self._nodes):
+            trace_idx = self._node_traces[node_idx]
+            if trace_idx < 0 or self._label(trace_idx) not in wanted:
+                continue
+
+            cache._set_node(
+                self._trace_ids[trace_idx],
+                node.node_id,
+                node.node_type,
+                node.label,
+                self._total_times[node_idx],
+                self._handler_times[node_idx],
+                self._invoked_at[node_idx],
+                self._finished_at[node_idx],
+                node.duplicate)
+
+        for edge_idx, source_idx in enumerate(self._edge_sources):
+            if source_idx < 0:
+                continue
+
+            target_idx = self._edge_targets[edge_idx]
+            trace_idx = self._node_traces[target_idx]
+            if trace_idx < 0 or self._label(trace_idx) not in wanted:
+                continue
+
+            latency = self._edge_latencies[edge_idx]
+            cache.add_edge(
+                self._nodes[source_idx].node_id,
+                self._nodes[target_idx].node_id,
+                EDGE_TYPES[self._edge_types[edge_idx]],
+                None if isnan(latency) else latency,
+                bool(self._edge_inferred[edge_idx]))
+
+        return cache
+
+    def state(self):
+        """
+        State for debugging
+        """
+        print("ALL TRACES")
+        for trace_idx, trace_id in enumerate(self._trace_ids):
+            print(
+                f"{trace_id}: MERGED INTO {self._trace_ids[self._label(trace_idx)]}, "
+                f"SET SIZE {self._sizes[self._find(trace_idx)]}")
+
+        print("\n UNI TRACES:")
+        print({self._trace_ids[label] for label in self._labels.values()})
+
+
+# Identifier attributes that name the resource of a request, not the request
+RESOURCE_KEYS = {
+    "bucket_name",
+    "function_name",
+    "queue_name",
+    "queue_url",
+    "table_name",
+    "topic",
+    "topic_arn"
+}
+
+
+class CachedRequest:
+    """
+    Cached inbound or outbound request of the record with function_key.
+
+    delivered_to holds the function keys of all records an outbound
+    request was delivered to. Requests without deliveries are unresolved.
+    """
+
+    __slots__ = (
+        "tracing_context", "context", "event_time", "function_key", "delivered_to")
+
+    def __init__(
+        self,
+        tracing_context: Type[TracingContext],
+        context: Type[InboundContext | OutboundContext],
+        event_time: float,
+        function_key: str,
+        delivered_to: Set[str] = None
+    ) -> None:
+        self.tracing_context = tracing_context
+        self.context = context
+        self.event_time = event_time
+        self.function_key = function_key
+        self.delivered_to = delivered_to or set()
+
+    @property
+    def trace_id(self) -> str:
+        return str(self.tracing_context.trace_id)
+
+    @property
+    def resolved(self) -> bool:
+        return len(self.delivered_to) > 0
+
+
+class RequestContextCache:
+    """
+    Inbound and outbound requests by identifier.
+
+    An identifier can have several requests, e.g. an SQS message that was
+    delivered twice. Inbound requests are removed once they are resolved.
+    Outbound requests are kept after their first delivery, as one publish
+    can reach several subscribers.
+
+    Unresolved requests are also indexed by time per service and resource:
+    inbound requests by invocation, outbound requests by end of the request.
+    This allows to match requests whose identifiers differ (see
+    nearest_outbound_request). The time indexes are kept by the request
+    stores, so their entries are removed once resolved, spilled with their
+    requests and bounded like them.
+
+    Requests expire once the latest event time seen is more than ttl
+    seconds after their event time. Without ttl, requests never expire.
+    Each direction keeps at most max_entries identifiers in memory and
+    spills older ones to disk (see RequestStore).
+    """
+
+    def __init__(
+        self,
+        ttl: float = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        self.ttl = ttl
+
+        self._inbound_requests = RequestStore(max_entries)
+        self._outbound_requests = RequestStore(max_entries)
+        self._max_event = NEG_INF
+
+    @property
+    def max_entries(self) -> int:
+        return self._inbound_requests.max_entries
+
+    @max_entries.setter
+    def max_entries(self, max_entries: int) -> None:
+        self._inbound_requests.max_entries = max_entries
+        self._outbound_requests.max_entries = max_entries
+
+    def find_outbound_requests_by_inbound_identifier(
+        self,
+        inbound_identifier: str
+    ) -> List[CachedRequest]:
+        """
+        Finds all outbound requests by inbound identifier
+        """
+        entry = self._outbound_requests.get(inbound_identifier)
+        return entry[0] if entry else []
+
+    def find_inbound_requests_by_outbound_identifier(
+        self,
+        outbound_identifier: str
+    ) -> List[CachedRequest]:
+        """
+        Finds all unresolved inbound requests by outbound identifier
+        """
+        entry = self._inbound_requests.get(outbound_identifier)
+        return entry[0] if entry else []
+
+    def cache_outbound_request(
+        self,
+        outbound_context: Type[OutboundContext],
+        function_context: Type[FunctionContext],
+        tracing_context: Type[TracingContext],
+        delivered_to: Set[str] = None
+    ) -> None:
+        """
+        Caches record in outbounds
+        """
+        identifier_str = outbound_context.identifier_string
+        self._add(
+            self._outbound_requests,
+            identifier_str,
+            CachedRequest(
+                tracing_context,
+                outbound_context,
+                function_context.invoked_at.timestamp(),
+                function_context.function_key,
+                delivered_to))
+
+    def cache_inbound_request(
+        self,
+        inbound_context: Type[InboundContext],
+        function_context: Type[FunctionContext],
+        tracing_context: Type[TracingContext]
+    ) -> None:
+        """
+        Caches record in inbounds
+        """
+        identifier_str = inbound_context.identifier_string
+        self._add(
+            self._inbound_requests,
+            identifier_str,
+            CachedRequest(
+                tracing_context,
+                inbound_context,
+                function_context.invoked_at.timestamp(),
+                function_context.function_key))
+
+    def unresolved_inbound_requests(
+        self,
+        before: float = None
+    ) -> List[TimeIndexEntry]:
+        """
+        Returns the time index entries of all unresolved inbound requests
+        invoked before the timestamp.
+        """
+        entries = []
+        for key in self._inbound_requests.time_keys():
+            entries.extend(
+                entry for entry in self._inbound_requests.time_entries(key, end=before)
+                if before is None or entry[0] < before)
+
+        return entries
+
+    def inbound_request(
+        self,
+        inbound_identifier: str,
+        record_id: str
+    ) -> Tuple[List[CachedRequest], CachedRequest]:
+        """
+        Returns all inbound requests of the identifier and the one of the record,
+        or None if the record has no unresolved inbound request.
+        """
+        requests = self.find_inbound_requests_by_outbound_identifier(inbound_identifier)
+        for request in requests:
+            if str(request.tracing_context.record_id) == record_id:
+                return requests, request
+
+        return None
+
+    def nearest_outbound_request(
+        self,
+        inbound_request: CachedRequest,
+        window: float,
+        eligible: Callable[[CachedRequest], bool]
+    ) -> Tuple[str, List[CachedRequest], CachedRequest]:
+        """
+        Returns the latest undelivered and eligible outbound request of the same
+        service and resource that ended at most window seconds before the
+        inbound request was invoked, together with its identifier and all
+        outbound requests of that identifier.
+
+        Identifier attributes that both requests have must be equal.
+        """
+        in_ctx = inbound_request.context
+        invoked_at = inbound_request.event_time
+        if in_ctx.invoked_at:
+            invoked_at = in_ctx.invoked_at.timestamp()
+
+        index = self._outbound_requests.time_entries(
+            resource_key(resource_keys(in_ctx)[0]), invoked_at - window, invoked_at)
+        for _, identifier_str, record_id in reversed(index):
+            requests = self.find_outbound_requests_by_inbound_identifier(identifier_str)
+            for request in requests:
+                if (
+                    str(request.tracing_context.record_id) == record_id and
+                    not request.resolved and
+                    compatible_identifiers(request.context, in_ctx) and
+                    eligible(request)
+                ):
+                    return identifier_str, requests, request
+
+        return None
+
+    def deliver_outbound_request(
+        self,
+        outbound_identifier: str,
+        requests: List[CachedRequest],
+        request: CachedRequest,
+        function_key: str
+    ) -> bool:
+        """
+        Records the delivery of one of the outbound requests of the identifier
+        to a function.
+
+        Returns True if the request was already delivered to that function.
+        """
+        duplicate = function_key in request.delivered_to
+        request.delivered_to.add(function_key)
+
+        self._put(self._outbound_requests, outbound_identifier, requests)
+        return duplicate
+
+    def remove_inbound_requests(
+        self,
+        inbound_identifier: str,
+        requests: List[CachedRequest],
+        resolved: List[CachedRequest]
+    ) -> None:
+        """
+        Removes resolved inbound requests of the identifier
+        """
+        self._put(self._inbound_requests, inbound_identifier, [
+            request for request in requests
+            if not any(request is other for other in resolved)])
+
+    def _add(
+        self,
+        store: Type[RequestStore],
+        identifier_str: str,
+        request: CachedRequest
+    ) -> None:
+        self._max_event = max(self._max_event, request.event_time)
+
+        entry = store.get(identifier_str)
+        requests = entry[0] if entry else []
+        requests.append(request)
+
+        number_of_spilled = store.number_of_spilled
+        self._put(store, identifier_str, requests)
+
+        if store.number_of_spilled > number_of_spilled:
+            stats.count(
+                "spilled_requests", store.number_of_spilled - number_of_spilled)
+
+    def _put(
+        self,
+        store: Type[RequestStore],
+        identifier_str: str,
+        requests: List[CachedRequest]
+    ) -> None:
+        if not requests:
+            store.pop(identifier_str)
+            return
+
+        store.put(
+            identifier_str,
+            requests,
+            tuple(request.trace_id for request in requests if not request.resolved),
+            max(request.event_time for request in requests),
+            time_entries(requests, inbound=store is self._inbound_requests))
+
+    def forget_outbound_requests(self, record: Type[TraceRecord]) -> None:
+        """
+        Forgets the cached outbound requests of the record before it is processed again.
+        """
+        record_id = str(record.record_id)
+        for out_ctx in record.outbound_contexts or []:
+            identifier_str = out_ctx.identifier_string
+            requests = self.find_outbound_requests_by_inbound_identifier(identifier_str)
+            retained = [
+                request for request in requests
+                if str(request.tracing_context.record_id) != record_id]
+
+            if len(retained) < len(requests):
+                self._put(self._outbound_requests, identifier_str, retained)
+
+    def outbound_requests_of(self, trace_ids: Set[str]) -> List[Tuple[str, CachedRequest]]:
+        """
+        Returns the outbound requests of the given traces with their identifiers.
+        """
+        return [
+            (identifier_str, request)
+            for identifier_str in self._outbound_requests.identifiers()
+            for request in self.find_outbound_requests_by_inbound_identifier(identifier_str)
+            if request.trace_id in trace_ids]
+
+    def add_outbound_requests(self, requests: List[Tuple[str, CachedRequest]]) -> None:
+        """
+        Adds outbound requests of another cache, e.g. of a shard.
+        """
+        for identifier_str, request in requests:
+            self._add(self._outbound_requests, identifier_str, request)
+
+    def retain_outbound_requests(self, trace_ids: Set[str]) -> None:
+        """
+        Forgets delivered outbound requests of all traces but the given ones.
+        They cannot be linked to further deliveries once their trace is gone.
+        """
+        for identifier_str in self._outbound_requests.identifiers():
+            requests = self.find_outbound_requests_by_inbound_identifier(identifier_str)
+            retained = [
+                request for request in requests
+                if not request.resolved or request.trace_id in trace_ids]
+
+            if len(retained) < len(requests):
+                self._put(self._outbound_requests, identifier_str, retained)
+
+    def expire_requests(self) -> List[str]:
+        """
+        Removes all requests older than ttl.
+
+        Returns the trace ID of each expired unresolved request.
+        """
+        if self.ttl is None:
+            return []
+
+        threshold = self._max_event - self.ttl
+        return (
+            self._inbound_requests.expire(threshold) +
+            self._outbound_requests.expire(threshold))
+
+    @property
+    def number_of_inbound_requests(self) -> int:
+        return self._inbound_requests.number_of_open
+
+    @property
+    def number_of_outbound_requests(self) -> int:
+        return self._outbound_requests.number_of_open
+
+    @property
+    def number_of_requests(self) -> int:
+        return self.number_of_inbound_requests + self.number_of_outbound_requests
+
+    @property
+    def trace_ids(self) -> Set[str]:
+        """
+        Returns the trace IDs of all unresolved requests.
+        """
+        return (
+            self._inbound_requests.trace_ids() |
+            self._outbound_requests.trace_ids())
+
+
+class StoredTrace:
+    """
+    Completed trace whose graph was stored.
+
+    Keeps the IDs of all traces merged into it, the keys of its records in
+    processing order and the timestamp of its last event, so that records
+    of later runs can reopen it (see reopen_stored_traces).
+    """
+
+    __slots__ = ("members", "record_keys", "last_event")
+
+    def __init__(
+        self,
+        members: List[str],
+        record_keys: List[Any],
+        last_event: float = None
+    ) -> None:
+        self.members = members
+        self.record_keys = record_keys
+        self.last_event = last_event
+
+
+class ProcessingState:
+    """
+    Post-processing state that is carried over between runs.
+
+    Keeps traces with unresolved inbound or outbound requests together with
+    their records, so that records of later runs can be merged into them.
+    Completed traces are only kept as StoredTrace, until their last event
+    is older than the TTL of unresolved requests.
+    """
+
+    VERSION = 12
+
+    @classmethod
+    def load(cls, path: str) -> Type[ProcessingState]:
+        """
+        Loads the state from path or returns an empty state.
+        """
+        if not os.path.exists(path):
+            return cls()
+
+        try:
+            with open(path, "rb") as fp:
+                state = pickle.load(fp)
+        except Exception as err:
+            logger.warning(
+                f"Failed to load processing state {path}: {err}. Starting with an empty state.")
+            return cls()
+
+        if getattr(state, "version", None) != cls.VERSION:
+            logger.warning(
+                f"Processing state {path} has an outdated format. Starting with an empty state.")
+            return cls()
+
+        return state
+
+    def __init__(self) -> None:
+        self.version = self.VERSION
+
+        self.graph_cache = GraphCache()
+        self.request_cache = RequestContextCache()
+
+        self.records: Dict[UUID, Type[TraceRecord]] = {}
+        self.record_keys: Dict[str, str] = {}
+        self.processed_keys: Set[str] = set()
+
+        self.stored_traces: Dict[str, str] = {}
+        self.written_traces: Set[str] = set()
+        self.completed_traces: Dict[str, StoredTrace] = {}
+        self.completed_members: Dict[str, str] = {}
+
+        self.sampler: Type[TraceSampler] = None
+
+    def save(self, path: str) -> None:
+        """
+        Persists the state to path.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fp:
+            pickle.dump(self, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, path)
+
+    def add_completed_traces(self, completed: Dict[str, StoredTrace]) -> None:
+        """
+        Adds stored traces. Entries of traces merged into them are replaced.
+        """
+        for trace_id, stored in completed.items():
+            for member in stored.members:
+                previous = self.completed_members.get(member)
+                if previous is not None and previous != trace_id:
+                    self.completed_traces.pop(previous, None)
+
+                self.completed_members[member] = trace_id
+
+            self.completed_traces[trace_id] = stored
+
+    def pop_completed_trace(self, trace_id: str) -> Tuple[str, StoredTrace]:
+        """
+        Removes and returns the ID and stored trace the trace was merged
+        into, or None if the trace is unknown. The trace stays listed.
+        """
+        root_id = self.completed_members.get(trace_id)
+        if root_id is None:
+            return None
+
+        stored = self.completed_traces.pop(root_id)
+        for member in stored.members:
+            self.completed_members.pop(member, None)
+
+        return root_id, stored
+
+    def retain_open_traces(self, ttl: float = None) -> None:
+        """
+        Forgets all traces, records and listings that cannot be changed by
+        future records because they have no unresolved requests.
+
+        Stored traces whose last event is more than ttl seconds before the
+        latest event are forgotten as well. Without ttl, they are kept.
+        """
+        open_trace_ids = {
+            self.graph_cache.trace_id(trace_id)
+            for trace_id in self.request_cache.trace_ids}
+        open_trace_ids.discard(None)
+
+        latest_event = self.graph_cache.latest_event
+        if ttl is not None and latest_event is not None:
+            threshold = latest_event.timestamp() - ttl
+            for trace_id in [
+                tid for tid, stored in self.completed_traces.items()
+                if stored.last_event is None or stored.last_event < threshold
+            ]:
+                self.pop_completed_trace(trace_id)
+
+        for trace_id in list(self.completed_traces):
+            if trace_id in open_trace_ids:
+                self.pop_completed_trace(trace_id)
+
+        self.graph_cache = self.graph_cache.retained(open_trace_ids)
+        self.request_cache.retain_outbound_requests(
+            self.graph_cache.trace_members(open_trace_ids) |
+            self.completed_members.keys())
+
+        open_record_ids = self.graph_cache.node_ids
+        self.records = {
+            rid: record for rid, record in self.records.items()
+            if str(rid) in open_record_ids}
+        self.record_keys = {
+            rid: key for rid, key in self.record_keys.items()
+            if rid in open_record_ids}
+        self.stored_traces = {
+            tid: function_key for tid, function_key in self.stored_traces.items()
+            if tid in open_trace_ids or tid in self.completed_traces}
+        self.written_traces &= open_trace_ids
+
+
+def store_trace_graph(
+    graph: Type[nx.DiGraph],
+    records: Dict[UUID, Type[TraceRecord]],
+    writer: Type[BackgroundWriter],
+    sampler: Type[TraceSampler] = None,
+    written: bool = False
+) -> TraceListing:
+    """
+    Builds the trace of the graph and submits the graph data to the writer.
+
+    With a sampler, traces that are not sampled for the function key of
+    their root record are dropped before their graph data is built. If
+    their graph data was written before, e.g. by a shard, it is deleted.
+
+    Returns the listing of the trace in the profile of its root record,
+    with the columns of its record data, or None if the trace has no root
+    record with function context or was not sampled.
+    """
+    trace = Trace(graph.graph["trace_id"])
+
+    with stats.timer("topological_sort"):
+        order = list(nx.topological_sort(graph))
 
-import logging
-from typing import Dict, List, Set, Tuple, Type
-from uuid import UUID, uuid4
-from tqdm import tqdm
+    for node in order:
+        node_id = UUID(node)
+        if node_id not in records:
+            continue
 
-from faas_profiler_core.models import (
-    TracingContext,
-    TraceRecord,
-    InboundContext,
-    OutboundContext
-)
-from faas_profiler_core.constants import TriggerSynchronicity
-from faas_profiler_core.models import Trace, Profile
+        if trace.root_record_id is None:
+            trace.root_record_id = node_id
 
-from faas_profiler.config import config
-from faas_profiler.dashboard.graphing import FUNCTION_NODE, SERVICE_NODE, EDGE_SIZE_LIMIT, NODE_SIZE_LIMIT
-from faas_profiler.utilis import print_ms, seconds_to_ms, time_delta_in_sec
+        trace.add_record(records[node_id])
+
+    root_record = None
+    if trace.root_record_id and trace.records[trace.root_record_id].function_context:
+        root_record = trace.records[trace.root_record_id]
 
+    if sampler is not None and root_record is not None:
+        if not sampler.sample(trace.trace_id, root_record.function_key):
+            stats.count("sampled_out_traces")
+            if written:
+                writer.submit(
+                    stats.timed("storage_delete", delete_stored_object),
+                    "delete_graph_data", trace.trace_id)
+            return None
 
-class GraphCache:
+    normalized_graph_weights(graph)
+
+    with stats.timer("critical_path"):
+        mark_critical_path(graph, order)
+
+    with stats.timer("graph_encoding"):
+        graph_data = encode_graph(graph)
+
+    writer.submit(
+        stats.timed("storage_write", config.storage.store_graph_data),
+        trace.trace_id,
+        graph_data)
+    stats.count("traces")
+
+    if root_record is None:
+        return None
+
+    config.metadata_index.add_trace(
+        trace, root_record.function_key, profile_id_of(root_record.function_key))
+
+    with stats.timer("column_extraction"):
+        columns = trace_columns(trace)
+
+    return (
+        graph_sort_key(graph),
+        trace.trace_id,
+        root_record.function_key,
+        root_record.function_context,
+        columns)
+
+
+def delete_stored_object(delete: str, object_id) -> None:
     """
-    In-Memory trace cached used for record processing.
+    Deletes a stored graph or profile with the delete method of the storage.
+    Storages that cannot delete keep the object.
     """
+    method = getattr(config.storage, delete, None)
+    if method is None:
+        logger.debug(f"Storage cannot {delete}. Keeping {object_id}.")
+        return
 
-    def __init__(self) -> None:
-        self._graphes_by_id: Dict[UUID, Type[nx.Graph]] = {}
-        self._unique_trace_ids: Set[UUID] = set()
+    try:
+        method(object_id)
+    except (KeyError, NotImplementedError):
+        pass
+
+
+class TraceFinalizer:
+    """
+    Stores the graphes of finalized traces and lists them in their profiles.
+
+    Graphes and profiles are written in the background by upload_workers threads
+    and summarized in the local metadata index (see metadata_index).
+    The columns of the record data of each profile are exported to the local
+    columnar directory (see columnar).
+
+    Each function key has exactly one profile (see profile_id_of). If append,
+    new traces are appended to the stored profiles, otherwise profiles are
+    rebuilt from the listed traces only.
 
-    def get_graph(
+    With the sampler of the state, only sampled traces are listed and the
+    sampling weight of each profile is written to the metadata index.
+    """
+
+    def __init__(
         self,
-        trace_id: UUID
-    ) -> Type[nx.DiGraph]:
+        state: Type[ProcessingState],
+        upload_workers: int = DEFAULT_WORKERS,
+        append: bool = True
+    ) -> None:
+        self.state = state
+        self.writer = BackgroundWriter(workers=upload_workers)
+        self.append = append
+        self.sampler = state.sampler
+        self.profiles: Dict[str, Profile] = {}
+        self.columns: Dict[str, Dict[str, TraceColumns]] = defaultdict(dict)
+        self.number_of_traces = 0
+
+        self._listed_traces: Dict[str, Set[str]] = {}
+
+    def get_profile(
+        self,
+        function_key: str,
+        function_context=None
+    ) -> Type[Profile]:
         """
-        Get cached graph by ID (if available)
+        Returns the profile for the function key.
+
+        If append, the stored profile is loaded once. Only its list of
+        trace IDs is read, not the traces themselves.
         """
-        graph = self._graphes_by_id.get(trace_id)
-        if not graph:
-            return
+        if function_key in self.profiles:
+            return self.profiles[function_key]
+
+        profile = None
+        profile_id = profile_id_of(function_key)
+        if self.append:
+            try:
+                profile = config.storage.get_profile(profile_id)
+            except Exception:
+                logger.info(
+                    f"No stored profile {profile_id} for {function_key}. Creating a new profile.")
 
-        _parent_id = graph.graph.get("parent_trace_id")
-        if _parent_id:
-            return self.get_graph(_parent_id)
+        if profile is None:
+            profile = Profile(
+                profile_id=profile_id,
+                trace_ids=[],
+                function_context=function_context)
 
-        return graph
+        self.profiles[function_key] = profile
+        self._listed_traces[function_key] = set(map(str, profile.trace_ids))
+        return profile
 
-    def get_all_graphes(self) -> Type[Trace]:
+    def unlist_trace(self, trace_id: str) -> None:
         """
-        Get all unique cached graphes
+        Removes a trace stored by a previous run from its profile.
         """
-        return [
-            self._graphes_by_id[tid] for tid in self._unique_trace_ids]
+        function_key = self.state.stored_traces.pop(trace_id, None)
+        if function_key is None:
+            return
 
-    @property
-    def number_of_graphes(self) -> int:
-        """
-        Returns the number of unique traces.
-        """
-        return len(self._unique_trace_ids)
+        self._unlist(trace_id, function_key)
 
-    def cache_graph(
-        self,
-        trace_id: UUID,
-        graph: Type[nx.DiGraph]
-    ):
+    def _unlist(self, trace_id: str, function_key: str) -> None:
+        profile = self.get_profile(function_key)
+        listed_traces = self._listed_traces[function_key]
+        if trace_id not in listed_traces:
+            return
+
+        listed_traces.discard(trace_id)
+        profile.trace_ids = [
+            tid for tid in profile.trace_ids if str(tid) != trace_id]
+
+    def unlist_merged_traces(self) -> None:
         """
-        Caches new graph.
+        Removes traces stored by previous runs that were merged into other
+        traces from their profiles and deletes their graph data.
         """
-        graph.graph["trace_id"] = str(trace_id)
+        graph_cache = self.state.graph_cache
+        for trace_id in list(self.state.written_traces):
+            if not graph_cache.has_trace(trace_id) or graph_cache.is_unique_trace(trace_id):
+                continue
+
+            self.unlist_trace(trace_id)
+            self.state.written_traces.discard(trace_id)
+            self.delete_graph_data(trace_id)
+            stats.count("merged_stored_traces")
 
-        self._unique_trace_ids.add(trace_id)
-        self._graphes_by_id[trace_id] = graph
+            if self.sampler is not None:
+                self.sampler.discard(trace_id)
 
-    def flush_trace(self, trace_id: UUID):
+    def delete_graph_data(self, trace_id) -> None:
+        self.writer.submit(
+            stats.timed("storage_delete", delete_stored_object),
+            "delete_graph_data", trace_id)
+
+    def unlist_evicted_traces(self, deleted: Set[str] = set()) -> None:
         """
-        Flushes trace out of unique trace IDs.
+        Removes traces that left the reservoir of the sampler from their
+        profiles and deletes their graph data, unless already deleted.
         """
-        if trace_id in self._unique_trace_ids:
-            self._unique_trace_ids.remove(trace_id)
+        for trace_id, function_key in self.sampler.pop_evicted():
+            self.state.stored_traces.pop(trace_id, None)
+            self.columns[function_key].pop(trace_id, None)
+            if trace_id not in deleted:
+                self.delete_graph_data(trace_id)
+            stats.count("evicted_sampled_traces")
+
+            if self.append or function_key in self.profiles:
+                self._unlist(trace_id, function_key)
 
-    def create_or_return_graph(
+    def finalize(
         self,
-        trace_id: UUID
-    ) -> Type[nx.DiGraph]:
+        graphes: List[Type[nx.DiGraph]],
+        listings: List[TraceListing] = []
+    ) -> None:
         """
-        Creates or returns a graph
+        Stores the graph data of all traces and lists them, together with
+        the given listings, in the profiles of their root records.
+
+        Traces are listed in the order of graph_sort_key. With a sampler,
+        only sampled traces are stored and listed.
+
+        The stored traces are added to the state, so that later records
+        can reopen them. Graph data stored before, e.g. by shards, is deleted
+        for traces that are not sampled.
         """
-        logger.info(f"Search for trace with ID {trace_id}")
-        graph = self.get_graph(str(trace_id))
-        if graph:
-            logger.info(f"Found graph with ID {trace_id}")
-            return graph
-        else:
-            logger.info(
-                f"Could not find graph for ID {trace_id}. Create new graph.")
-            graph = nx.DiGraph(trace_id=trace_id)
-            self.cache_graph(str(trace_id), graph)
-            return graph
+        listings = list(listings)
+        for graph in tqdm(graphes):
+            listings.append(store_trace_graph(
+                graph, self.state.records, self.writer, self.sampler,
+                str(graph.graph["trace_id"]) in self.state.written_traces))
+
+        self.number_of_traces += len(graphes)
+
+        self.state.add_completed_traces(stored_traces_of(
+            self.state.graph_cache, graphes, self.state.record_keys))
+        self.state.written_traces.update(
+            graph.graph["trace_id"] for graph in graphes)
+
+        sampled_out: Set[str] = set()
+        listings = sorted(filter(None, listings), key=lambda listing: listing[0])
+        for _, trace_id, function_key, function_context, columns in listings:
+            # Listings of shards are only sampled by their copy of the sampler
+            if self.sampler is not None and not self.sampler.sample(trace_id, function_key):
+                stats.count("sampled_out_traces")
+                sampled_out.add(str(trace_id))
+                self.delete_graph_data(trace_id)
+                continue
 
-    def state(self):
+            self.list_trace(trace_id, function_key, function_context)
+            self.columns[function_key][str(trace_id)] = columns
+
+        if self.sampler is not None:
+            self.unlist_evicted_traces(sampled_out)
+
+    def list_trace(
+        self,
+        trace_id,
+        function_key: str,
+        function_context
+    ) -> None:
         """
-        State for debugging
+        Lists the trace in the profile of the function key.
         """
-        print("ALL GRAPHES")
-        for tid, graph in self._graphes_by_id.items():
-            print(
-                f"{tid}: GRAPH ID {graph.graph['trace_id']}, "
-                "PARENT: {graph.graph.get('parent_trace_id')} {str(graph)}, MEM {hex(id(graph))}")
-
-        print("\n UNI GRAPHES:")
-        print(self._unique_trace_ids)
+        if self.state.stored_traces.get(str(trace_id)) == function_key:
+            return
 
+        self.unlist_trace(str(trace_id))
+        self.state.stored_traces[str(trace_id)] = function_key
 
-class RequestContextCache:
+        profile = self.get_profile(function_key, function_context)
+        listed_traces = self._listed_traces[function_key]
+        if str(trace_id) in listed_traces:
+            return
 
-    def __init__(self) -> None:
-        self._inbound_requests: Dict[
-            str, Tuple[TracingContext, InboundContext]] = {}
-        self._outbound_requests: Dict[
-            str, Tuple[TracingContext, OutboundContext]] = {}
+        listed_traces.add(str(trace_id))
+        profile.trace_ids.append(trace_id)
 
-    def find_outbound_request_by_inbound_identifier(
-        self,
-        inbound_identifier: str
-    ) -> Tuple[TracingContext, OutboundContext]:
+    def store_profiles(self) -> None:
         """
-        Finds outbound request exists by inbound identifier
+        Stores all changed profiles and exports the columns of their record data.
+
+        Profiles without traces are deleted instead.
         """
-        return self._outbound_requests.get(inbound_identifier)
+        print(f"Processing {len(self.profiles)} profiles")
+        for function_key, profile in self.profiles.items():
+            if not profile.trace_ids:
+                self.remove_profile(profile)
+                continue
 
-    def find_inbound_request_by_outbound_identifier(
-        self,
-        outbound_identifier: str
-    ) -> Tuple[TracingContext, InboundContext]:
+            self.writer.submit(
+                stats.timed("storage_write", config.storage.store_profile),
+                profile)
+            self.writer.submit(
+                stats.timed("column_export", export_profile_columns),
+                config.columnar_dir,
+                profile,
+                self.columns.pop(function_key, {}))
+            config.metadata_index.update_profile(
+                profile, function_key, self.sampling_weight(function_key))
+            stats.count("profiles")
+
+    def remove_profile(self, profile: Type[Profile]) -> None:
         """
-        Finds inbound request exists by outbound identifier
+        Deletes the profile with its columns and index entries.
         """
-        return self._inbound_requests.get(outbound_identifier)
-
-    def cache_outbound_request(
-        self,
-        outbound_context: Type[OutboundContext],
-        tracing_context: Type[TracingContext]
-    ):
+        self.writer.submit(
+            stats.timed("storage_delete", delete_stored_object),
+            "delete_profile", profile.profile_id)
+        self.writer.submit(
+            remove_profile_columns, config.columnar_dir, profile.profile_id)
+        config.metadata_index.remove_profile(profile.profile_id)
+        stats.count("removed_profiles")
+
+    def sampling_weight(self, function_key: str) -> float:
         """
-        Caches record in outbounds
+        Returns the number of traces each listed trace of the function key stands for.
         """
-        identifier_str = outbound_context.identifier_string
-        if identifier_str in self._outbound_requests:
-            raise RuntimeError(
-                f"Identifier duplicate for {identifier_str} in outbounds")
+        if self.sampler is None:
+            return 1.0
 
-        self._outbound_requests[identifier_str] = (
-            tracing_context, outbound_context)
+        return self.sampler.weight(function_key)
 
-    def cache_inbound_request(
-        self,
-        inbound_context: Type[OutboundContext],
-        tracing_context: Type[TracingContext]
-    ):
+    def close(self) -> None:
         """
-        Caches record in inbounds
+        Waits until all graphes and profiles are written and updates the metadata index.
         """
-        identifier_str = inbound_context.identifier_string
-        if identifier_str in self._inbound_requests:
-            raise RuntimeError(
-                f"Identifier duplicate for {identifier_str} in inbounds")
-
-        self._inbound_requests[identifier_str] = (
-            tracing_context, inbound_context)
+        self.writer.close()
+        config.metadata_index.flush()
 
 
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
 
-def process_records() -> None:
+def process_records(
+    fetch_workers: int = DEFAULT_WORKERS,
+    prefetch_depth: int = DEFAULT_QUEUE_DEPTH,
+    incremental: bool = True,
+    stream: bool = False,
+    watermark: float = DEFAULT_WATERMARK,
+    processes: int = 1,
+    upload_workers: int = DEFAULT_WORKERS,
+    request_ttl: float = DEFAULT_REQUEST_TTL,
+    max_cached_requests: int = DEFAULT_MAX_ENTRIES,
+    match_window: float = DEFAULT_MATCH_WINDOW,
+    sample_reservoir: int = None,
+    sample_probability: float = None,
+    stats_json: str = None
+) -> None:
     """
     Processes a batch of unprocessed records.
+
+    Records are fetched and decoded by fetch_workers threads, at most
+    prefetch_depth records ahead of processing, and processed in key order.
+
+    If incremental, only records that were not processed by a previous run
+    are read. Traces with unresolved requests are persisted between runs and
+    new records are merged into them. Stored traces are reopened by new
+    records that belong to them, until their last event is more than
+    request_ttl seconds old (see reopen_stored_traces). Otherwise all records
+    are processed from scratch and the persisted state is replaced.
+
+    If stream, records are read in the order they were written, if the
+    storage knows it, and traces are written and evicted from memory while
+    records are processed: as soon as they have no unresolved requests and
+    their last event is more than watermark seconds older than the latest
+    event seen. Late records of evicted traces reopen them.
+
+    With more than one process, records are sharded by trace ID across a
+    process pool (see process_shards). The result is the same as with a
+    single process.
+
+    Unresolved requests expire once the latest event seen is more than
+    request_ttl seconds later, e.g. calls to untraced services. Their traces
+    are then completed without them. Per direction, at most
+    max_cached_requests unresolved requests are kept in memory; older ones
+    are spilled to disk.
+
+    Inbound requests that are still unresolved at the end of the run (with
+    stream, once the watermark passed them) are matched to the nearest
+    outbound request of the same service and resource that ended at most
+    match_window seconds earlier. The edges of these matches are marked as
+    inferred. Without match_window, requests are only matched by identifier.
+
+    With sample_reservoir or sample_probability, whole traces are sampled
+    by their trace ID (see sampling): per root function key, a reservoir of
+    sample_reservoir traces is kept, plus each other trace with
+    sample_probability. Profiles only list sampled traces and their
+    sampling weights are written to the metadata index. Incremental runs
+    must use the sampling parameters of the previous runs.
+
+    Results are uploaded by upload_workers threads in the background.
+    The state is only saved once all uploads succeeded.
+
+    Stage times and counters are printed and, with stats_json, written
+    as JSON to that path.
     """
-    graph_cache = GraphCache()
-    request_cache = RequestContextCache()
+    if stream and processes > 1:
+        raise ValueError("Streaming is not supported with multiple processes")
+
+    stats.reset()
+
+    state_file = config.processing_state_file
+    if incremental:
+        state = ProcessingState.load(state_file)
+    else:
+        state = ProcessingState()
+
+    state.request_cache.ttl = request_ttl
+    state.request_cache.max_entries = max_cached_requests
 
-    processed_records: Dict[UUID, Type[TraceRecord]] = {}
+    sampler = None
+    if sample_reservoir is not None or sample_probability is not None:
+        sampler = TraceSampler(sample_reservoir or 0, sample_probability or 0.0)
 
-    traces: List[Trace] = []
-    profiles: Dict[str, Profile] = {}
+    state.sampler = continued_sampler(state, sampler)
+
+    finalizer = TraceFinalizer(state, upload_workers, append=incremental)
 
     # Process Records
+    with stats.timer("listing"):
+        # Keys are compared without codec suffix, as records can be re-encoded
+        record_keys = [
+            key for key in unprocessed_record_keys(by_time=stream)
+            if stem_of(key) not in state.processed_keys]
+
     print(f"Processing records for {config.provider.name}")
-    print(
-        f"Found {len(config.storage.unprocessed_record_keys)} unprocessed records \n")
+    print(f"Found {len(record_keys)} unprocessed records \n")
 
-    for record in tqdm(
-        config.storage.unprocessed_records(), total=len(
-            config.storage.unprocessed_record_keys)):
-        process_record(record, graph_cache, request_cache)
-        processed_records[record.record_id] = record
+    if processes > 1:
+        listings, records = process_shards(
+            state, record_keys, processes,
+            fetch_workers, prefetch_depth, upload_workers, state.sampler)
+        number_of_records = len(records)
 
-    assert len(config.storage.unprocessed_record_keys) == len(
-        processed_records)
+        print(
+            f"Stored {len(listings)} traces in shards. "
+            f"Resolving {number_of_records} records across shards.")
+    else:
+        listings = []
+        records = zip(record_keys, stats.timed_iter("fetch_wait", prefetch_ordered(
+            record_fetcher(),
+            record_keys,
+            workers=fetch_workers,
+            queue_depth=prefetch_depth)))
+        number_of_records = len(record_keys)
+
+    new_trace_ids: Set[str] = set()
+    reopened_traces = 0
+    expired_requests = 0
+    next_check = STREAM_CHECK_INTERVAL
+    next_expiry = STREAM_CHECK_INTERVAL
+    for idx, (key, record) in enumerate(tqdm(records, total=number_of_records)):
+        trace_id = None
+        if record.tracing_context:
+            trace_id = str(record.tracing_context.trace_id)
+
+        reopened = reopen_stored_traces(record, state)
+        new_trace_ids |= reopened
+        reopened_traces += len(reopened)
+
+        process_record(record, state.graph_cache, state.request_cache)
+        state.records[record.record_id] = record
+        state.record_keys[str(record.record_id)] = key
+        stats.count("replayed_records" if processes > 1 else "records")
+
+        if trace_id:
+            new_trace_ids.add(trace_id)
+
+        if idx >= next_expiry:
+            expired_requests += expire_requests(state)
+            next_expiry = idx + max(
+                STREAM_CHECK_INTERVAL, state.request_cache.number_of_requests)
+
+        if stream and idx >= next_check:
+            latest_event = state.graph_cache.latest_event
+            if match_window and latest_event is not None:
+                resolve_by_time_window(
+                    state.graph_cache,
+                    state.request_cache,
+                    match_window,
+                    before=latest_event.timestamp() - watermark)
+
+            new_trace_ids -= evict_completed_traces(state, finalizer, watermark)
+            next_check = idx + max(
+                STREAM_CHECK_INTERVAL, state.graph_cache.number_of_nodes)
+
+    if stream:
+        print(f"Finalized {finalizer.number_of_traces} traces while streaming.")
+
+    print(f"Reopened {reopened_traces} stored traces.")
+
+    if match_window:
+        matches = resolve_by_time_window(
+            state.graph_cache, state.request_cache, match_window)
+        print(f"Matched {matches} unresolved requests by time.")
+
+    expired_requests += expire_requests(state)
+    print(f"Expired {expired_requests} unresolved requests.")
+
+    # Only traces that received new records need to be (re)written.
+    graph_cache = state.graph_cache
+    touched_trace_ids = {graph_cache.trace_id(tid) for tid in new_trace_ids}
+
+    finalizer.unlist_merged_traces()
 
     # Process Traces
-    print(f"Processing {graph_cache.number_of_graphes} traces.")
-    for graph in tqdm(graph_cache.get_all_graphes()):
-        trace = Trace(graph.graph["trace_id"])
+    graphes = graph_cache.get_all_graphes(touched_trace_ids)
 
-        normalized_graph_weights(graph)
+    # Shard traces reopened by the coordinator are listed from its graphes
+    listings = [
+        listing for listing in listings
+        if not graph_cache.has_trace(str(listing[1]))]
 
-        for node in nx.topological_sort(graph):
-            node_id = UUID(node)
-            if node_id not in processed_records:
-                continue
+    print(f"Processing {len(graphes)} traces.")
+    finalizer.finalize(graphes, listings)
+
+    # Process Profiles
+    finalizer.store_profiles()
+    with stats.timer("storage_flush"):
+        finalizer.close()
+
+    state.processed_keys.update(map(stem_of, record_keys))
+    state.retain_open_traces(request_ttl)
+    state.save(state_file)
+
+    stats.count("open_traces", state.graph_cache.number_of_graphes)
+    stats.count(
+        "unresolved_inbound", state.request_cache.number_of_inbound_requests)
+    stats.count(
+        "unresolved_outbound", state.request_cache.number_of_outbound_requests)
+
+    print(
+        f"Keeping {state.graph_cache.number_of_graphes} traces with unresolved requests for the next run.")
+    print(stats)
+
+    if stats_json:
+        stats.dump(stats_json)
+
+
+def unprocessed_record_keys(by_time: bool = False) -> List[str]:
+    """
+    Returns the keys of all unprocessed records. If by_time, they are in
+    the order the records were written, if the storage knows it.
+    """
+    if by_time and hasattr(config.storage, "unprocessed_record_keys_by_time"):
+        return config.storage.unprocessed_record_keys_by_time
+
+    return config.storage.unprocessed_record_keys
+
+
+def record_fetcher() -> Callable[[str], Type[TraceRecord]]:
+    """
+    Returns the function that gets an unprocessed record by key, timed as fetch.
+    Object storages time fetching and decoding records themselves.
+    """
+    get_unprocessed_record = config.storage.get_unprocessed_record
+    if isinstance(getattr(get_unprocessed_record, "__self__", None), ObjectRecordStorage):
+        return get_unprocessed_record
+
+    return stats.timed("fetch", get_unprocessed_record)
+
+
+def continued_sampler(
+    state: Type[ProcessingState],
+    sampler: Type[TraceSampler]
+) -> Type[TraceSampler]:
+    """
+    Returns the sampler of the state if it has the same parameters as sampler,
+    or sampler for a state without processed records.
+    """
+    if not state.processed_keys:
+        return sampler
+
+    previous = state.sampler.parameters if state.sampler else None
+    requested = sampler.parameters if sampler else None
+    if previous != requested:
+        raise ValueError(
+            f"Sampling parameters {requested} differ from previous runs ({previous}). "
+            "Please process all records again (full).")
+
+    return state.sampler
+
+
+def expire_requests(state: Type[ProcessingState]) -> int:
+    """
+    Drops unresolved requests older than the TTL of the request cache
+    and marks them as resolved in their traces.
+
+    Returns the number of expired requests.
+    """
+    trace_ids = state.request_cache.expire_requests()
+    for trace_id in trace_ids:
+        if state.graph_cache.has_trace(trace_id):
+            state.graph_cache.remove_open_request(trace_id)
+
+    stats.count("expired_requests", len(trace_ids))
+    return len(trace_ids)
+
+
+def evict_completed_traces(
+    state: Type[ProcessingState],
+    finalizer: Type[TraceFinalizer],
+    watermark: float
+) -> Set[str]:
+    """
+    Finalizes all completed traces and evicts them from the state.
+
+    Returns the IDs of all evicted traces, including merged ones.
+    """
+    graph_cache = state.graph_cache
+    completed_trace_ids = graph_cache.completed_traces(watermark)
+    if not completed_trace_ids:
+        return set()
+
+    finalizer.unlist_merged_traces()
+
+    evicted_trace_ids = graph_cache.trace_members(completed_trace_ids)
+    graphes = graph_cache.get_all_graphes(completed_trace_ids)
+    finalizer.finalize(graphes)
+
+    for graph in graphes:
+        for node in graph.nodes:
+            state.records.pop(UUID(node), None)
+            state.record_keys.pop(node, None)
+
+    state.graph_cache = graph_cache.retained(
+        graph_cache.unique_trace_ids - completed_trace_ids)
+
+    return evicted_trace_ids
+
+
+def stored_traces_of(
+    graph_cache: Type[GraphCache],
+    graphes: List[Type[nx.DiGraph]],
+    record_keys: Dict[str, Any]
+) -> Dict[str, StoredTrace]:
+    """
+    Returns the stored traces of the graphes, with the keys of their records
+    in the order of record_keys.
+    """
+    summaries = graph_cache.trace_summaries(
+        {graph.graph["trace_id"] for graph in graphes})
+
+    node_traces: Dict[str, str] = {}
+    completed: Dict[str, StoredTrace] = {}
+    for graph in graphes:
+        trace_id = graph.graph["trace_id"]
+        members, last_event = summaries[trace_id]
+        completed[trace_id] = StoredTrace(members, [], last_event=last_event)
+        node_traces.update(dict.fromkeys(graph.nodes, trace_id))
+
+    for record_id, key in record_keys.items():
+        trace_id = node_traces.get(record_id)
+        if trace_id is not None:
+            completed[trace_id].record_keys.append(key)
+
+    return completed
+
+
+def reopen_stored_traces(
+    record: Type[TraceRecord],
+    state: Type[ProcessingState]
+) -> Set[str]:
+    """
+    Reopens the stored traces the record belongs to or was triggered by.
 
-            if trace.root_record_id is None:
-                trace.root_record_id = node_id
+    Their records are fetched and processed again, so that the record is
+    merged into the whole trace instead of starting a new one. The trace is
+    then stored again and keeps its listing.
 
-            trace.add_record(processed_records[node_id])
+    Returns the IDs of the reopened traces.
+    """
+    trace_ids = []
+    if record.tracing_context:
+        trace_ids.append(str(record.tracing_context.trace_id))
 
-        traces.append(trace)
-        graph_data = nx.cytoscape_data(graph)
-        config.storage.store_graph_data(trace.trace_id, graph_data)
+    in_ctx = record.inbound_context
+    if in_ctx and in_ctx.resolvable:
+        trace_ids.extend(
+            request.trace_id
+            for request in state.request_cache.find_outbound_requests_by_inbound_identifier(
+                in_ctx.identifier_string))
+
+    reopened = set()
+    for trace_id in trace_ids:
+        if state.graph_cache.has_trace(trace_id):
+            continue
 
-        if not trace.root_record_id:
+        completed = state.pop_completed_trace(trace_id)
+        if completed is None:
             continue
 
-        root_record = trace.records[trace.root_record_id]
-        if not root_record.function_context:
-            return
+        root_id, stored = completed
+        for key in stored.record_keys:
+            stored_record = config.storage.get_unprocessed_record(key)
+            state.request_cache.forget_outbound_requests(stored_record)
+            process_record(stored_record, state.graph_cache, state.request_cache)
+            state.records[stored_record.record_id] = stored_record
+            state.record_keys[str(stored_record.record_id)] = key
 
-        if root_record.function_key in profiles:
-            profiles[root_record.function_key].trace_ids.append(
-                trace.trace_id)
-        else:
-            profiles[root_record.function_key] = Profile(
-                profile_id=uuid4(),
-                trace_ids=[trace.trace_id],
-                function_context=root_record.function_context)
+        state.written_traces.add(root_id)
+        reopened.add(root_id)
+        stats.count("reopened_traces")
 
-    # Process Profiles
-    print(f"Processing {len(profiles)} profiles")
-    for profile in tqdm(profiles.values()):
-        config.storage.store_profile(profile)
+    return reopened
+
+
+"""
+Sharded processing
+"""
+
+
+def process_shards(
+    state: Type[ProcessingState],
+    record_keys: List[str],
+    processes: int,
+    fetch_workers: int = DEFAULT_WORKERS,
+    prefetch_depth: int = DEFAULT_QUEUE_DEPTH,
+    upload_workers: int = DEFAULT_WORKERS,
+    sampler: Type[TraceSampler] = None
+) -> Tuple[List[TraceListing], List[Tuple[str, Type[TraceRecord]]]]:
+    """
+    Processes records with a pool of processes.
+
+    All processes fetch and decode chunks of records, which are then sharded
+    by trace ID. Each shard builds its own graphes and stores all traces
+    without unresolved requests. With a sampler, shards only store traces
+    that a copy of it samples, and the hashes they dropped are added to it.
+
+    The stored traces of the shards and their outbound requests are added to
+    the state, so that deliveries in other shards reopen them, as after a
+    previous run. Returns the listings of the stored traces and, in key
+    order, the keys and records of all remaining traces. These are resolved
+    across shards by processing them with the state of the coordinator.
+    """
+    # Traces of previous runs must be merged by the coordinator
+    open_trace_ids = state.graph_cache.trace_members(
+        state.graph_cache.unique_trace_ids) | state.completed_members.keys()
+
+    positions = list(enumerate(record_keys))
+    chunk_size = max(1, ceil(len(positions) / (processes * SHARD_CHUNKS)))
+    chunks = [
+        positions[start:start + chunk_size]
+        for start in range(0, len(positions), chunk_size)]
+
+    shards: List[List[Tuple[int, Type[TraceRecord]]]] = [
+        [] for _ in range(processes)]
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_shard_process,
+        initargs=(
+            config.provider.value,
+            config.region,
+            config.storage_bucket,
+            config.project_id,
+            config.local_dir,
+            config.codec,
+            config.storage_backend,
+            config.pool_size,
+            config.client_per_thread)
+    ) as executor:
+        with tqdm(total=len(record_keys)) as progress:
+            for chunk_shards, chunk_stats in executor.map(
+                _fetch_shard_records,
+                chunks,
+                repeat(processes),
+                repeat(fetch_workers),
+                repeat(prefetch_depth)
+            ):
+                for shard, shard_records in zip(shards, chunk_shards):
+                    shard.extend(shard_records)
+
+                progress.update(sum(map(len, chunk_shards)))
+                stats.merge(chunk_stats)
+
+        print(f"Processing {processes} shards.")
+        results = list(tqdm(
+            executor.map(
+                _process_shard,
+                shards,
+                repeat(open_trace_ids),
+                repeat(upload_workers),
+                repeat(sampler)),
+            total=processes))
+
+    listings: List[TraceListing] = []
+    open_records: List[Tuple[int, Type[TraceRecord]]] = []
+    for (
+        shard_listings, completed, outbound_requests, shard_open_records,
+        dropped_hashes, shard_stats
+    ) in results:
+        if sampler is not None:
+            sampler.add_dropped_hashes(dropped_hashes)
+
+        for stored in completed.values():
+            stored.record_keys = [record_keys[position] for position in stored.record_keys]
+
+        state.add_completed_traces(completed)
+        state.request_cache.add_outbound_requests(outbound_requests)
+        listings.extend(shard_listings)
+        open_records.extend(shard_open_records)
+        stats.merge(shard_stats)
+
+    open_records.sort(key=lambda item: item[0])
+
+    return listings, [
+        (record_keys[position], record) for position, record in open_records]
+
+
+def shard_of(record: Type[TraceRecord], number_of_shards: int) -> int:
+    """
+    Returns the shard of the record, stable across processes.
+    """
+    if not record.tracing_context:
+        return 0
+
+    trace_id = str(record.tracing_context.trace_id)
+    return crc32(trace_id.encode()) % number_of_shards
+
+
+def _init_shard_process(
+    provider: str,
+    region: str,
+    storage_bucket: str,
+    project_id: str,
+    local_dir: str,
+    codec: str,
+    storage_backend: str,
+    pool_size: int,
+    client_per_thread: bool
+) -> None:
+    config.provider = provider
+    config.region = region
+    config.storage_bucket = storage_bucket
+    config.project_id = project_id
+    config.local_dir = local_dir
+    config.codec = codec
+    config.storage_backend = storage_backend
+    config.pool_size = pool_size
+    config.client_per_thread = client_per_thread
+    config.reset_storage()
+
+
+def _fetch_shard_records(
+    chunk: List[Tuple[int, str]],
+    number_of_shards: int,
+    fetch_workers: int,
+    prefetch_depth: int
+) -> Tuple[List[List[Tuple[int, Type[TraceRecord]]]], tuple]:
+    positions, keys = zip(*chunk)
+    stats.reset()
+    records = stats.timed_iter("fetch_wait", prefetch_ordered(
+        record_fetcher(),
+        keys,
+        workers=fetch_workers,
+        queue_depth=prefetch_depth))
+
+    shards = [[] for _ in range(number_of_shards)]
+    for position, record in zip(positions, records):
+        shards[shard_of(record, number_of_shards)].append((position, record))
+
+    return shards, stats.snapshot()
+
+
+def _process_shard(
+    records: List[Tuple[int, Type[TraceRecord]]],
+    open_trace_ids: Set[str],
+    upload_workers: int,
+    sampler: Type[TraceSampler] = None
+) -> Tuple[
+    List[TraceListing],
+    Dict[str, StoredTrace],
+    List[Tuple[str, CachedRequest]],
+    List[Tuple[int, Type[TraceRecord]]],
+    Dict[str, float],
+    tuple
+]:
+    """
+    Processes the records of a shard and stores its closed traces.
+
+    With the copy of the sampler of the coordinator, only sampled traces
+    are stored. As the sampler keeps the smallest hashes, a trace it drops
+    would also be dropped by the coordinator. Traces are sampled in hash
+    order, so no stored trace of the shard is evicted by another.
+
+    Returns the stored traces, which refer to their records by position,
+    together with their delivered outbound requests, as these can still be
+    delivered to records of other shards, and the dropped hashes of the
+    sampler.
+    """
+    stats.reset()
+    state = ProcessingState()
+    graph_cache = state.graph_cache
+    for _, record in records:
+        process_record(record, graph_cache, state.request_cache)
+        state.records[record.record_id] = record
+        stats.count("records")
+
+    # Traces persisted by previous runs must be merged by the coordinator
+    blocked_trace_ids = {
+        graph_cache.trace_id(tid) for tid in open_trace_ids
+        if graph_cache.has_trace(tid)}
+    closed_trace_ids = graph_cache.completed_traces() - blocked_trace_ids
+
+    graphes = graph_cache.get_all_graphes(closed_trace_ids)
+    if sampler is not None:
+        graphes.sort(key=lambda graph: trace_hash(graph.graph["trace_id"]))
+
+    with BackgroundWriter(workers=upload_workers, progress=False) as writer:
+        listings = [
+            store_trace_graph(graph, state.records, writer, sampler)
+            for graph in graphes]
+
+    config.metadata_index.flush()
+
+    completed = stored_traces_of(graph_cache, graphes, {
+        str(record.record_id): position for position, record in records})
+    outbound_requests = state.request_cache.outbound_requests_of(
+        graph_cache.trace_members(closed_trace_ids))
+
+    open_node_ids = graph_cache.retained(
+        graph_cache.unique_trace_ids - closed_trace_ids).node_ids
+    open_records = [
+        (position, record) for position, record in records
+        if str(record.record_id) in open_node_ids]
+
+    return (
+        [listing for listing in listings if listing],
+        completed,
+        outbound_requests,
+        open_records,
+        sampler.dropped_hashes if sampler is not None else {},
+        stats.snapshot())
 
 
 def process_record(
@@ -263,52 +2121,45 @@ def process_record(
     if trace_ctx is None:
         logger.error(
             "Cannot process record without tracing context")
+        stats.count("records_without_context")
         return
 
-    logger.info(
-        f"Processing Record ID {trace_ctx.record_id} - Context: {trace_ctx}")
-
-    graph: Type[nx.Graph] = graph_cache.create_or_return_graph(
-        trace_id=str(trace_ctx.trace_id))
-
-    graph.add_node(str(record.record_id), **dict(
-        type=FUNCTION_NODE,
-        label=record.node_label,
-        total_execution_time=func_ctx.total_execution_time,
-        handler_execution_time=func_ctx.handler_execution_time,
-        invoked_at=func_ctx.invoked_at,
-        finished_at=func_ctx.finished_at
-    ))
-
-    if trace_ctx.parent_id is not None:
-        attr = {
-            "type": TriggerSynchronicity.SYNC.value,
-            "latency": 1,
-            "label": "N/A ms"
-        }
-
-        if str(trace_ctx.parent_id) in graph:
-            parent_node = graph.nodes[str(trace_ctx.parent_id)]
-            latency = seconds_to_ms(
-                time_delta_in_sec(
-                    func_ctx.invoked_at,
-                    parent_node["finished_at"]))
-            attr["latency"] = latency
-            attr["label"] = print_ms(latency)
-
-        graph.add_edge(str(trace_ctx.parent_id), str(record.record_id), **attr)
-
-    if record.outbound_contexts:
-        resolve_outbound_contexts(record, graph, graph_cache, request_cache)
+    logger.debug(
+        "Processing Record ID %s - Context: %s", trace_ctx.record_id, trace_ctx)
 
-    if in_ctx and in_ctx.resolvable:
-        resolve_inbound_context(
-            record, graph, graph_cache, request_cache)
+    trace_id = str(trace_ctx.trace_id)
+    record_id = str(record.record_id)
+
+    with stats.timer("graph_build"):
+        graph_cache.add_trace(trace_id)
+        graph_cache.add_function_node(
+            trace_id,
+            record_id,
+            label=record.node_label,
+            total_execution_time=func_ctx.total_execution_time,
+            handler_execution_time=func_ctx.handler_execution_time,
+            invoked_at=func_ctx.invoked_at,
+            finished_at=func_ctx.finished_at)
+
+        if trace_ctx.parent_id is not None:
+            parent_id = str(trace_ctx.parent_id)
+
+            graph_cache.add_edge(
+                parent_id,
+                record_id,
+                TriggerSynchronicity.SYNC.value,
+                graph_cache.latency_after(parent_id, func_ctx.invoked_at))
+
+    with stats.timer("resolution"):
+        if record.outbound_contexts:
+            resolve_outbound_contexts(record, graph_cache, request_cache)
+
+        if in_ctx and in_ctx.resolvable:
+            resolve_inbound_context(record, graph_cache, request_cache)
 
 
 def resolve_inbound_context(
     record: Type[TraceRecord],
-    trace_graph: Type[nx.Graph],
     graph_cache: Type[GraphCache],
     request_cache: Type[RequestContextCache]
 ) -> None:
@@ -319,147 +2170,232 @@ def resolve_inbound_context(
         return
 
     identifier_str = record.inbound_context.identifier_string
-    outbound_request = request_cache.find_outbound_request_by_inbound_identifier(
+    outbound_requests = request_cache.find_outbound_requests_by_inbound_identifier(
         identifier_str)
+    stats.count("inbound_requests")
 
-    if outbound_request:
-        logger.info(
-            f"Found Outbound request for Inbound identifier {identifier_str}")
-        parent_trace_ctx, parent_out_ctx = outbound_request
-        parent_graph = graph_cache.get_graph(str(parent_trace_ctx.trace_id))
-
-        if parent_graph:
-            logger.info(
-                f"Found Parent graph {parent_graph} for parent tracing context {parent_trace_ctx.trace_id}")
-
-            if parent_graph.has_edge(
-                    str(parent_trace_ctx.record_id), str(record.record_id)):
-                parent_graph.remove_edge(
-                    str(parent_trace_ctx.record_id), str(record.record_id))
-
-            if trace_graph.has_edge(
-                    str(parent_trace_ctx.record_id), str(record.record_id)):
-                trace_graph.remove_edge(
-                    str(parent_trace_ctx.record_id), str(record.record_id))
-
-            record.inbound_context.trigger_finished_at = parent_out_ctx.finished_at
-
-            merge_graphes(graph_cache, parent_graph, trace_graph)
-
-            service_node_id = str(uuid4())
-
-            parent_graph.add_node(
-                service_node_id,
-                **dict(
-                    type=SERVICE_NODE,
-                    total_execution_time=parent_out_ctx.overhead_time +
-                    record.inbound_context.trigger_overhead_time,
-                    label="{out_context}\n{in_context}".format(
-                        out_context=parent_out_ctx.short_str,
-                        in_context=record.inbound_context.short_str)))
-            parent_graph.add_edge(str(parent_trace_ctx.record_id),
-                                  service_node_id,
-                                  **dict(type=parent_out_ctx.trigger_synchronicity.value,
-                                         latency=parent_out_ctx.overhead_time,
-                                         label="{:.2f} ms".format(parent_out_ctx.overhead_time)))
-            parent_graph.add_edge(service_node_id, str(record.record_id), **dict(
-                type=record.inbound_context.trigger_synchronicity.value,
-                latency=record.inbound_context.trigger_overhead_time,
-                label="{:.2f} ms".format(record.inbound_context.trigger_overhead_time)
-            ))
-        else:
-            logger.info(
-                f"Cannot find parent trace for parent trace ID {parent_trace_ctx.trace_id}")
-            logger.info("Store Inbound request for later resolving.")
+    parent_request = latest_request_before(
+        [
+            request for request in outbound_requests
+            if graph_cache.has_trace(request.trace_id)],
+        record.function_context.invoked_at)
+
+    if parent_request:
+        logger.debug(
+            "Found Outbound request with parent trace for Inbound identifier %s",
+            identifier_str)
 
-            request_cache.cache_inbound_request(
-                record.inbound_context, record.tracing_context)
+        resolved = parent_request.resolved
+        duplicate = request_cache.deliver_outbound_request(
+            identifier_str,
+            outbound_requests,
+            parent_request,
+            record.function_context.function_key)
+
+        attach_request(
+            graph_cache,
+            parent_request.tracing_context,
+            parent_request.context,
+            record.tracing_context,
+            record.inbound_context,
+            duplicate)
+
+        stats.count("inbound_hits")
+        if not resolved:
+            graph_cache.remove_open_request(parent_request.trace_id)
     else:
-        logger.info(
-            f"Cannot find Outbound request for Inbound identifier {identifier_str}")
-        logger.info("Store Inbound request for later resolving.")
+        logger.debug(
+            "Cannot find Outbound request with parent trace for Inbound identifier %s",
+            identifier_str)
+        logger.debug("Store Inbound request for later resolving.")
 
         request_cache.cache_inbound_request(
-            record.inbound_context, record.tracing_context)
+            record.inbound_context,
+            record.function_context,
+            record.tracing_context)
+        graph_cache.add_open_request(str(record.tracing_context.trace_id))
 
 
 def resolve_outbound_contexts(
     record: Type[TraceRecord],
-    trace_graph: Type[nx.Graph],
     graph_cache: Type[GraphCache],
     request_cache: Type[RequestContextCache]
 ) -> None:
     """
-    Finds a child trace for all outbound contexts
+    Finds all child traces for all outbound contexts
     """
     if not record.outbound_contexts or len(record.outbound_contexts) == 0:
         return
 
+    trace_id = str(record.tracing_context.trace_id)
+
     for out_ctx in record.outbound_contexts:
         identifier_str = out_ctx.identifier_string
-        inbound_request = request_cache.find_inbound_request_by_outbound_identifier(
+        inbound_requests = request_cache.find_inbound_requests_by_outbound_identifier(
             identifier_str)
-        if inbound_request:
-            logger.info(
-                f"Found Inbound request for Outbound identifier {identifier_str}")
-            child_context, child_in_ctx = inbound_request
-            child_graph = graph_cache.get_graph(str(child_context.trace_id))
-
-            if child_graph:
-                logger.info(
-                    f"Found Child trace {child_graph} for child tracing context {child_context.trace_id}")
-
-                if child_graph.has_edge(str(record.record_id), str(
-                        child_context.record_id)):
-                    child_graph.remove_edge(
-                        str(record.record_id), str(child_context.record_id))
-
-                if trace_graph.has_edge(str(record.record_id), str(
-                        child_context.record_id)):
-                    trace_graph.remove_edge(
-                        str(record.record_id), str(child_context.record_id))
-
-                child_in_ctx.trigger_finished_at = out_ctx.finished_at
-
-                merge_graphes(graph_cache, trace_graph, child_graph)
-
-                service_node_id = str(uuid4())
-
-                trace_graph.add_node(
-                    service_node_id,
-                    **dict(
-                        type=SERVICE_NODE,
-                        total_execution_time=out_ctx.overhead_time +
-                        child_in_ctx.trigger_overhead_time,
-                        label="{out_context}\n{in_context}".format(
-                            out_context=out_ctx.short_str,
-                            in_context=child_in_ctx.short_str)))
-
-                trace_graph.add_edge(str(record.record_id),
-                                     service_node_id,
-                                     **dict(type=out_ctx.trigger_synchronicity.value,
-                                            latency=out_ctx.overhead_time,
-                                            label="{:.2f} ms".format(out_ctx.overhead_time)))
-                trace_graph.add_edge(service_node_id, str(child_context.record_id), **dict(
-                    type=child_in_ctx.trigger_synchronicity.value,
-                    latency=child_in_ctx.trigger_overhead_time,
-                    label="{:.2f} ms".format(child_in_ctx.trigger_overhead_time)))
-            else:
-                logger.info(
-                    f"Cannot find child trace for child trace ID {child_context.trace_id}")
-                logger.info(
-                    "Store Outbound request for later resolving.")
-
-                request_cache.cache_outbound_request(
-                    out_ctx, record.tracing_context)
+        stats.count("outbound_requests")
+
+        child_requests = sorted(
+            [
+                request for request in inbound_requests
+                if graph_cache.has_trace(request.trace_id)],
+            key=lambda request: request.event_time)
+
+        delivered_to: Set[str] = set()
+        for child_request in child_requests:
+            logger.debug(
+                "Found Inbound request with child trace %s for Outbound identifier %s",
+                child_request.trace_id, identifier_str)
+
+            attach_request(
+                graph_cache,
+                record.tracing_context,
+                out_ctx,
+                child_request.tracing_context,
+                child_request.context,
+                child_request.function_key in delivered_to)
+
+            delivered_to.add(child_request.function_key)
+            graph_cache.remove_open_request(child_request.trace_id)
+
+        if child_requests:
+            stats.count("outbound_hits")
+            request_cache.remove_inbound_requests(
+                identifier_str, inbound_requests, child_requests)
         else:
-            logger.info(
-                f"Cannot find Inbound request for Outbound identifier {identifier_str}")
-            logger.info(
+            logger.debug(
+                "Cannot find Inbound request with child trace for Outbound identifier %s",
+                identifier_str)
+            logger.debug(
                 "Store Outbound request for later resolving.")
 
-            request_cache.cache_outbound_request(
-                out_ctx, record.tracing_context)
+            graph_cache.add_open_request(trace_id)
+
+        # Outbound requests are kept to resolve further deliveries
+        request_cache.cache_outbound_request(
+            out_ctx,
+            record.function_context,
+            record.tracing_context,
+            delivered_to)
+
+
+def resolve_by_time_window(
+    graph_cache: Type[GraphCache],
+    request_cache: Type[RequestContextCache],
+    window: float,
+    before: float = None
+) -> int:
+    """
+    Matches unresolved inbound requests invoked before the timestamp to the
+    nearest outbound request of the same service and resource that ended at
+    most window seconds earlier.
+
+    This is a fallback for triggers that do not pass on the full identifier.
+    It must only run once the exact match of an inbound request cannot be
+    processed anymore, e.g. at the end of a run.
+
+    Returns the number of matched requests.
+    """
+    matches = 0
+    for _, identifier_str, record_id in request_cache.unresolved_inbound_requests(before):
+        # Earlier matches of this loop may have resolved the request
+        found = request_cache.inbound_request(identifier_str, record_id)
+        if found is None:
+            continue
+
+        inbound_requests, request = found
+        if not graph_cache.has_trace(request.trace_id):
+            continue
+
+        match = request_cache.nearest_outbound_request(
+            request,
+            window,
+            lambda outbound_request: (
+                outbound_request.trace_id != request.trace_id and
+                graph_cache.has_trace(outbound_request.trace_id)))
+        if match is None:
+            continue
+
+        outbound_identifier, outbound_requests, parent_request = match
+        logger.debug(
+            "Matched Inbound identifier %s to Outbound identifier %s by time",
+            identifier_str, outbound_identifier)
+
+        duplicate = request_cache.deliver_outbound_request(
+            outbound_identifier,
+            outbound_requests,
+            parent_request,
+            request.function_key)
+
+        attach_request(
+            graph_cache,
+            parent_request.tracing_context,
+            parent_request.context,
+            request.tracing_context,
+            request.context,
+            duplicate,
+            inferred=True)
+
+        request_cache.remove_inbound_requests(identifier_str, inbound_requests, [request])
+        graph_cache.remove_open_request(request.trace_id)
+        graph_cache.remove_open_request(parent_request.trace_id)
+        matches += 1
+
+    stats.count("window_matches", matches)
+    return matches
+
+
+def attach_request(
+    graph_cache: Type[GraphCache],
+    parent_context: Type[TracingContext],
+    out_ctx: Type[OutboundContext],
+    child_context: Type[TracingContext],
+    in_ctx: Type[InboundContext],
+    duplicate: bool = False,
+    inferred: bool = False
+) -> None:
+    """
+    Merges the child trace into the parent trace and links the records
+    by a service node for the request.
+
+    Inferred marks the edges of requests that were matched by time.
+    """
+    parent_trace_id = str(parent_context.trace_id)
+    parent_record_id = str(parent_context.record_id)
+    child_record_id = str(child_context.record_id)
+
+    graph_cache.remove_edge(parent_record_id, child_record_id)
+
+    in_ctx.trigger_finished_at = out_ctx.finished_at
+
+    graph_cache.merge_traces(parent_trace_id, str(child_context.trace_id))
+
+    if duplicate:
+        logger.debug("Duplicate delivery of %s", in_ctx.identifier_string)
+        stats.count("duplicate_deliveries")
+
+    service_node_id = service_node_uuid(parent_record_id, child_record_id)
+
+    graph_cache.add_service_node(
+        parent_trace_id,
+        service_node_id,
+        label="{out_context}\n{in_context}".format(
+            out_context=out_ctx.short_str,
+            in_context=in_ctx.short_str),
+        total_execution_time=out_ctx.overhead_time + in_ctx.trigger_overhead_time,
+        duplicate=duplicate)
+    graph_cache.add_edge(
+        parent_record_id,
+        service_node_id,
+        out_ctx.trigger_synchronicity.value,
+        out_ctx.overhead_time,
+        inferred)
+    graph_cache.add_edge(
+        service_node_id,
+        child_record_id,
+        in_ctx.trigger_synchronicity.value,
+        in_ctx.trigger_overhead_time,
+        inferred)
 
 
 """
@@ -467,98 +2403,235 @@ Helpers
 """
 
 
-def merge_graphes(
-    graph_cache: Type[GraphCache],
-    parent_graph: Type[nx.DiGraph],
-    child_graph: Type[nx.DiGraph]
-) -> Type[nx.DiGraph]:
+def service_node_uuid(source_record_id: str, target_record_id: str) -> str:
     """
-    Merges child trace in parent trace.
+    Returns a deterministic ID for the service node between two records.
     """
-    parent_trace_id = parent_graph.graph["trace_id"]
-    child_trace_id = child_graph.graph["trace_id"]
+    return str(uuid5(UUID(source_record_id), target_record_id))
+
 
-    # Merge child in parent
-    parent_graph.add_nodes_from(child_graph.nodes(data=True))
-    parent_graph.add_edges_from(child_graph.edges(data=True))
+def resource_keys(context: Type[InboundContext | OutboundContext]) -> List[tuple]:
+    """
+    Returns the keys of the service and resource of the request, followed by
+    the key of the service only if the request names a resource.
+    """
+    service_key = (context.provider, context.service)
+    resource = tuple(sorted(
+        (key, str(value)) for key, value in context.identifier.items()
+        if key in RESOURCE_KEYS))
 
-    # Create forwarding
-    child_graph.graph["parent_trace_id"] = parent_trace_id
+    if not resource:
+        return [service_key]
 
-    # Store child graph in cache but forget as unique graph
-    graph_cache.flush_trace(child_trace_id)
+    return [service_key + resource, service_key]
 
 
-def set_normalized_edge_weights(graph):
+def resource_key(key: tuple) -> str:
     """
-    Calculates normalized edges weights.
+    Returns the key of a service or resource in the time indexes.
     """
-    min_size, max_size = EDGE_SIZE_LIMIT
+    return repr(key)
+
+
+def time_entries(requests: List[CachedRequest], inbound: bool) -> List[TimeEntry]:
+    """
+    Returns the time index entries of the unresolved requests: inbound
+    requests by invocation under their resource, outbound requests by end
+    of the request under their resource and service.
+    """
+    entries = []
+    for request in requests:
+        if request.resolved:
+            continue
+
+        context, record_id = request.context, str(request.tracing_context.record_id)
+        if inbound:
+            time = context.invoked_at.timestamp() if context.invoked_at else request.event_time
+            entries.append((resource_key(resource_keys(context)[0]), time, record_id))
+            continue
+
+        time = context.finished_at.timestamp() if context.finished_at else request.event_time
+        entries.extend(
+            (resource_key(key), time, record_id) for key in resource_keys(context))
+
+    return entries
+
+
+def compatible_identifiers(
+    context: Type[InboundContext | OutboundContext],
+    other_context: Type[InboundContext | OutboundContext]
+) -> bool:
+    """
+    Returns True if all identifier attributes both requests have are equal.
+    """
+    identifier, other_identifier = context.identifier, other_context.identifier
+    return all(
+        str(identifier[key]) == str(other_identifier[key])
+        for key in identifier.keys() & other_identifier.keys())
+
+
+def latest_request_before(
+    requests: List[CachedRequest],
+    date: datetime
+) -> CachedRequest:
+    """
+    Returns the latest request sent before date, or else the earliest request.
+    """
+    if len(requests) <= 1:
+        return requests[0] if requests else None
+
+    timestamp = date.timestamp()
+    earlier = [request for request in requests if request.event_time <= timestamp]
+    if earlier:
+        return max(earlier, key=lambda request: request.event_time)
+
+    return min(requests, key=lambda request: request.event_time)
 
-    latencies = nx.get_edge_attributes(graph, "latency")
-    if len(latencies) == 0:
-        return
 
-    max_latency = max(latencies.values())
+def graph_sort_key(graph: Type[nx.DiGraph]) -> tuple:
+    """
+    Sort key for graphes: Earliest invocation, then trace ID.
+    """
+    invocations = [
+        invoked_at for invoked_at in nx.get_node_attributes(
+            graph, "invoked_at").values() if invoked_at is not None]
+    if invocations:
+        return (0, min(invocations), graph.graph["trace_id"])
 
-    weights = {k: max(min_size, max_size * v * (1.0 / max_latency))
-               for k, v in latencies.items()}
+    return (1, graph.graph["trace_id"])
 
-    nx.set_edge_attributes(graph, weights, "weight")
+
+def _float(value: float) -> float:
+    """
+    Converts an optional number to float. None becomes NaN.
+    """
+    return NAN if value is None else float(value)
 
 
-def set_normalized_node_weights(graph):
+def _optional(value: float) -> float:
     """
-    Calculates normalized node weights.
+    Converts NaN back to None.
     """
-    min_size, max_size = NODE_SIZE_LIMIT
+    return None if isnan(value) else value
+
 
-    execution_times = nx.get_node_attributes(graph, "total_execution_time")
-    if len(execution_times) == 0:
+def mark_critical_path(graph, order: List[str]) -> None:
+    """
+    Marks the critical path of the trace: the chain of nodes that ends last.
+
+    For each node in topological order, the start time (ms since start of
+    the trace) is the latest start over all its predecessors: their end
+    time plus the edge latency, but not before their start. Sync latencies
+    are relative to the end of the parent, so sync children start within
+    their parent. The end time is the start plus the total execution time.
+    Edges to and from service nodes are not added, as the service node
+    total already contains their latencies.
+
+    Nodes and edges on the path get critical=True, and nodes get the time
+    from their start to the start of the next node on the path, or to their
+    end, as critical_time. The path and its duration are stored as graph
+    attributes.
+    """
+    starts: Dict[str, float] = {}
+    ends: Dict[str, float] = {}
+    predecessors: Dict[str, str] = {}
+    for node in order:
+        start, predecessor = 0.0, None
+        for parent in graph.predecessors(node):
+            parent_start = max(
+                starts[parent], ends[parent] + _critical_latency(graph, parent, node))
+            if predecessor is None or parent_start > start:
+                start, predecessor = parent_start, parent
+
+        starts[node] = start
+        ends[node] = start + (graph.nodes[node].get("total_execution_time") or 0.0)
+        predecessors[node] = predecessor
+
+    if not ends:
         return
 
-    max_time = max(execution_times.values())
+    path = [max(order, key=ends.get)]
+    while predecessors[path[-1]] is not None:
+        path.append(predecessors[path[-1]])
+    path.reverse()
 
-    weights = {k: max(min_size, max_size * v * (1.0 / max_time))
-               for k, v in execution_times.items()}
+    for node, successor in zip(path, path[1:] + [None]):
+        until = ends[node] if successor is None else starts[successor]
+        graph.nodes[node]["critical"] = True
+        graph.nodes[node]["critical_time"] = max(0.0, until - starts[node])
+        if successor is not None:
+            graph.edges[node, successor]["critical"] = True
 
-    nx.set_node_attributes(graph, weights, "weight")
+    graph.graph["critical_path"] = path
+    graph.graph["critical_path_duration"] = ends[path[-1]]
+
+
+def _critical_latency(graph, source: str, target: str) -> float:
+    if SERVICE_NODE in (graph.nodes[source].get("type"), graph.nodes[target].get("type")):
+        return 0.0
+
+    return graph.edges[source, target].get("latency") or 0.0
 
 
 def normalized_graph_weights(graph):
     """
     Calculates normalized weights.
+
+    Node sizes and edge weights are scaled by the longest execution time or
+    latency of the graph, edges of unknown latency get the minimal weight.
+    Node borders show the share of profiler time.
     """
     min_node, max_node = NODE_SIZE_LIMIT
     min_edge, max_edge = EDGE_SIZE_LIMIT
 
-    execution_times = nx.get_node_attributes(graph, "total_execution_time")
-    handler_times = nx.get_node_attributes(graph, "handler_execution_time")
+    node_data, total_times, handler_times = [], [], []
+    for attributes in graph.nodes.values():
+        total_time = attributes.get("total_execution_time")
+        if total_time is None:
+            continue
+
+        handler_time = attributes.get("handler_execution_time")
+        if handler_time is None:
+            handler_time = total_time
 
-    latencies = nx.get_edge_attributes(graph, "latency")
+        node_data.append(attributes)
+        total_times.append(total_time)
+        handler_times.append(handler_time)
 
-    max_exe_time = max(execution_times.values(), default=float('-inf'))
-    max_latencies = max(latencies.values(), default=float('-inf'))
-    max_time = max(max_exe_time, max_latencies)
+    edge_data, latencies = [], []
+    for _, _, attributes in graph.edges(data=True):
+        latency = attributes.get("latency")
+        if latency is None:
+            attributes["weight"] = min_edge
+            continue
 
-    edge_weights = {k: max(min_edge, max_edge * v * (1.0 / max_time))
-                    for k, v in latencies.items()}
+        edge_data.append(attributes)
+        latencies.append(latency)
 
-    node_size = {}
-    node_borders = {}
-    for node, tot_time in execution_times.items():
-        handler_time = handler_times.get(node, tot_time)
-        profiler_time = tot_time - handler_time
+    total_times = np.array(total_times, dtype=float)
+    handler_times = np.array(handler_times, dtype=float)
+    latencies = np.array(latencies, dtype=float)
 
-        handler_frac = handler_time / tot_time
-        profiler_fra = profiler_time / tot_time
+    max_time = max(
+        total_times.max(initial=NEG_INF),
+        latencies.max(initial=NEG_INF))
+    scale = 1.0 / max_time if max_time > 0 else 0.0
 
-        total_weight = max(min_node, max_node * tot_time * (1.0 / max_time))
+    edge_weights = np.maximum(min_edge, max_edge * latencies * scale)
 
-        node_borders[node] = profiler_fra * total_weight
-        node_size[node] = handler_frac * total_weight + node_borders[node]
+    node_sizes = np.maximum(min_node, max_node * total_times * scale)
+    profiler_fractions = np.divide(
+        total_times - handler_times,
+        total_times,
+        out=np.zeros_like(total_times),
+        where=total_times != 0)
+    node_borders = profiler_fractions * node_sizes
 
-    nx.set_edge_attributes(graph, edge_weights, "weight")
+    for attributes, weight in zip(edge_data, edge_weights.tolist()):
+        attributes["weight"] = weight
 
-    nx.set_node_attributes(graph, node_size, "size")
-    nx.set_node_attributes(graph, node_borders, "border")
+    for attributes, size, border in zip(
+        node_data, node_sizes.tolist(), node_borders.tolist()
+    ):
+        attributes["size"] = size
+        attributes["border"] = border
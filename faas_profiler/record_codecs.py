@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encodings of stored objects
+
+An object is serialized as JSON or MessagePack and optionally compressed
+with gzip or zstd. The codec is named after the file suffix, e.g. "json",
+"json.gz" or "msgpack.zst". Objects without a known suffix are decoded by
+their leading bytes.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+
+from os.path import basename
+from typing import Any, Callable, Dict, List, Tuple
+
+JSON_CODEC = "json"
+DEFAULT_CODEC = JSON_CODEC
+
+SERIALIZATIONS = ["json", "msgpack"]
+COMPRESSIONS = ["", "gz", "zst"]
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+
+class CodecError(ValueError):
+    pass
+
+
+"""
+Serialization
+"""
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, default=str).encode()
+
+
+def _json_loads(payload: bytes) -> Any:
+    return json.loads(payload)
+
+
+def _msgpack_dumps(data: Any) -> bytes:
+    import msgpack
+
+    return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+def _msgpack_loads(payload: bytes) -> Any:
+    import msgpack
+
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+SERIALIZERS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (_json_dumps, _json_loads),
+    "msgpack": (_msgpack_dumps, _msgpack_loads)
+}
+
+"""
+Compression
+"""
+
+
+def _identity(payload: bytes) -> bytes:
+    return payload
+
+
+def _gzip_compress(payload: bytes) -> bytes:
+    return gzip.compress(payload, compresslevel=GZIP_LEVEL)
+
+
+def _zstd_compress(payload: bytes) -> bytes:
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+
+
+def _zstd_decompress(payload: bytes) -> bytes:
+    import zstandard
+
+    return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+
+
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "": (_identity, _identity),
+    "gz": (_gzip_compress, gzip.decompress),
+    "zst": (_zstd_compress, _zstd_decompress)
+}
+
+# All codecs, JSON first
+CODECS: List[str] = [
+    ".".join(filter(None, [serialization, compression]))
+    for serialization in SERIALIZATIONS
+    for compression in COMPRESSIONS]
+
+
+"""
+Codecs
+"""
+
+
+def check_codec(codec: str) -> None:
+    """
+    Raises a CodecError if the codec is unknown.
+    """
+    if codec not in CODECS:
+        raise CodecError(
+            f"Unknown codec {codec}. Use one of {', '.join(CODECS)}")
+
+
+def _parts(codec: str) -> Tuple[str, str]:
+    check_codec(codec)
+    serialization, _, compression = codec.partition(".")
+    return serialization, compression
+
+
+def encode(data: Any, codec: str = DEFAULT_CODEC) -> bytes:
+    """
+    Serializes and compresses data with the codec.
+    """
+    serialization, compression = _parts(codec)
+    dumps, _ = SERIALIZERS[serialization]
+    compress, _ = COMPRESSORS[compression]
+
+    return compress(dumps(data))
+
+
+def decode(payload: bytes, codec: str = None) -> Any:
+    """
+    Decompresses and deserializes the payload. Without codec, the codec
+    is detected from the leading bytes of the payload.
+    """
+    if codec is None:
+        codec = detect_codec(payload)
+
+    serialization, compression = _parts(codec)
+    _, loads = SERIALIZERS[serialization]
+    _, decompress = COMPRESSORS[compression]
+
+    return loads(decompress(payload))
+
+
+def detect_codec(payload: bytes) -> str:
+    """
+    Returns the codec of the payload by its leading bytes.
+    """
+    compression = ""
+    if payload.startswith(GZIP_MAGIC):
+        compression, payload = "gz", gzip.decompress(payload)
+    elif payload.startswith(ZSTD_MAGIC):
+        compression, payload = "zst", _zstd_decompress(payload)
+
+    serialization = "json" if payload.lstrip()[:1] in (b"{", b"[", b'"') else "msgpack"
+    return ".".join(filter(None, [serialization, compression]))
+
+
+def codec_of(key: str) -> str:
+    """
+    Returns the codec of the key by its suffix, or None.
+    """
+    _, _, suffix = basename(key).partition(".")
+    return suffix if suffix in CODECS else None
+
+
+def stem_of(key: str) -> str:
+    """
+    Returns the key without codec suffix.
+    """
+    codec = codec_of(key)
+    if codec is None:
+        return key
+
+    return key[:-len(codec) - 1]
+
+
+def key_with_codec(stem: str, codec: str) -> str:
+    return f"{stem}.{codec}"
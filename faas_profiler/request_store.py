@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Size-bounded store of unresolved requests
+
+Keeps the most recent requests in memory and spills older ones to an
+SQLite file in the temporary directory. Lookups are answered from both.
+
+Entries can be indexed by time under keys, e.g. the resource of a request.
+Time index entries are spilled, expired and removed with their entry, so
+the index shares the bound of the store.
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import weakref
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from tempfile import mkstemp
+from typing import Any, Dict, Iterator, List, Sequence, Set, Tuple
+
+from faas_profiler.config import config
+
+DEFAULT_MAX_ENTRIES = 100_000
+# Share of max_entries kept in memory after spilling
+SPILL_TARGET = 0.75
+
+RequestEntry = Tuple[Any, Tuple[str, ...], float]
+# Time index entry of a request: (key, time, record ID)
+TimeEntry = Tuple[str, float, str]
+# Time index entry of a key: (time, identifier, record ID)
+TimeIndexEntry = Tuple[float, str, str]
+
+# Sorts after all identifiers of the same time
+MAX_IDENTIFIER = "\uffff"
+
+REQUESTS_TABLE = "requests"
+TIMES_TABLE = "times"
+
+
+class RequestStore:
+    """
+    Dict-like store mapping request identifiers to (value, trace_ids, event_time).
+
+    trace_ids are the traces an entry keeps open, event_time is the time
+    of its latest request. Each entry can add time index entries (see
+    time_entries), which are replaced with the entry.
+
+    At most max_entries entries are kept in memory. When the store grows
+    beyond that, the oldest inserted entries are moved to disk.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+
+        self._memory: Dict[str, RequestEntry] = {}
+        self._memory_times: Dict[str, Tuple[TimeEntry, ...]] = {}
+        self._times: Dict[str, List[TimeIndexEntry]] = {}
+        self._number_of_spilled = 0
+        self._number_of_open = 0
+        self._path: str = None
+        self._connection: sqlite3.Connection = None
+
+    def __len__(self) -> int:
+        return len(self._memory) + self._number_of_spilled
+
+    def __contains__(self, identifier: str) -> bool:
+        return self.get(identifier) is not None
+
+    @property
+    def number_of_spilled(self) -> int:
+        return self._number_of_spilled
+
+    @property
+    def number_of_open(self) -> int:
+        """
+        Returns the number of trace IDs of all entries.
+        """
+        return self._number_of_open
+
+    def get(self, identifier: str) -> RequestEntry:
+        """
+        Returns the entry of the identifier or None.
+        """
+        entry = self._memory.get(identifier)
+        if entry is not None or not self._number_of_spilled:
+            return entry
+
+        row = self._connection.execute(
+            "SELECT payload, trace_ids, event_time FROM requests WHERE identifier = ?",
+            (identifier,)).fetchone()
+        if row is None:
+            return None
+
+        payload, trace_ids, event_time = row
+        return pickle.loads(payload), _split(trace_ids), event_time
+
+    def put(
+        self,
+        identifier: str,
+        value: Any,
+        trace_ids: Tuple[str, ...],
+        event_time: float,
+        times: Sequence[TimeEntry] = ()
+    ) -> None:
+        """
+        Stores the entry with its time index entries and spills old entries
+        if the store is full.
+        """
+        entry = self._memory.get(identifier)
+        if entry is None:
+            self.pop(identifier)
+        else:
+            self._number_of_open -= len(entry[1])
+            self._remove_times(identifier)
+
+        self._memory[identifier] = (value, tuple(trace_ids), event_time)
+        self._number_of_open += len(trace_ids)
+        self._add_times(identifier, tuple(times))
+        if len(self._memory) > self.max_entries:
+            self.spill(len(self._memory) - int(self.max_entries * SPILL_TARGET))
+
+    def pop(self, identifier: str) -> RequestEntry:
+        """
+        Removes and returns the entry of the identifier or None.
+        """
+        entry = self._memory.pop(identifier, None)
+        if entry is not None:
+            self._remove_times(identifier)
+        elif self._number_of_spilled:
+            entry = self.get(identifier)
+            if entry is not None:
+                self._connection.execute(
+                    "DELETE FROM requests WHERE identifier = ?", (identifier,))
+                self._connection.execute(
+                    "DELETE FROM times WHERE identifier = ?", (identifier,))
+                self._number_of_spilled -= 1
+
+        if entry is not None:
+            self._number_of_open -= len(entry[1])
+
+        return entry
+
+    def identifiers(self) -> List[str]:
+        """
+        Returns the identifiers of all entries.
+        """
+        identifiers = list(self._memory)
+        if self._number_of_spilled:
+            identifiers.extend(
+                identifier for (identifier,) in self._connection.execute(
+                    "SELECT identifier FROM requests"))
+
+        return identifiers
+
+    def spill(self, number_of_entries: int) -> None:
+        """
+        Moves the oldest number_of_entries entries from memory to disk.
+        """
+        identifiers = list(islice(self._memory, number_of_entries))
+        rows, time_rows = [], []
+        for identifier in identifiers:
+            value, trace_ids, event_time = self._memory.pop(identifier)
+            rows.append((
+                identifier,
+                _join(trace_ids),
+                event_time,
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+            time_rows.extend(
+                (key, time, identifier, record_id)
+                for key, time, record_id in self._remove_times(identifier))
+
+        self._write_rows(rows, time_rows)
+
+    def expire(self, threshold: float) -> List[str]:
+        """
+        Removes all entries with an event time before threshold.
+
+        Returns the trace IDs of the removed entries.
+        """
+        expired = [
+            identifier for identifier, (_, _, event_time) in self._memory.items()
+            if event_time < threshold]
+
+        trace_ids = []
+        for identifier in expired:
+            trace_ids.extend(self._memory.pop(identifier)[1])
+            self._remove_times(identifier)
+
+        if self._number_of_spilled:
+            rows = self._connection.execute(
+                "SELECT trace_ids FROM requests WHERE event_time < ?",
+                (threshold,)).fetchall()
+            self._connection.execute(
+                "DELETE FROM times WHERE identifier IN "
+                "(SELECT identifier FROM requests WHERE event_time < ?)", (threshold,))
+            self._connection.execute(
+                "DELETE FROM requests WHERE event_time < ?", (threshold,))
+            self._number_of_spilled -= len(rows)
+            for (spilled_trace_ids,) in rows:
+                trace_ids.extend(_split(spilled_trace_ids))
+
+        self._number_of_open -= len(trace_ids)
+        return trace_ids
+
+    def trace_ids(self) -> Set[str]:
+        """
+        Returns the trace IDs of all entries.
+        """
+        trace_ids = set()
+        for _, entry_trace_ids, _ in self._memory.values():
+            trace_ids.update(entry_trace_ids)
+
+        if self._number_of_spilled:
+            for (spilled_trace_ids,) in self._connection.execute(
+                "SELECT trace_ids FROM requests"
+            ):
+                trace_ids.update(_split(spilled_trace_ids))
+
+        return trace_ids
+
+    """
+    Time index
+    """
+
+    def time_keys(self) -> List[str]:
+        """
+        Returns all keys of the time index.
+        """
+        keys = set(self._times)
+        if self._number_of_spilled:
+            keys.update(key for (key,) in self._connection.execute(
+                "SELECT DISTINCT key FROM times"))
+
+        return sorted(keys)
+
+    def time_entries(
+        self,
+        key: str,
+        start: float = None,
+        end: float = None
+    ) -> List[TimeIndexEntry]:
+        """
+        Returns the time index entries of the key from start to end
+        (both inclusive), ordered by time.
+        """
+        index = self._times.get(key, [])
+        low = 0 if start is None else bisect_left(index, (start,))
+        high = len(index) if end is None else bisect_right(index, (end, MAX_IDENTIFIER))
+        entries = index[low:high]
+
+        if self._number_of_spilled:
+            entries.extend(self._connection.execute(
+                "SELECT time, identifier, record_id FROM times "
+                "WHERE key = ? AND time >= ? AND time <= ?",
+                (key,
+                 float("-inf") if start is None else start,
+                 float("inf") if end is None else end)))
+            entries.sort()
+
+        return entries
+
+    def _add_times(self, identifier: str, times: Tuple[TimeEntry, ...]) -> None:
+        if not times:
+            return
+
+        self._memory_times[identifier] = times
+        for key, time, record_id in times:
+            insort(self._times.setdefault(key, []), (time, identifier, record_id))
+
+    def _remove_times(self, identifier: str) -> Tuple[TimeEntry, ...]:
+        times = self._memory_times.pop(identifier, ())
+        for key, time, record_id in times:
+            index = self._times[key]
+            del index[bisect_left(index, (time, identifier, record_id))]
+            if not index:
+                del self._times[key]
+
+        return times
+
+    """
+    Spill file
+    """
+
+    def _write_rows(self, rows: List[tuple], time_rows: List[tuple] = []) -> None:
+        if not rows and not time_rows:
+            return
+
+        if self._connection is None:
+            self._open()
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO requests VALUES (?, ?, ?, ?)", rows)
+            self._connection.executemany(
+                "INSERT INTO times VALUES (?, ?, ?, ?)", time_rows)
+
+        self._number_of_spilled += len(rows)
+
+    def _open(self) -> None:
+        fd, self._path = mkstemp(
+            prefix="requests_", suffix=".sqlite", dir=config.temporary_dir)
+        os.close(fd)
+
+        self._connection = sqlite3.connect(self._path)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE requests ("
+            "identifier TEXT PRIMARY KEY, trace_ids TEXT, event_time REAL, payload BLOB)")
+        self._connection.execute(
+            "CREATE INDEX requests_event_time ON requests (event_time)")
+        self._connection.execute(
+            "CREATE TABLE times (key TEXT, time REAL, identifier TEXT, record_id TEXT)")
+        self._connection.execute("CREATE INDEX times_key_time ON times (key, time)")
+        self._connection.execute("CREATE INDEX times_identifier ON times (identifier)")
+
+        weakref.finalize(self, _remove_spill_file, self._connection, self._path)
+
+    """
+    Pickling
+    """
+
+    def __reduce__(self) -> tuple:
+        """
+        Spilled entries are pickled with the store, as the spill file only
+        lives as long as the store. They are streamed from the spill file in
+        batches, which unpickling passes to extend.
+        """
+        return (
+            RequestStore,
+            (self.max_entries,),
+            {
+                "memory": self._memory,
+                "memory_times": self._memory_times,
+                "number_of_open": self._number_of_open},
+            self._spilled_rows())
+
+    def __setstate__(self, state: dict) -> None:
+        self._memory = state["memory"]
+        self._number_of_open = state["number_of_open"]
+        for identifier, times in state["memory_times"].items():
+            self._add_times(identifier, times)
+
+    def _spilled_rows(self) -> Iterator[Tuple[str, tuple]]:
+        if not self._number_of_spilled:
+            return
+
+        for row in self._connection.execute(
+            "SELECT identifier, trace_ids, event_time, payload FROM requests"
+        ):
+            yield REQUESTS_TABLE, row
+
+        for row in self._connection.execute(
+            "SELECT key, time, identifier, record_id FROM times"
+        ):
+            yield TIMES_TABLE, row
+
+    def extend(self, spilled_rows: List[Tuple[str, tuple]]) -> None:
+        """
+        Writes a batch of pickled spilled rows to the spill file.
+        """
+        self._write_rows(
+            [row for table, row in spilled_rows if table == REQUESTS_TABLE],
+            [row for table, row in spilled_rows if table == TIMES_TABLE])
+
+
+def _join(trace_ids: Tuple[str, ...]) -> str:
+    return " ".join(trace_ids)
+
+
+def _split(trace_ids: str) -> Tuple[str, ...]:
+    return tuple(trace_ids.split())
+
+
+def _remove_spill_file(connection: sqlite3.Connection, path: str) -> None:
+    connection.close()
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consistent sampling of traces
+
+Whole traces are sampled by a hash of their trace ID, so a trace is kept
+or dropped the same way in every run and process. Per root function key,
+the traces with the reservoir_size smallest hashes are kept, together
+with all traces whose hash is below probability.
+
+The kept traces of a function key are exactly those with a hash up to its
+threshold: the largest retained hash once traces were dropped from the
+reservoir, otherwise probability (without reservoir) or 1. The number of
+traces of the function key is estimated from the m kept traces as
+(m - 1) / threshold, or m / probability for the fixed threshold.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+
+from typing import Dict, List, Tuple
+
+HASH_RANGE = float(2 ** 64)
+
+
+def trace_hash(trace_id) -> float:
+    """
+    Returns a uniformly distributed hash of the trace ID in [0, 1).
+    """
+    digest = hashlib.blake2b(str(trace_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / HASH_RANGE
+
+
+class TraceSampler:
+    """
+    Samples whole traces per root function key.
+
+    The reservoir of a function key is a max-heap of (-hash, trace ID), so
+    the trace with the largest hash is found in O(log R). Discarded traces
+    are removed from the heap lazily.
+
+    Traces that leave the reservoir because traces with smaller hashes were
+    kept are collected in evicted, as (trace ID, function key), so that they
+    can be removed from their profiles.
+    """
+
+    def __init__(self, reservoir_size: int = 0, probability: float = 0.0) -> None:
+        if reservoir_size < 0:
+            raise ValueError(f"Invalid reservoir size {reservoir_size}")
+        if not 0.0 <= probability <= 1.0:
+            raise ValueError(f"Invalid sampling probability {probability}")
+
+        self.reservoir_size = reservoir_size
+        self.probability = probability
+
+        self.evicted: List[Tuple[str, str]] = []
+
+        self._reservoirs: Dict[str, Dict[str, float]] = {}
+        self._heaps: Dict[str, List[Tuple[float, str]]] = {}
+        self._function_keys: Dict[str, str] = {}
+        self._kept_by_probability: Dict[str, int] = {}
+        self._dropped_hashes: Dict[str, float] = {}
+
+    @property
+    def parameters(self) -> Tuple[int, float]:
+        return self.reservoir_size, self.probability
+
+    def sample(self, trace_id, function_key: str) -> bool:
+        """
+        Returns if the trace of the root function key is kept.
+        The same trace is always sampled the same way.
+        """
+        trace_id = str(trace_id)
+        kept_function_key = self._function_keys.get(trace_id)
+        if kept_function_key == function_key:
+            return True
+        if kept_function_key is not None:
+            self.discard(trace_id)
+
+        hash_value = trace_hash(trace_id)
+        if hash_value < self.probability:
+            self._function_keys[trace_id] = function_key
+            self._kept_by_probability[function_key] = \
+                self._kept_by_probability.get(function_key, 0) + 1
+            return True
+
+        if not self.reservoir_size:
+            return False
+
+        if hash_value >= self._dropped_hashes.get(function_key, 1.0):
+            return False
+
+        reservoir = self._reservoirs.setdefault(function_key, {})
+        heap = self._heaps.setdefault(function_key, [])
+        if len(reservoir) >= self.reservoir_size:
+            largest_hash, largest_id = self._largest(function_key)
+            self._dropped_hashes[function_key] = max(hash_value, largest_hash)
+            if hash_value >= largest_hash:
+                return False
+
+            heapq.heappop(heap)
+            del reservoir[largest_id]
+            del self._function_keys[largest_id]
+            self.evicted.append((largest_id, function_key))
+
+        reservoir[trace_id] = hash_value
+        heapq.heappush(heap, (-hash_value, trace_id))
+        self._function_keys[trace_id] = function_key
+        return True
+
+    def _largest(self, function_key: str) -> Tuple[float, str]:
+        """
+        Returns the largest hash of the reservoir with its trace ID,
+        after popping discarded traces from the top of the heap.
+        """
+        reservoir = self._reservoirs[function_key]
+        heap = self._heaps[function_key]
+        while heap[0][1] not in reservoir:
+            heapq.heappop(heap)
+
+        return -heap[0][0], heap[0][1]
+
+    def discard(self, trace_id) -> None:
+        """
+        Removes the trace from its reservoir, e.g. after it was merged into another trace.
+        """
+        trace_id = str(trace_id)
+        function_key = self._function_keys.pop(trace_id, None)
+        if function_key is None:
+            return
+
+        reservoir = self._reservoirs.get(function_key, {})
+        if reservoir.pop(trace_id, None) is None:
+            self._kept_by_probability[function_key] -= 1
+            return
+
+        heap = self._heaps[function_key]
+        if len(heap) > 2 * len(reservoir) + 16:
+            heap[:] = [(-hash_value, kept_id) for kept_id, hash_value in reservoir.items()]
+            heapq.heapify(heap)
+
+    @property
+    def dropped_hashes(self) -> Dict[str, float]:
+        return dict(self._dropped_hashes)
+
+    def add_dropped_hashes(self, dropped_hashes: Dict[str, float]) -> None:
+        """
+        Adds the hashes dropped by a copy of the sampler, e.g. of a shard.
+        Traces are only kept below the smallest hash dropped by any copy.
+        """
+        for function_key, hash_value in dropped_hashes.items():
+            self._dropped_hashes[function_key] = min(
+                hash_value, self._dropped_hashes.get(function_key, 1.0))
+
+    def pop_evicted(self) -> List[Tuple[str, str]]:
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def threshold(self, function_key: str) -> float:
+        """
+        Returns the hash up to which traces of the function key are kept.
+        """
+        if not self.reservoir_size:
+            return self.probability
+        if function_key not in self._dropped_hashes:
+            return 1.0
+        if not self._reservoirs.get(function_key):
+            return self.probability
+
+        return self._largest(function_key)[0]
+
+    def weight(self, function_key: str) -> float:
+        """
+        Returns the number of traces of the function key each kept trace stands for.
+        """
+        threshold = self.threshold(function_key)
+        if threshold <= 0.0 or threshold >= 1.0:
+            return 1.0
+
+        reservoir = self._reservoirs.get(function_key, {})
+        if not reservoir or function_key not in self._dropped_hashes:
+            return 1.0 / threshold
+
+        kept = len(reservoir) + self._kept_by_probability.get(function_key, 0)
+        return (kept - 1) / (kept * threshold) if kept > 1 else 1.0 / threshold
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Post-processing statistics
+"""
+
+from __future__ import annotations
+
+import json
+
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, Generator, Iterable, Tuple
+
+# Stages of process_records. Times of stages that run in worker threads
+# (fetch, decode, storage_write, column_export) are summed over all threads.
+STAGES = [
+    "listing",
+    "fetch",
+    "decode",
+    "fetch_wait",
+    "graph_build",
+    "resolution",
+    "topological_sort",
+    "critical_path",
+    "graph_encoding",
+    "column_extraction",
+    "storage_write",
+    "column_export",
+    "storage_flush"
+]
+
+
+class Stats:
+    """
+    Thread-safe wall times of processing stages and counters.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears all times and counters and restarts the run clock.
+        """
+        with self._lock:
+            self._times: Dict[str, float] = defaultdict(float)
+            self._calls: Dict[str, int] = defaultdict(int)
+            self._counters: Dict[str, int] = defaultdict(int)
+            self._started_at = perf_counter()
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1) -> None:
+        """
+        Adds seconds to the wall time of the stage.
+        """
+        with self._lock:
+            self._times[stage] += seconds
+            self._calls[stage] += calls
+
+    def count(self, counter: str, value: int = 1) -> None:
+        """
+        Increments the counter by value.
+        """
+        with self._lock:
+            self._counters[counter] += value
+
+    @contextmanager
+    def timer(self, stage: str) -> Generator[None, None, None]:
+        """
+        Measures the wall time of the block as stage.
+        """
+        started_at = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, perf_counter() - started_at)
+
+    def timed(self, stage: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Returns func, measuring the wall time of each call as stage.
+        """
+        @wraps(func)
+        def _timed(*args, **kwargs):
+            with self.timer(stage):
+                return func(*args, **kwargs)
+
+        return _timed
+
+    def timed_iter(self, stage: str, iterable: Iterable[Any]) -> Generator[Any, None, None]:
+        """
+        Yields the items of iterable, measuring the wait for each item as stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            started_at = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_time(stage, perf_counter() - started_at)
+
+            yield item
+
+    def snapshot(self) -> Tuple[dict, dict, dict]:
+        """
+        Returns times, calls and counters, e.g. to merge them in another process.
+        """
+        with self._lock:
+            return dict(self._times), dict(self._calls), dict(self._counters)
+
+    def merge(self, snapshot: Tuple[dict, dict, dict]) -> None:
+        """
+        Adds a snapshot of other stats.
+        """
+        times, calls, counters = snapshot
+        with self._lock:
+            for stage, seconds in times.items():
+                self._times[stage] += seconds
+            for stage, number in calls.items():
+                self._calls[stage] += number
+            for counter, value in counters.items():
+                self._counters[counter] += value
+
+    def summary(self) -> dict:
+        """
+        Returns a JSON serializable summary of the run.
+        """
+        with self._lock:
+            wall_time = perf_counter() - self._started_at
+            counters = dict(self._counters)
+            stages = {
+                stage: {
+                    "seconds": self._times[stage],
+                    "calls": self._calls[stage]}
+                for stage in STAGES + sorted(set(self._times) - set(STAGES))}
+
+        records = counters.get("records", 0)
+        return {
+            "wall_time": wall_time,
+            "records_per_second": records / wall_time if wall_time else 0.0,
+            "inbound_hit_rate": _rate(
+                counters.get("inbound_hits", 0), counters.get("inbound_requests", 0)),
+            "outbound_hit_rate": _rate(
+                counters.get("outbound_hits", 0), counters.get("outbound_requests", 0)),
+            "cache_hit_rate": _rate(
+                counters.get("cache_hits", 0),
+                counters.get("cache_hits", 0) + counters.get("cache_misses", 0)),
+            "stages": stages,
+            "counters": counters}
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the summary as JSON to path.
+        """
+        with open(path, "w") as fp:
+            json.dump(self.summary(), fp, indent=2)
+
+    def __str__(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"Processed {summary['counters'].get('records', 0)} records in "
+            f"{summary['wall_time']:.2f}s ({summary['records_per_second']:.0f} records/s)"]
+        for stage, times in summary["stages"].items():
+            lines.append(
+                f"  {stage:<18} {times['seconds']:>9.3f}s {times['calls']:>9} calls")
+
+        return "\n".join(lines)
+
+
+def _rate(hits: int, total: int) -> float:
+    if total == 0:
+        return None
+
+    return hits / total
+
+
+stats = Stats()
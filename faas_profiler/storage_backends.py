@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registry of record storage backends
+
+A backend creates the record storage from the configuration and is
+selected by name (Config.storage_backend). By default, buckets are read
+with the storages of faas_profiler_core. The pooled backends (s3, gcs)
+size the connection pools of their clients with Config.pool_size, so
+parallel fetchers do not wait for connections of one pool.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Type
+
+from faas_profiler_core.constants import Provider
+from faas_profiler_core.storage import RecordStorage, S3RecordStorage, GCPRecordStorage
+
+from faas_profiler.local_storage import LocalRecordStorage
+from faas_profiler.object_storage import GCSObjectStorage, S3ObjectStorage
+
+S3_BACKEND = "s3"
+GCS_BACKEND = "gcs"
+S3_CORE_BACKEND = "s3-core"
+GCS_CORE_BACKEND = "gcs-core"
+LOCAL_BACKEND = "local"
+
+
+class StorageBackend:
+    """
+    Named factory of record storages.
+
+    Storages of cached backends are read through the storage cache,
+    local backends are fast enough without.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[Any], Type[RecordStorage]],
+        cached: bool = True
+    ) -> None:
+        self.name = name
+        self.factory = factory
+        self.cached = cached
+
+    def create(self, config) -> Type[RecordStorage]:
+        return self.factory(config)
+
+
+STORAGE_BACKENDS: Dict[str, StorageBackend] = {}
+
+
+def register_storage_backend(
+    name: str,
+    factory: Callable[[Any], Type[RecordStorage]],
+    cached: bool = True
+) -> None:
+    """
+    Registers a backend. The factory gets the configuration and returns the storage.
+    """
+    STORAGE_BACKENDS[name] = StorageBackend(name, factory, cached)
+
+
+def storage_backend(name: str) -> StorageBackend:
+    """
+    Returns the backend registered under name.
+    """
+    try:
+        return STORAGE_BACKENDS[name]
+    except KeyError:
+        raise RuntimeError(
+            f"Invalid storage backend {name}. "
+            f"Available backends: {', '.join(storage_backend_names())}")
+
+
+def storage_backend_names() -> List[str]:
+    return sorted(STORAGE_BACKENDS)
+
+
+def default_storage_backend(config) -> str:
+    """
+    Returns the local backend if a local directory is set,
+    otherwise the core backend of the provider.
+    """
+    if config.local_dir:
+        return LOCAL_BACKEND
+
+    if config.provider == Provider.AWS:
+        return S3_CORE_BACKEND
+    elif config.provider == Provider.GCP:
+        return GCS_CORE_BACKEND
+
+    raise RuntimeError("Please set first provider and record bucket name")
+
+
+"""
+Backends
+"""
+
+
+def _check_bucket(config) -> None:
+    if not config.provider or not config.storage_bucket:
+        raise RuntimeError(
+            "Please set first provider and record bucket name")
+
+
+def _s3_storage(config) -> Type[RecordStorage]:
+    _check_bucket(config)
+    return S3ObjectStorage(
+        config.storage_bucket,
+        config.region,
+        codec=config.codec,
+        pool_size=config.pool_size,
+        per_thread=bool(config.client_per_thread))
+
+
+def _gcs_storage(config) -> Type[RecordStorage]:
+    _check_bucket(config)
+    return GCSObjectStorage(
+        config.project_id,
+        config.storage_bucket,
+        config.region,
+        codec=config.codec,
+        pool_size=config.pool_size,
+        per_thread=config.client_per_thread in (None, True))
+
+
+def _s3_core_storage(config) -> Type[RecordStorage]:
+    _check_bucket(config)
+    return S3RecordStorage(config.storage_bucket, config.region)
+
+
+def _gcs_core_storage(config) -> Type[RecordStorage]:
+    _check_bucket(config)
+    return GCPRecordStorage(config.project_id, config.region, config.storage_bucket)
+
+
+def _local_storage(config) -> Type[RecordStorage]:
+    return LocalRecordStorage(
+        config.local_dir or config.default_local_dir, config.codec)
+
+
+register_storage_backend(S3_BACKEND, _s3_storage)
+register_storage_backend(GCS_BACKEND, _gcs_storage)
+register_storage_backend(S3_CORE_BACKEND, _s3_core_storage)
+register_storage_backend(GCS_CORE_BACKEND, _gcs_core_storage)
+register_storage_backend(LOCAL_BACKEND, _local_storage, cached=False)
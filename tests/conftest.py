@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures
+"""
+
+import os
+import shutil
+
+from uuid import uuid4
+
+import pytest
+
+from faas_profiler_core.constants import Provider
+
+from faas_profiler.config import config
+
+
+@pytest.fixture
+def bucket():
+    """
+    Configures a fresh records bucket and removes its local files afterwards.
+    """
+    config.provider = Provider.AWS.value
+    config.storage_bucket = f"test-{uuid4().hex}"
+    config.reset_storage()
+
+    yield config.storage_bucket
+
+    config.reset_storage()
+    for path in [config.processing_state_file, config.cache_file]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(config.metadata_index_file + suffix):
+            os.remove(config.metadata_index_file + suffix)
+
+    shutil.rmtree(config.columnar_dir, ignore_errors=True)
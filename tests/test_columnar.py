@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the columnar export of record data
+"""
+
+import os
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import numpy as np
+
+from faas_profiler import columnar
+from faas_profiler.columnar import (
+    ColumnTable,
+    export_profile_columns,
+    load_profile_columns,
+    remove_profile_columns
+)
+
+DATA_KEY = "memory::Usage"
+PROFILE_ID = str(uuid4())
+
+
+def trace_columns(trace_id: str, rss: float) -> dict:
+    return {DATA_KEY: ColumnTable.from_records(trace_id, [
+        (f"{trace_id}-a", {"rss": [(0.0, rss), (1.0, rss + 1)]}, {"rss_baseline": rss}),
+        (f"{trace_id}-b", {}, {"rss_baseline": rss + 0.5})])}
+
+
+def profile(trace_ids) -> SimpleNamespace:
+    return SimpleNamespace(profile_id=PROFILE_ID, trace_ids=list(trace_ids))
+
+
+def segments(directory) -> list:
+    return columnar._segments(
+        os.path.join(directory, PROFILE_ID, columnar._directory_name(DATA_KEY)))
+
+
+def baselines(table: ColumnTable) -> list:
+    return table.trace_column_means("rss_baseline").tolist()
+
+
+def test_select_keeps_series_of_records():
+    table = ColumnTable.concat([
+        trace_columns("a", 1.0)[DATA_KEY],
+        trace_columns("b", 2.0)[DATA_KEY]])
+    selected = table.select(["b", "missing", "a"])
+
+    assert selected.trace_ids.tolist() == ["b", "a"]
+    assert selected.record_ids.tolist() == ["b-a", "b-b", "a-a", "a-b"]
+    assert selected.trace_means("rss").tolist() == [2.5, 1.5]
+
+
+def test_runs_append_segments(tmp_path):
+    directory = str(tmp_path)
+    export_profile_columns(
+        directory, profile("ab"), {"a": trace_columns("a", 1.0), "b": trace_columns("b", 2.0)})
+    export_profile_columns(
+        directory, profile("cab"), {"a": trace_columns("a", 5.0), "c": trace_columns("c", 3.0)})
+
+    assert len(segments(directory)) == 2
+
+    table = load_profile_columns(directory, profile("cab"))[DATA_KEY]
+    assert table.trace_ids.tolist() == ["c", "a", "b"]
+    assert baselines(table) == [3.25, 5.25, 2.25]
+
+
+def test_unlisted_traces_are_left_out(tmp_path):
+    directory = str(tmp_path)
+    export_profile_columns(
+        directory, profile("ab"), {"a": trace_columns("a", 1.0), "b": trace_columns("b", 2.0)})
+    export_profile_columns(directory, profile("b"), {})
+
+    assert load_profile_columns(directory, profile("ab")) == {}
+    assert load_profile_columns(directory, profile("b"))[DATA_KEY].trace_ids.tolist() == ["b"]
+
+
+def test_segments_are_compacted(tmp_path):
+    directory = str(tmp_path)
+    trace_ids = []
+    for number in range(columnar.MAX_SEGMENTS + 1):
+        trace_ids.append(str(number))
+        export_profile_columns(
+            directory, profile(trace_ids[1:]),
+            {str(number): trace_columns(str(number), float(number))})
+
+    assert len(segments(directory)) == 1
+
+    table = load_profile_columns(directory, profile(trace_ids[1:]))[DATA_KEY]
+    assert table.trace_ids.tolist() == trace_ids[1:]
+    assert isinstance(table.record_ids, np.memmap)
+
+
+def test_remove_profile_columns(tmp_path):
+    directory = str(tmp_path)
+    export_profile_columns(directory, profile("a"), {"a": trace_columns("a", 1.0)})
+    remove_profile_columns(directory, PROFILE_ID)
+
+    assert load_profile_columns(directory, profile("a")) == {}
+
+
+def test_other_data_keys_are_exported_without_columns():
+    record = SimpleNamespace(record_id="r", data={
+        "disk::IOCounters": SimpleNamespace(results={"read_count": 1}),
+        "information::IsWarm": SimpleNamespace(results={})})
+    trace = SimpleNamespace(trace_id="t", records={"r": record})
+
+    (data_key, table), = columnar.trace_columns(trace).items()
+    assert data_key == "disk::IOCounters"
+    assert table.record_ids.tolist() == ["r"]
+    assert (table.columns, table.series) == ({}, {})
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the concurrency helpers
+"""
+
+import time
+
+from threading import Event, Lock, Timer
+
+import pytest
+
+from faas_profiler import concurrency
+from faas_profiler.concurrency import BackgroundWriter, prefetch_ordered
+
+
+def test_prefetch_keeps_the_order_of_items():
+    def slow_square(item: int) -> int:
+        time.sleep(0.001 * (item % 3))
+        return item * item
+
+    assert list(prefetch_ordered(slow_square, range(50), workers=4)) == [
+        item * item for item in range(50)]
+
+
+def test_prefetch_runs_at_most_queue_depth_ahead():
+    lock = Lock()
+    started, consumed, ahead = [], [], []
+
+    def fetch(item: int) -> int:
+        with lock:
+            started.append(item)
+            ahead.append(len(started) - len(consumed))
+        return item
+
+    for item in prefetch_ordered(fetch, range(100), workers=2, queue_depth=4):
+        time.sleep(0.0005)
+        with lock:
+            consumed.append(item)
+
+    assert consumed == list(range(100))
+    assert max(ahead) <= 5
+
+
+def test_prefetch_raises_errors_when_consumed():
+    def fetch(item: int) -> int:
+        if item == 3:
+            raise KeyError(item)
+        return item
+
+    results = prefetch_ordered(fetch, range(10), workers=2)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(KeyError):
+        next(results)
+
+
+def test_writer_retries_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(concurrency.time, "sleep", delays.append)
+    attempts = []
+
+    def flaky_write(key: str) -> None:
+        attempts.append(key)
+        if len(attempts) < 3:
+            raise ConnectionError(key)
+
+    with BackgroundWriter(workers=1, retries=3, backoff=0.5, progress=False) as writer:
+        writer.submit(flaky_write, "a")
+
+    assert attempts == ["a", "a", "a"]
+    assert delays == [0.5, 1.0]
+
+
+def test_writer_raises_errors_after_all_retries(monkeypatch):
+    monkeypatch.setattr(concurrency.time, "sleep", lambda delay: None)
+
+    def failing_write(key: str) -> None:
+        raise ConnectionError(key)
+
+    writer = BackgroundWriter(workers=2, retries=1, progress=False)
+    writer.submit(failing_write, "a")
+    with pytest.raises(RuntimeError, match="Failed to write results"):
+        writer.flush()
+
+    writer.submit(time.sleep, 0)
+    writer.close()
+
+
+def test_flush_waits_for_all_writes():
+    released = Event()
+    written = []
+
+    def blocked_write(key: str) -> None:
+        released.wait(5)
+        written.append(key)
+
+    writer = BackgroundWriter(workers=4, progress=False)
+    for key in "abcd":
+        writer.submit(blocked_write, key)
+
+    Timer(0.05, released.set).start()
+    writer.flush()
+    assert sorted(written) == list("abcd")
+    writer.close()
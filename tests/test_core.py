@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the core functions
+"""
+
+import time
+
+from types import SimpleNamespace
+from uuid import UUID
+
+from faas_profiler.benchmark import MemoryRecordStorage, RecordGenerator
+from faas_profiler.config import config
+from faas_profiler.core import iter_profile_traces, load_profile_traces, profile_id_of
+from faas_profiler.postprocessing import process_records
+
+
+def listed_traces(storage: MemoryRecordStorage) -> dict:
+    return {
+        profile.function_context.function_key: (profile.profile_id, set(map(str, profile.trace_ids)))
+        for profile in storage.profiles()}
+
+
+def test_profile_ids_are_stable():
+    assert profile_id_of("aws::api") == UUID("f9e57fed-ea0b-5446-93a8-36f2adba5c57")
+    assert profile_id_of("aws::api") != profile_id_of("aws::worker")
+
+
+def test_runs_append_to_the_profiles_of_function_keys(bucket):
+    records = RecordGenerator(seed=5).generate(1000)
+    config.storage = storage = MemoryRecordStorage(records[:500])
+    process_records(incremental=True)
+    first_run = listed_traces(storage)
+
+    storage.add_records(records[500:])
+    process_records(incremental=True)
+    second_run = listed_traces(storage)
+
+    assert all(
+        profile_id == profile_id_of(function_key)
+        for function_key, (profile_id, _) in second_run.items())
+
+    # Traces of other roots were merged into the traces of these roots
+    assert second_run.keys() < first_run.keys()
+    for function_key, (profile_id, trace_ids) in second_run.items():
+        assert first_run[function_key][0] == profile_id
+        assert len(trace_ids) > len(first_run[function_key][1])
+
+
+class SlowTraceStorage:
+    def get_trace(self, trace_id: int) -> SimpleNamespace:
+        if trace_id == 3:
+            raise KeyError(trace_id)
+
+        time.sleep(0.001 * (trace_id % 4))
+        return SimpleNamespace(trace_id=trace_id)
+
+
+def test_profile_traces_are_loaded_concurrently(bucket):
+    config.storage = SlowTraceStorage()
+    profile = SimpleNamespace(trace_ids=list(range(20)))
+
+    results = list(iter_profile_traces(profile, workers=4))
+    assert [trace_id for trace_id, _, _ in results] == list(range(20))
+    assert all(
+        (trace is None) == (trace_id == 3) and (error is None) == (trace_id != 3)
+        for trace_id, trace, error in results)
+
+    unordered = list(iter_profile_traces(profile, workers=4, ordered=False))
+    assert sorted(trace_id for trace_id, _, _ in unordered) == list(range(20))
+
+    traces, errors = load_profile_traces(profile, workers=4)
+    assert [trace.trace_id for trace in traces] == [
+        trace_id for trace_id in range(20) if trace_id != 3]
+    assert list(errors) == [3] and isinstance(errors[3], KeyError)
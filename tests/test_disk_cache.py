@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the persistent storage cache
+"""
+
+import pickle
+
+from concurrent.futures import ThreadPoolExecutor
+
+import faas_profiler.disk_cache as disk_cache
+from faas_profiler.disk_cache import DiskCache
+
+OBJECT = {"payload": "x" * 1000}
+
+
+def test_hits_and_misses(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    cache.put("a", OBJECT)
+
+    assert cache.get("a") == OBJECT
+    assert cache.get("b") is None
+    assert cache.get_or_load("b", lambda: OBJECT) == OBJECT
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "ACCESS_RESOLUTION", -1.0)
+    size = len(pickle.dumps(OBJECT, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_size=3 * size)
+
+    for key in "abc":
+        cache.put(key, OBJECT)
+    cache.get("a")
+    cache.put("d", OBJECT)
+
+    assert cache.get("a") == OBJECT
+    assert cache.get("d") == OBJECT
+    assert cache.get("b") is None
+    assert cache.evictions == 2
+
+
+def test_buffers_access_times(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "ACCESS_RESOLUTION", -1.0)
+    monkeypatch.setattr(disk_cache, "ACCESS_BATCH_SIZE", 4)
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    for key in "abcd":
+        cache.put(key, OBJECT)
+
+    for key in "abc":
+        cache.get(key)
+    assert len(cache._accessed) == 3
+
+    cache.get("d")
+    assert not cache._accessed
+
+
+def test_concurrent_reads(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    for i in range(20):
+        cache.put(str(i), {"i": i})
+
+    with ThreadPoolExecutor(8) as executor:
+        values = list(executor.map(lambda i: cache.get(str(i % 20)), range(400)))
+
+    assert values == [{"i": i % 20} for i in range(400)]
+    assert cache.hits == 400
+
+
+def test_pickles_without_connections(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    cache.put("a", OBJECT)
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.get("a") == OBJECT
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the trace graph cache
+"""
+
+from datetime import datetime
+
+from faas_profiler.dashboard.graphing import FUNCTION_NODE, SERVICE_NODE
+from faas_profiler.postprocessing import GraphCache
+
+
+def cache_with_traces(trace_ids) -> GraphCache:
+    cache = GraphCache()
+    for trace_id in trace_ids:
+        cache.add_trace(trace_id)
+
+    return cache
+
+
+def test_merged_traces_keep_the_parent_id():
+    cache = cache_with_traces("abcde")
+    cache.merge_traces("d", "e")
+    cache.merge_traces("c", "d")
+    cache.merge_traces("b", "c")
+    cache.merge_traces("a", "b")
+
+    assert {trace_id: cache.trace_id(trace_id) for trace_id in "abcde"} == dict.fromkeys("abcde", "a")
+    assert cache.unique_trace_ids == {"a"}
+    assert cache.number_of_graphes == 1
+    assert cache.is_unique_trace("a") and not cache.is_unique_trace("e")
+    assert cache.trace_members({"a"}) == set("abcde")
+    assert cache.trace_id("unknown") is None
+
+
+def test_larger_child_keeps_the_parent_id():
+    cache = cache_with_traces("abcd")
+    cache.merge_traces("b", "c")
+    cache.merge_traces("b", "d")
+    cache.merge_traces("a", "b")
+    cache.merge_traces("a", "c")
+
+    assert cache.unique_trace_ids == {"a"}
+    assert cache.trace_members({"a"}) == set("abcd")
+
+
+def test_find_compresses_paths():
+    cache = cache_with_traces("abcd")
+    cache.merge_traces("a", "b")
+    cache.merge_traces("c", "d")
+    cache.merge_traces("a", "c")
+
+    cache.trace_id("d")
+    root = cache._find(0)
+    assert all(cache._parents[trace_idx] == root for trace_idx in range(4))
+
+
+def test_open_requests_are_merged():
+    cache = cache_with_traces("abc")
+    cache.add_open_request("b")
+    cache.add_open_request("c")
+    cache.merge_traces("a", "b")
+
+    assert cache.completed_traces() == set()
+
+    cache.remove_open_request("a")
+    assert cache.completed_traces() == {"a"}
+
+    cache.merge_traces("a", "c")
+    assert cache.completed_traces() == set()
+
+    cache.remove_open_request("c")
+    assert cache.completed_traces() == {"a"}
+
+
+def cache_with_nodes() -> GraphCache:
+    cache = cache_with_traces(["a", "b"])
+    cache.add_function_node(
+        "a", "root", "api", 120.5, 100.0,
+        datetime(2023, 1, 1, 12, 0, 0), datetime(2023, 1, 1, 12, 0, 0, 120500))
+    cache.add_service_node("a", "queue", "sqs", 2.0)
+    cache.add_function_node(
+        "b", "worker", "worker", 80.0, None, datetime(2023, 1, 1, 12, 0, 1), None)
+    cache.add_edge("root", "queue", "async", 1.5)
+    cache.add_edge("queue", "worker", "async", None, inferred=True)
+
+    return cache
+
+
+def test_graphes_are_built_from_the_tables():
+    cache = cache_with_nodes()
+    cache.merge_traces("a", "b")
+    (graph,) = cache.get_all_graphes()
+
+    assert graph.graph == {"trace_id": "a"}
+    assert graph.nodes["root"] == {
+        "type": FUNCTION_NODE, "label": "api", "total_execution_time": 120.5,
+        "handler_execution_time": 100.0, "invoked_at": datetime(2023, 1, 1, 12, 0, 0),
+        "finished_at": datetime(2023, 1, 1, 12, 0, 0, 120500)}
+    assert graph.nodes["queue"] == {"type": SERVICE_NODE, "label": "sqs", "total_execution_time": 2.0}
+    assert graph.nodes["worker"]["handler_execution_time"] is None
+    assert graph.nodes["worker"]["finished_at"] is None
+    assert graph.edges["root", "queue"] == {"type": "async", "latency": 1.5, "label": "1.50 ms"}
+    assert graph.edges["queue", "worker"]["latency"] is None
+    assert graph.edges["queue", "worker"]["inferred"]
+    assert cache.latest_event == datetime(2023, 1, 1, 12, 0, 1)
+
+
+def test_removed_edges_are_left_out():
+    cache = cache_with_nodes()
+    cache.remove_edge("root", "queue")
+
+    graphes = {graph.graph["trace_id"]: graph for graph in cache.get_all_graphes()}
+    assert set(graphes) == {"a", "b"}
+    assert list(graphes["a"].edges) == []
+    assert list(graphes["b"].edges) == [("queue", "worker")]
+
+
+def test_retained_copy_keeps_the_wanted_traces():
+    cache = cache_with_nodes()
+    cache.add_trace("c")
+    cache.add_function_node("c", "other", "other", 1.0, 1.0, None, None)
+    cache.merge_traces("a", "b")
+    cache.add_open_request("b")
+
+    retained = cache.retained({"a"})
+
+    assert retained.unique_trace_ids == {"a"}
+    assert retained.trace_members({"a"}) == {"a", "b"}
+    assert retained.completed_traces() == set()
+    (graph,) = retained.get_all_graphes()
+    (expected,) = cache.get_all_graphes({"a"})
+    assert dict(graph.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert list(graph.edges(data=True)) == list(expected.edges(data=True))
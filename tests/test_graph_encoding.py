@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the compact graph encoding
+"""
+
+from datetime import datetime
+from uuid import uuid4
+
+import networkx as nx
+import pytest
+
+from faas_profiler.graph_encoding import (
+    GraphEncodingError,
+    decode_graph_data,
+    encode_graph
+)
+from faas_profiler.postprocessing import (
+    UNKNOWN_LATENCY_LABEL,
+    mark_critical_path,
+    normalized_graph_weights
+)
+
+INVOKED_AT = datetime(2023, 1, 1, 12, 0, 0, 250000)
+
+
+def trace_graph() -> nx.DiGraph:
+    root, child, unknown = str(uuid4()), str(uuid4()), str(uuid4())
+    graph = nx.DiGraph(trace_id=str(uuid4()))
+    graph.add_node(
+        root, type="function", label="api", total_execution_time=120.5,
+        handler_execution_time=100.0, invoked_at=INVOKED_AT)
+    graph.add_node(child, type="function", label="worker", total_execution_time=80.0)
+    graph.add_node(unknown, type="function", label="püblisher", total_execution_time=None)
+    graph.add_edge(root, child, type="async", latency=12.5, label="12.5 ms")
+    graph.add_edge(
+        root, unknown, type="async", latency=None, label=UNKNOWN_LATENCY_LABEL, inferred=True)
+
+    return graph
+
+
+def elements(data: dict) -> tuple:
+    nodes = {node["data"]["id"]: node["data"] for node in data["elements"]["nodes"]}
+    edges = {
+        (edge["data"]["source"], edge["data"]["target"]): edge["data"]
+        for edge in data["elements"]["edges"]}
+    return nodes, edges
+
+
+def test_round_trip():
+    graph = trace_graph()
+    mark_critical_path(graph, list(nx.topological_sort(graph)))
+    normalized_graph_weights(graph)
+
+    data = decode_graph_data(encode_graph(graph))
+    nodes, edges = elements(data)
+
+    assert dict(data["data"]) == graph.graph
+    for node_id, attributes in graph.nodes(data=True):
+        expected = {key: value for key, value in attributes.items() if value is not None}
+        if "invoked_at" in expected:
+            expected["invoked_at"] = INVOKED_AT.isoformat()
+        assert {
+            key: value for key, value in nodes[node_id].items()
+            if key not in ("id", "value", "name")} == expected
+
+    for source, target, attributes in graph.edges(data=True):
+        expected = {key: value for key, value in attributes.items() if value is not None}
+        assert {
+            key: value for key, value in edges[source, target].items()
+            if key not in ("source", "target")} == expected
+
+
+def test_unknown_latency_is_not_a_number():
+    graph = trace_graph()
+    mark_critical_path(graph, list(nx.topological_sort(graph)))
+    normalized_graph_weights(graph)
+
+    (unknown_edge,) = [
+        attributes for _, _, attributes in graph.edges(data=True)
+        if attributes["latency"] is None]
+
+    assert unknown_edge["label"] == UNKNOWN_LATENCY_LABEL
+    assert unknown_edge["weight"] > 0
+    assert graph.graph["critical_path_duration"] == pytest.approx(120.5 + 12.5 + 80.0)
+
+
+def test_critical_path_through_nested_sync_call():
+    graph = nx.DiGraph(trace_id=str(uuid4()))
+    graph.add_node("api", type="function", total_execution_time=100.0)
+    graph.add_node("auth", type="function", total_execution_time=20.0)
+    graph.add_node("token", type="function", total_execution_time=5.0)
+    graph.add_node("audit", type="function", total_execution_time=200.0)
+    # Sync latencies are relative to the end of the parent
+    graph.add_edge("api", "auth", type="sync", latency=-90.0)
+    graph.add_edge("auth", "token", type="sync", latency=-15.0)
+    graph.add_edge("token", "audit", type="async", latency=5.0)
+    mark_critical_path(graph, list(nx.topological_sort(graph)))
+
+    assert graph.graph["critical_path"] == ["api", "auth", "token", "audit"]
+    assert graph.graph["critical_path_duration"] == pytest.approx(225.0)
+    assert [graph.nodes[node]["critical_time"] for node in graph] == pytest.approx(
+        [10.0, 5.0, 10.0, 200.0])
+
+
+def test_cytoscape_data_is_unchanged():
+    data = nx.cytoscape_data(trace_graph())
+    assert decode_graph_data(data) is data
+
+
+def test_unsupported_version():
+    data = encode_graph(trace_graph())
+    data["version"] += 1
+    with pytest.raises(GraphEncodingError):
+        decode_graph_data(data)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the normalized weights of trace graphes
+"""
+
+import random
+
+import networkx as nx
+import pytest
+
+from faas_profiler.dashboard.graphing import EDGE_SIZE_LIMIT, NODE_SIZE_LIMIT
+from faas_profiler.postprocessing import normalized_graph_weights
+
+
+def random_graph(number_of_nodes: int, seed: int = 11) -> nx.DiGraph:
+    rng = random.Random(seed)
+    graph = nx.DiGraph()
+    for node in range(number_of_nodes):
+        total_time = rng.uniform(0.1, 500.0)
+        handler_time = rng.choice([None, rng.uniform(0.0, total_time)])
+        graph.add_node(
+            node, total_execution_time=total_time, handler_execution_time=handler_time)
+        if node:
+            graph.add_edge(
+                rng.randrange(node), node, latency=rng.choice([None, rng.uniform(-50.0, 900.0)]))
+
+    return graph
+
+
+def reference_weights(graph: nx.DiGraph) -> tuple:
+    """
+    Weights as computed per node and edge before the vectorization.
+    """
+    min_node, max_node = NODE_SIZE_LIMIT
+    min_edge, max_edge = EDGE_SIZE_LIMIT
+
+    times = [attributes["total_execution_time"] for attributes in graph.nodes.values()]
+    latencies = [
+        attributes["latency"] for _, _, attributes in graph.edges(data=True)
+        if attributes["latency"] is not None]
+    max_time = max(times + latencies)
+
+    sizes, borders = {}, {}
+    for node, attributes in graph.nodes.items():
+        total_time = attributes["total_execution_time"]
+        handler_time = attributes["handler_execution_time"]
+        if handler_time is None:
+            handler_time = total_time
+
+        total_weight = max(min_node, max_node * total_time / max_time)
+        borders[node] = (total_time - handler_time) / total_time * total_weight
+        sizes[node] = handler_time / total_time * total_weight + borders[node]
+
+    weights = {
+        (source, target): min_edge if attributes["latency"] is None
+        else max(min_edge, max_edge * attributes["latency"] / max_time)
+        for source, target, attributes in graph.edges(data=True)}
+
+    return sizes, borders, weights
+
+
+def test_weights_match_the_reference():
+    graph = random_graph(500)
+    sizes, borders, weights = reference_weights(graph)
+    normalized_graph_weights(graph)
+
+    assert dict(graph.nodes(data="size")) == pytest.approx(sizes)
+    assert dict(graph.nodes(data="border")) == pytest.approx(borders)
+    assert nx.get_edge_attributes(graph, "weight") == pytest.approx(weights)
+
+
+def test_zero_times_get_minimal_weights():
+    graph = nx.DiGraph()
+    graph.add_node("a", total_execution_time=0.0, handler_execution_time=0.0)
+    graph.add_node("b", total_execution_time=None)
+    graph.add_edge("a", "b", latency=0.0)
+    normalized_graph_weights(graph)
+
+    assert (graph.nodes["a"]["size"], graph.nodes["a"]["border"]) == (NODE_SIZE_LIMIT[0], 0.0)
+    assert "size" not in graph.nodes["b"]
+    assert graph.edges["a", "b"]["weight"] == EDGE_SIZE_LIMIT[0]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the level of detail of trace graphes
+"""
+
+from collections import Counter
+
+from faas_profiler.dashboard.graphing import FUNCTION_NODE, SERVICE_NODE, level_of_detail
+
+FAN_OUT = 30
+
+
+def node(node_id: str, node_type: str, label: str, total_time: float) -> dict:
+    return {"data": {
+        "id": node_id, "type": node_type, "label": label, "total_execution_time": total_time}}
+
+
+def edge(source: str, target: str, latency: float = 1.0) -> dict:
+    return {"data": {
+        "source": source, "target": target, "type": "async", "latency": latency,
+        "label": f"{latency:.2f} ms"}}
+
+
+def fan_out_elements() -> dict:
+    nodes = [node("api", FUNCTION_NODE, "api\naws", 100.0)]
+    edges = []
+    for idx in range(3):
+        nodes.append(node(f"auth-{idx:02}", FUNCTION_NODE, "auth\naws", 5.0))
+        edges.append(edge("api", f"auth-{idx:02}"))
+
+    for idx in range(FAN_OUT):
+        nodes.extend([
+            node(f"sns-{idx:02}", SERVICE_NODE, f"sns\n{idx}", 2.0),
+            node(f"worker-{idx:02}", FUNCTION_NODE, "process_image\naws", float(idx + 1)),
+            node(f"thumbnail-{idx:02}", FUNCTION_NODE, "thumbnail_image\naws", 3.0)])
+        edges.extend([
+            edge("api", f"sns-{idx:02}", float(idx)),
+            edge(f"sns-{idx:02}", f"worker-{idx:02}"),
+            edge(f"worker-{idx:02}", f"thumbnail-{idx:02}")])
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def labels(elements: dict) -> Counter:
+    return Counter(
+        (element["data"]["label"].split("\n")[0], element["data"].get("count", 1))
+        for element in elements["nodes"])
+
+
+def test_fan_outs_are_collapsed_level_by_level():
+    collapsed = level_of_detail(fan_out_elements())
+
+    assert labels(collapsed) == Counter({
+        ("api", 1): 1, ("auth", 1): 3, ("sns", FAN_OUT): 1,
+        ("process_image", FAN_OUT): 1, ("thumbnail_image", FAN_OUT): 1})
+    assert sorted(
+        element["data"].get("count", 1) for element in collapsed["edges"]) == [
+        1, 1, 1, FAN_OUT, FAN_OUT, FAN_OUT]
+
+    (workers,) = [
+        element["data"] for element in collapsed["nodes"]
+        if element["data"]["label"].startswith("process_image")]
+    assert (workers["min_execution_time"], workers["max_execution_time"]) == (1.0, FAN_OUT)
+    assert workers["aggregate"] and workers["type"] == FUNCTION_NODE
+
+    (published,) = [
+        element["data"] for element in collapsed["edges"]
+        if element["data"]["source"] == "api" and element["data"].get("count")]
+    assert (published["min_latency"], published["max_latency"]) == (0.0, FAN_OUT - 1)
+
+
+def test_expanded_members_are_shown_individually():
+    elements = fan_out_elements()
+    (sns,) = [
+        element["data"]["id"] for element in level_of_detail(elements)["nodes"]
+        if element["data"]["label"].startswith("sns")]
+
+    expanded = level_of_detail(elements, expanded={sns: 5})
+
+    assert labels(expanded)[("sns", 1)] == 5
+    assert labels(expanded)[("sns", FAN_OUT - 5)] == 1
+    assert {
+        element["data"]["id"] for element in expanded["nodes"]
+        if element["data"]["label"].startswith("sns") and "count" not in element["data"]
+    } == {f"sns-{idx:02}" for idx in range(5)}
+
+
+def test_small_fan_outs_are_unchanged():
+    elements = fan_out_elements()
+
+    assert level_of_detail(elements, limit=FAN_OUT) == elements
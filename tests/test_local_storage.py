@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the local record storage and the bucket sync
+"""
+
+import os
+
+import pytest
+
+from faas_profiler_core.constants import Provider
+
+from faas_profiler import local_storage
+from faas_profiler.local_storage import DOWNLOAD_SUFFIX, LocalRecordStorage, sync_bucket
+from faas_profiler.record_codecs import encode
+
+BUCKET = {
+    "unprocessed_records/r.json": encode({"record_id": "r"}, "json"),
+    "graphs/a.json": encode({"nodes": 1}, "json"),
+    "profiles/p.json": encode({"profile_id": "p"}, "json")}
+
+
+@pytest.fixture
+def bucket_objects(monkeypatch) -> dict:
+    objects = dict(BUCKET)
+    downloads = []
+
+    def download(key: str, path: str) -> None:
+        downloads.append(key)
+        with open(path, "wb") as fp:
+            fp.write(objects[key])
+
+    def s3_bucket(bucket, region, prefixes, workers):
+        listed = [
+            (key, len(payload)) for key, payload in objects.items()
+            if key.split("/")[0] in prefixes]
+        return listed, download
+
+    monkeypatch.setattr(local_storage, "_s3_bucket", s3_bucket)
+    return {"objects": objects, "downloads": downloads}
+
+
+def sync(directory: str) -> tuple:
+    return sync_bucket(directory, Provider.AWS, "records", workers=2)
+
+
+def test_sync_skips_unchanged_objects(tmp_path, bucket_objects):
+    directory = str(tmp_path)
+    assert sync(directory) == (3, 0)
+
+    storage = LocalRecordStorage(directory)
+    assert storage.get_graph_data("a") == {"nodes": 1}
+    assert storage._keys("profiles") == ["profiles/p.json"]
+
+    bucket_objects["objects"]["graphs/a.json"] = encode({"nodes": 10}, "json")
+    bucket_objects["downloads"].clear()
+    assert sync(directory) == (1, 2)
+    assert bucket_objects["downloads"] == ["graphs/a.json"]
+    assert storage.get_graph_data("a") == {"nodes": 10}
+
+
+def test_sync_replaces_objects_with_other_codecs(tmp_path, bucket_objects):
+    storage = LocalRecordStorage(str(tmp_path), "msgpack")
+    storage.store_graph_data("a", {"nodes": 0})
+
+    sync(str(tmp_path))
+
+    assert storage._keys("graphs") == ["graphs/a.json"]
+    assert storage.get_graph_data("a") == {"nodes": 1}
+
+
+def test_sync_keeps_records_encoded_locally(tmp_path, bucket_objects):
+    records = os.path.join(tmp_path, "unprocessed_records")
+    os.makedirs(records)
+    with open(os.path.join(records, "r.msgpack"), "wb") as fp:
+        fp.write(encode({"record_id": "r"}, "msgpack"))
+
+    assert sync(str(tmp_path)) == (2, 1)
+    assert "unprocessed_records/r.json" not in bucket_objects["downloads"]
+
+
+def test_partial_files_are_not_listed(tmp_path):
+    storage = LocalRecordStorage(str(tmp_path))
+    storage.store_graph_data("a", {"nodes": 1})
+    with open(os.path.join(tmp_path, "graphs", f"b.json{DOWNLOAD_SUFFIX}"), "wb") as fp:
+        fp.write(b"{")
+
+    assert storage._keys("graphs") == ["graphs/a.json"]
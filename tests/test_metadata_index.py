@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the local metadata index
+"""
+
+import pytest
+
+from faas_profiler.benchmark import MemoryRecordStorage, RecordGenerator
+from faas_profiler.config import config
+from faas_profiler.metadata_index import IndexQueryError, MetadataIndex
+from faas_profiler.postprocessing import process_records
+
+
+def processed_index() -> MetadataIndex:
+    config.storage = MemoryRecordStorage(RecordGenerator(seed=3).generate(1000))
+    process_records(incremental=False)
+    return config.metadata_index
+
+
+def test_index_matches_profiles(bucket):
+    index = processed_index()
+    listed = {
+        profile.function_context.function_key: len(profile.trace_ids)
+        for profile in config.storage.profiles()}
+
+    assert {
+        profile["function_key"]: profile["number_of_traces"]
+        for profile in index.profiles()} == listed
+
+    for function_key, number_of_traces in listed.items():
+        traces = index.traces(function_key=function_key)
+        assert len(traces) == number_of_traces
+        assert [trace["invoked_at"] for trace in traces] == sorted(
+            trace["invoked_at"] for trace in traces)
+
+    trace_ids = {trace["trace_id"] for trace in index.traces()}
+    assert {record["trace_id"] for record in index.records()} == trace_ids
+
+
+def test_removed_profiles_leave_no_rows(bucket):
+    index = processed_index()
+    removed, *kept = index.profiles()
+
+    index.remove_profile(removed["profile_id"])
+    index.flush()
+
+    assert index.profiles() == kept
+    assert index.traces(profile_id=removed["profile_id"]) == []
+    assert {record["trace_id"] for record in index.records()} == {
+        trace["trace_id"] for trace in index.traces()}
+
+
+def test_unknown_sort_column(tmp_path):
+    index = MetadataIndex(str(tmp_path / "index.sqlite"))
+
+    with pytest.raises(IndexQueryError):
+        index.traces(order_by="payload")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of post-processing
+"""
+
+import os
+
+from copy import deepcopy
+from datetime import timedelta
+from multiprocessing import get_start_method
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+from faas_profiler_core.constants import AWSOperation, AWSService
+
+from faas_profiler import postprocessing
+from faas_profiler.benchmark import EPOCH, MemoryRecordStorage, RecordGenerator
+from faas_profiler.config import config
+from faas_profiler.postprocessing import process_records
+
+# Shards must inherit the in-memory storage of the test
+requires_fork = pytest.mark.skipif(
+    get_start_method() != "fork", reason="Shards cannot share the in-memory storage")
+
+
+def listed_traces(storage: MemoryRecordStorage) -> Dict[str, List[str]]:
+    return {
+        profile.function_context.function_key: sorted(map(str, profile.trace_ids))
+        for profile in storage.profiles()}
+
+
+def process(storage: MemoryRecordStorage, **options) -> MemoryRecordStorage:
+    config.storage = storage
+    process_records(**options)
+    return storage
+
+
+def sns_fan_out(number_of_publishes: int, subscribers: int = 3) -> list:
+    """
+    Returns records of a publisher whose messages are each delivered to all subscribers.
+    """
+    generator = RecordGenerator(seed=7)
+
+    records = []
+    for idx in range(number_of_publishes):
+        publisher = generator._record(
+            "publisher",
+            generator._uuid(),
+            EPOCH + timedelta(seconds=2 * idx),
+            timedelta(milliseconds=300))
+        first = generator._async_child(
+            publisher, generator._between(publisher), "subscriber_0",
+            AWSService.SNS, AWSOperation.SNS_PUBLISH,
+            {"message_id": str(generator._uuid())})
+
+        records.extend([publisher, first])
+        for subscriber in range(1, subscribers):
+            record = generator._record(
+                f"subscriber_{subscriber}",
+                generator._uuid(),
+                first.function_context.invoked_at + timedelta(milliseconds=subscriber),
+                timedelta(milliseconds=200))
+            record.inbound_context = deepcopy(first.inbound_context)
+            records.append(record)
+
+    return records
+
+
+@requires_fork
+def test_shards_match_sequential_processing_of_fan_outs(bucket, monkeypatch):
+    monkeypatch.setattr(postprocessing, "_init_shard_process", lambda *args: None)
+    records = sns_fan_out(40)
+
+    sequential = listed_traces(process(MemoryRecordStorage(records), incremental=False))
+    sharded = listed_traces(process(
+        MemoryRecordStorage(records), incremental=False, processes=3))
+
+    assert list(sequential) == ["aws::publisher"]
+    assert len(sequential["aws::publisher"]) == 40
+    assert sharded == sequential
+
+
+class GraphDataLog(MemoryRecordStorage):
+    """
+    Logs stored and deleted graph data to a file, which shards share with the test.
+    """
+
+    def __init__(self, records: list, path: str) -> None:
+        super().__init__(records)
+        self.path = path
+
+    def store_graph_data(self, trace_id, graph_data: dict) -> None:
+        with open(self.path, "a") as fp:
+            fp.write(f"+{trace_id}\n")
+
+    def delete_graph_data(self, trace_id) -> None:
+        with open(self.path, "a") as fp:
+            fp.write(f"-{trace_id}\n")
+
+    def logged(self) -> tuple:
+        stored, kept = 0, set()
+        with open(self.path) as fp:
+            for line in fp.read().split():
+                if line[0] == "+":
+                    stored += 1
+                    kept.add(line[1:])
+                else:
+                    kept.discard(line[1:])
+
+        return stored, kept
+
+
+@requires_fork
+def test_shards_only_store_sampled_traces(bucket, monkeypatch, tmp_path):
+    monkeypatch.setattr(postprocessing, "_init_shard_process", lambda *args: None)
+    records = sns_fan_out(40)
+
+    sequential = listed_traces(process(
+        MemoryRecordStorage(records), incremental=False, sample_reservoir=5))
+    storage = process(
+        GraphDataLog(records, str(tmp_path / "graph_data.log")),
+        incremental=False, processes=3, sample_reservoir=5)
+    stored, kept = storage.logged()
+
+    assert listed_traces(storage) == sequential
+    assert len(sequential["aws::publisher"]) == 5
+    assert kept == set(sequential["aws::publisher"])
+    assert stored < 40
+
+
+def test_incremental_runs_match_single_run(bucket):
+    records = RecordGenerator(seed=1).generate(3000)
+    single = process(MemoryRecordStorage(records), incremental=False)
+    os.remove(config.processing_state_file)
+
+    storage = MemoryRecordStorage(records[:1000])
+    process(storage, incremental=True)
+    storage.add_records(records[1000:2000])
+    process(storage, incremental=True)
+    storage.add_records(records[2000:])
+    process(storage, incremental=True)
+
+    assert listed_traces(storage) == listed_traces(single)
+    assert storage._graph_data.keys() == single._graph_data.keys()
+
+
+def test_stream_merges_late_records(bucket):
+    records = RecordGenerator(seed=5).generate(3000)
+    batch = listed_traces(process(MemoryRecordStorage(records), incremental=False))
+
+    # Keys are UUIDs, so records are streamed in random order
+    storage = MemoryRecordStorage(records)
+    storage._records = dict(sorted(storage._records.items()))
+
+    assert listed_traces(process(storage, incremental=False, stream=True)) == batch
+
+
+def test_time_window_skips_resolved_requests():
+    class ResolvedRequests(postprocessing.RequestContextCache):
+        def unresolved_inbound_requests(self, before=None):
+            return [(0.0, "sns:topic", "record")]
+
+        def inbound_request(self, inbound_identifier, record_id):
+            return None
+
+    assert postprocessing.resolve_by_time_window(
+        postprocessing.GraphCache(), ResolvedRequests(), 1.0) == 0
+
+
+def test_time_index_drops_resolved_and_spilled_requests():
+    def request(number: int):
+        context = SimpleNamespace(
+            provider="aws", service="sqs", identifier={"queue_name": "jobs"},
+            identifier_string=f"sqs#{number}", invoked_at=None, finished_at=None)
+        function_context = SimpleNamespace(
+            invoked_at=EPOCH + timedelta(seconds=number), function_key="producer")
+        tracing_context = SimpleNamespace(record_id=f"record-{number}", trace_id=f"trace-{number}")
+        return context, function_context, tracing_context
+
+    cache = postprocessing.RequestContextCache(max_entries=2)
+    for number in range(6):
+        cache.cache_outbound_request(*request(number))
+
+    inbound = postprocessing.CachedRequest(
+        request(9)[2], request(9)[0], (EPOCH + timedelta(seconds=4.5)).timestamp(), "consumer")
+    identifier, requests, match = cache.nearest_outbound_request(
+        inbound, 10.0, lambda request: True)
+    assert identifier == "sqs#4"
+
+    cache.deliver_outbound_request(identifier, requests, match, "consumer")
+    identifier, _, _ = cache.nearest_outbound_request(inbound, 10.0, lambda request: True)
+    assert identifier == "sqs#3"
+    assert cache._outbound_requests.number_of_spilled > 0
+    assert sum(
+        len(cache._outbound_requests.time_entries(key))
+        for key in cache._outbound_requests.time_keys()) == 2 * 5
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the profile page of the dashboard
+"""
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from faas_profiler.columnar import ColumnTable, export_profile_columns
+from faas_profiler.config import config
+from faas_profiler.dashboard.analyzers.base import Analyzer
+from faas_profiler.dashboard.pages import profile_view as view
+
+
+class ColumnsAnalyzer(Analyzer):
+    requested_data = "cpu::UsageOverTime"
+    name = "Columns"
+
+    def analyze_profile(self, traces_data):
+        return "traces"
+
+    def analyze_profile_columns(self, columns):
+        return "columns"
+
+
+class TracesAnalyzer(Analyzer):
+    requested_data = "disk::IOCounters"
+    name = "Traces"
+
+    def analyze_profile(self, traces_data):
+        return "traces"
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(Analyzer, "__subclasses__", lambda: [ColumnsAnalyzer, TracesAnalyzer])
+    monkeypatch.setattr(type(config), "columnar_dir", str(tmp_path))
+
+    loads = []
+    monkeypatch.setattr(
+        view, "load_profile_traces", lambda profile: loads.append(profile) or ([], {}))
+    monkeypatch.setattr(
+        view, "group_traces_data_by_key", lambda traces, sort_by_invocation: {
+            TracesAnalyzer.requested_data: {}})
+
+    return SimpleNamespace(profile_id=uuid4(), trace_ids=["a"], loads=loads)
+
+
+def export(profile, data_keys) -> None:
+    export_profile_columns(config.columnar_dir, profile, {"a": {
+        data_key: ColumnTable.from_records("a", [("record", {}, {})])
+        for data_key in data_keys}})
+
+
+def card_texts(page) -> list:
+    return [card.children[0].children[1].children for card in page.children]
+
+
+def test_columns_cover_all_analyzers(profile):
+    export(profile, [ColumnsAnalyzer.requested_data])
+
+    assert card_texts(view.profile_view(profile)) == [
+        "columns", f"There is no data for {TracesAnalyzer.requested_data} for this profile"]
+    assert profile.loads == []
+
+
+def test_traces_are_loaded_once_for_other_data_keys(profile):
+    export(profile, [ColumnsAnalyzer.requested_data, TracesAnalyzer.requested_data])
+
+    assert card_texts(view.profile_view(profile)) == ["columns", "traces"]
+    assert len(profile.loads) == 1
+
+
+def test_traces_are_loaded_without_columns(profile):
+    assert card_texts(view.profile_view(profile)) == [
+        f"There is no data for {ColumnsAnalyzer.requested_data} for this profile",
+        "traces"]
+    assert len(profile.loads) == 1
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of object encodings and their migration
+"""
+
+import os
+
+import pytest
+
+from faas_profiler.local_storage import LocalRecordStorage
+from faas_profiler.object_storage import migrate_storage
+from faas_profiler.record_codecs import (
+    CODECS,
+    CodecError,
+    codec_of,
+    decode,
+    detect_codec,
+    encode,
+    key_with_codec,
+    stem_of
+)
+
+DATA = {
+    "trace_id": "5b8d6c5e-5f4a-4d4b-9d1c-2a1f1a6a8e01",
+    "records": [{"invoked_at": 1672531200.25, "data": None, "cold": True}],
+    "label": "pröcess_image"
+}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(codec):
+    payload = encode(DATA, codec)
+
+    assert decode(payload, codec) == DATA
+    assert detect_codec(payload) == codec
+    assert decode(payload) == DATA
+
+
+def test_unknown_codec():
+    with pytest.raises(CodecError):
+        encode(DATA, "xml")
+
+
+def test_keys():
+    assert codec_of("graphs/a.msgpack.zst") == "msgpack.zst"
+    assert codec_of("graphs/a") is None
+    assert stem_of("graphs/a.json.gz") == "graphs/a"
+    assert stem_of("graphs/a") == "graphs/a"
+    assert key_with_codec("graphs/a", "json") == "graphs/a.json"
+
+
+def test_migrate_storage(tmp_path):
+    storage = LocalRecordStorage(str(tmp_path), "json")
+    storage.store_graph_data("a", DATA)
+    storage.store_graph_data("b", DATA)
+    with open(os.path.join(tmp_path, "graphs", "c"), "wb") as fp:
+        fp.write(encode(DATA, "json.gz"))
+
+    assert migrate_storage(storage, "msgpack.zst", workers=2) == (3, 0)
+    assert storage._keys("graphs") == [
+        "graphs/a.msgpack.zst", "graphs/b.msgpack.zst", "graphs/c.msgpack.zst"]
+    assert all(storage.get_graph_data(trace_id) == DATA for trace_id in "abc")
+
+    assert migrate_storage(storage, "msgpack.zst", workers=2) == (0, 3)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the size-bounded store of unresolved requests
+"""
+
+import pickle
+
+from faas_profiler.request_store import RequestStore
+
+
+def filled_store(number_of_entries: int, max_entries: int = 4) -> RequestStore:
+    store = RequestStore(max_entries)
+    for i in range(number_of_entries):
+        store.put(f"request-{i}", {"i": i}, (f"trace-{i}",), float(i))
+
+    return store
+
+
+def test_spills_oldest_entries():
+    store = filled_store(10)
+
+    assert len(store) == 10
+    assert store.number_of_spilled == 6
+    assert store.number_of_open == 10
+    assert store.get("request-0") == ({"i": 0}, ("trace-0",), 0.0)
+    assert store.get("request-9") == ({"i": 9}, ("trace-9",), 9.0)
+    assert sorted(store.identifiers()) == sorted(f"request-{i}" for i in range(10))
+
+
+def test_put_replaces_spilled_entries():
+    store = filled_store(10)
+    store.put("request-0", {"i": 10}, ("trace-0", "trace-10"), 10.0)
+
+    assert len(store) == 10
+    assert store.number_of_open == 11
+    assert store.get("request-0") == ({"i": 10}, ("trace-0", "trace-10"), 10.0)
+
+
+def test_pop_from_memory_and_disk():
+    store = filled_store(10)
+
+    assert store.pop("request-1")[0] == {"i": 1}
+    assert store.pop("request-9")[0] == {"i": 9}
+    assert store.pop("request-1") is None
+    assert "request-1" not in store
+    assert (len(store), store.number_of_open) == (8, 8)
+
+
+def test_expire_returns_trace_ids():
+    store = filled_store(10)
+
+    assert sorted(store.expire(5.0)) == sorted(f"trace-{i}" for i in range(5))
+    assert len(store) == 5
+    assert store.number_of_open == 5
+    assert store.trace_ids() == {f"trace-{i}" for i in range(5, 10)}
+
+
+def test_pickles_spilled_entries():
+    store = pickle.loads(pickle.dumps(filled_store(10)))
+
+    assert (len(store), store.number_of_spilled, store.number_of_open) == (10, 6, 10)
+    assert store.get("request-0") == ({"i": 0}, ("trace-0",), 0.0)
+
+
+def test_time_index_follows_entries():
+    store = RequestStore(max_entries=4)
+    for i in range(10):
+        store.put(f"request-{i}", i, (f"trace-{i}",), float(i), [("queue", float(i), f"record-{i}")])
+
+    assert [identifier for _, identifier, _ in store.time_entries("queue", 2.0, 5.0)] == [
+        f"request-{i}" for i in range(2, 6)]
+
+    store.put("request-3", 3, (), 3.0)
+    store.pop("request-8")
+    store.expire(2.0)
+
+    assert [identifier for _, identifier, _ in store.time_entries("queue")] == [
+        f"request-{i}" for i in (2, 4, 5, 6, 7, 9)]
+
+    store = pickle.loads(pickle.dumps(store))
+    assert store.time_keys() == ["queue"]
+    assert len(store.time_entries("queue", end=5.0)) == 3
+
+
+def test_spilled_entries_are_unpickled_in_batches(monkeypatch):
+    store = RequestStore(max_entries=4)
+    for i in range(2500):
+        store.put(f"request-{i}", i, (f"trace-{i}",), float(i), [("queue", float(i), f"record-{i}")])
+
+    batches = []
+    extend = RequestStore.extend
+    monkeypatch.setattr(
+        RequestStore, "extend", lambda self, rows: batches.append(len(rows)) or extend(self, rows))
+    store = pickle.loads(pickle.dumps(store))
+
+    assert max(batches) < 2500 and sum(batches) == 2 * store.number_of_spilled
+    assert (len(store), store.number_of_open) == (2500, 2500)
+    assert store.get("request-0") == (0, ("trace-0",), 0.0)
+    assert len(store.time_entries("queue")) == 2500
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the consistent trace sampler
+"""
+
+import pytest
+
+from faas_profiler.sampling import TraceSampler, trace_hash
+
+TRACES = [f"trace-{i}" for i in range(2000)]
+
+
+def bottom(trace_ids, size):
+    return set(sorted(trace_ids, key=trace_hash)[:size])
+
+
+def test_reservoir_keeps_smallest_hashes():
+    sampler = TraceSampler(reservoir_size=10)
+    kept = {trace_id for trace_id in TRACES if sampler.sample(trace_id, "f")}
+    evicted = {trace_id for trace_id, _ in sampler.pop_evicted()}
+
+    assert kept - evicted == bottom(TRACES, 10)
+    assert sampler.threshold("f") == max(map(trace_hash, bottom(TRACES, 10)))
+    assert all(sampler.sample(trace_id, "f") for trace_id in bottom(TRACES, 10))
+
+
+def test_sampling_does_not_depend_on_order():
+    forward, backward = TraceSampler(5, 0.01), TraceSampler(5, 0.01)
+    for trace_id in TRACES:
+        forward.sample(trace_id, "f")
+    for trace_id in reversed(TRACES):
+        backward.sample(trace_id, "f")
+
+    assert forward.threshold("f") == backward.threshold("f")
+    assert forward.weight("f") == backward.weight("f")
+
+
+def test_discarded_traces_leave_the_reservoir():
+    sampler = TraceSampler(reservoir_size=10)
+    for trace_id in TRACES:
+        sampler.sample(trace_id, "f")
+
+    kept = sorted(bottom(TRACES, 10), key=trace_hash)
+    for trace_id in kept[5:]:
+        sampler.discard(trace_id)
+
+    assert sampler.threshold("f") == trace_hash(kept[4])
+    assert not any(sampler.sample(trace_id, "f") for trace_id in set(TRACES) - set(kept))
+
+
+def test_probability_without_reservoir():
+    sampler = TraceSampler(reservoir_size=0, probability=0.1)
+    kept = [trace_id for trace_id in TRACES if sampler.sample(trace_id, "f")]
+
+    assert all(trace_hash(trace_id) < 0.1 for trace_id in kept)
+    assert sampler.threshold("f") == 0.1
+    assert sampler.weight("f") == pytest.approx(10.0)
+
+
+def test_weight_estimates_number_of_traces():
+    estimates = []
+    for run in range(50):
+        sampler = TraceSampler(reservoir_size=20)
+        for i in range(1000):
+            sampler.sample(f"run-{run}-{i}", "f")
+        estimates.append(20 * sampler.weight("f"))
+
+    assert sum(estimates) / len(estimates) == pytest.approx(1000, rel=0.1)
+
+
+def test_full_reservoir_without_drops_has_weight_one():
+    sampler = TraceSampler(reservoir_size=10, probability=0.5)
+    for trace_id in TRACES[:10]:
+        assert sampler.sample(trace_id, "f")
+
+    assert sampler.weight("f") == 1.0
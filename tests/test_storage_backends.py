@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of storage backends
+"""
+
+import os
+
+import pytest
+
+from faas_profiler.config import Config
+from faas_profiler.local_storage import LocalRecordStorage
+from faas_profiler.record_codecs import encode
+from faas_profiler.stats import stats
+from faas_profiler.storage_backends import (
+    GCS_BACKEND,
+    GCS_CORE_BACKEND,
+    LOCAL_BACKEND,
+    S3_CORE_BACKEND,
+    default_storage_backend,
+    storage_backend,
+    storage_backend_names
+)
+
+
+def make_config(provider: str, **options) -> Config:
+    config = Config()
+    config.provider = provider
+    config.storage_bucket = "records"
+    for name, value in options.items():
+        setattr(config, name, value)
+
+    return config
+
+
+@pytest.mark.parametrize("provider, backend", [
+    ("aws", S3_CORE_BACKEND),
+    ("gcp", GCS_CORE_BACKEND)
+])
+def test_core_storages_are_the_default(provider, backend):
+    assert default_storage_backend(make_config(provider)) == backend
+
+
+def test_local_directory_selects_local_backend(tmp_path):
+    config = make_config("aws", local_dir=str(tmp_path))
+
+    assert default_storage_backend(config) == LOCAL_BACKEND
+    assert isinstance(storage_backend(LOCAL_BACKEND).create(config), LocalRecordStorage)
+
+
+def test_unknown_backend_lists_available_backends():
+    with pytest.raises(RuntimeError, match=", ".join(storage_backend_names())):
+        storage_backend("memory")
+
+
+def test_gcs_storage_keeps_region():
+    config = make_config("gcp", project_id="project", region="europe-west3")
+
+    assert storage_backend(GCS_BACKEND).create(config).region == "europe-west3"
+
+
+def test_objects_without_codec_suffix_are_read(tmp_path):
+    storage = LocalRecordStorage(str(tmp_path))
+    storage.store_graph_data("a", {"nodes": 1})
+    with open(os.path.join(tmp_path, "graphs", "b"), "wb") as fp:
+        fp.write(encode({"nodes": 2}, "json.gz"))
+
+    assert storage._keys("graphs") == ["graphs/a.json", "graphs/b"]
+    assert storage.get_graph_data("a") == {"nodes": 1}
+    assert storage.get_graph_data("b") == {"nodes": 2}
+
+    storage.delete_graph_data("b")
+    assert storage._keys("graphs") == ["graphs/a.json"]
+
+
+class RequestLog(LocalRecordStorage):
+    def __init__(self, directory: str) -> None:
+        super().__init__(directory)
+        self.requests = []
+
+    def _get_object(self, key: str) -> bytes:
+        self.requests.append(("GET", key))
+        return super()._get_object(key)
+
+    def _delete_object(self, key: str) -> None:
+        self.requests.append(("DELETE", key))
+        super()._delete_object(key)
+
+
+def test_objects_are_looked_up_with_storage_codec_and_without_suffix(tmp_path):
+    storage = RequestLog(str(tmp_path))
+    with pytest.raises(KeyError):
+        storage.get_graph_data("a")
+
+    storage.delete_graph_data("a")
+    assert storage.requests == [
+        ("GET", "graphs/a.json"), ("GET", "graphs/a"),
+        ("DELETE", "graphs/a.json"), ("DELETE", "graphs/a")]
+
+
+def test_listed_codecs_are_read(tmp_path):
+    storage = RequestLog(str(tmp_path))
+    with open(os.path.join(tmp_path, "graphs", "a.msgpack.zst"), "wb") as fp:
+        fp.write(encode({"nodes": 1}, "msgpack.zst"))
+
+    with pytest.raises(KeyError):
+        storage.get_graph_data("a")
+
+    assert storage._keys("graphs") == ["graphs/a.msgpack.zst"]
+    storage.requests.clear()
+    assert storage.get_graph_data("a") == {"nodes": 1}
+    assert storage.requests == [("GET", "graphs/a.msgpack.zst")]
+
+    storage.delete_graph_data("a")
+    assert storage._keys("graphs") == []
+
+
+def test_fetch_and_decode_are_timed_apart(tmp_path):
+    storage = RequestLog(str(tmp_path))
+    storage.store_graph_data("a", {"nodes": 1})
+    stats.reset()
+
+    storage.get_graph_data("a")
+    with pytest.raises(KeyError):
+        storage.get_graph_data("b")
+
+    stages = stats.summary()["stages"]
+    assert (stages["fetch"]["calls"], stages["decode"]["calls"]) == (3, 1)